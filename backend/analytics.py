@@ -0,0 +1,323 @@
+"""
+PPN Research Portal - Patient Flow Analytics
+Columnar snapshot of log_patient_flow_events with vectorized funnel and
+transition analytics, kept current by incremental high-water-mark refreshes
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Set
+
+import numpy as np
+
+Row = Dict[str, Any]
+# fetch_page(after_flow_event_id, limit) -> rows ordered by flow_event_id
+FetchPage = Callable[[int | None, int], Awaitable[List[Row]]]
+FetchStages = Callable[[], Awaitable[List[int]]]
+
+SNAPSHOT_COLUMNS = "flow_event_id,site_id,subject_id,event_type_id,event_date"
+SNAPSHOT_PAGE_SIZE = int(os.getenv("ANALYTICS_PAGE_SIZE", "5000"))
+REFRESH_INTERVAL = float(os.getenv("ANALYTICS_REFRESH_INTERVAL", "30"))
+FULL_RELOAD_INTERVAL = float(os.getenv("ANALYTICS_FULL_RELOAD_INTERVAL", "3600"))
+# Filtered selections at least this large are computed in the process pool
+OFFLOAD_MIN_ROWS = int(os.getenv("ANALYTICS_OFFLOAD_MIN_ROWS", "200000"))
+
+# Upper bounds (days) for the time-between-events histogram; last bin is open-ended
+GAP_BINS_DAYS = (0, 1, 7, 14, 30, 60, 90, 180, 365)
+
+_DTYPES = {
+    "flow_event_id": np.int64,
+    "site_id": np.int64,
+    "subject_id": np.int64,
+    "event_type_id": np.int64,
+    "event_day": np.int32,  # days since 1970-01-01
+}
+_SOURCE_COLUMNS = SNAPSHOT_COLUMNS.split(",")
+
+
+def rows_to_columns(rows: Sequence[Row]) -> Dict[str, np.ndarray]:
+    """Convert PostgREST rows into typed column arrays"""
+    columns = {
+        name: np.fromiter((row[name] for row in rows), dtype=dtype, count=len(rows))
+        for name, dtype in _DTYPES.items()
+        if name != "event_day"
+    }
+    columns["event_day"] = (
+        np.array([row["event_date"][:10] for row in rows], dtype="datetime64[D]").astype(np.int32)
+    )
+    return columns
+
+
+class _Columns:
+    """
+    Chunked column storage plus the keyset pull's watermark.
+
+    `high_water` is the highest flow_event_id read by a pull; rows pushed in
+    after inserts are held in `pushed` instead, so a lower id committed
+    later by another writer (e.g. the frontend writing to Supabase directly)
+    is still above the watermark and picked up by the next pull, which skips
+    the pushed ids it meets.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: Dict[str, List[np.ndarray]] = {name: [] for name in _DTYPES}
+        self.high_water: int | None = None
+        self.pushed: Set[int] = set()
+
+    def __len__(self) -> int:
+        return sum(len(chunk) for chunk in self.chunks["flow_event_id"])
+
+    def _held(self, flow_event_id: int) -> bool:
+        return (self.high_water is not None and flow_event_id <= self.high_water) or flow_event_id in self.pushed
+
+    def append(self, rows: Sequence[Row], pushed: bool = False) -> int:
+        # Rows missing a snapshot column are skipped; a pull re-reads them
+        # from the table since only pulled rows move high_water past them
+        pulled = [row["flow_event_id"] for row in rows] if not pushed else []
+        rows = [
+            row for row in rows
+            if all(row.get(name) is not None for name in _SOURCE_COLUMNS)
+            and not self._held(row["flow_event_id"])
+        ]
+        if pulled:
+            newest = max(pulled)
+            self.high_water = newest if self.high_water is None else max(self.high_water, newest)
+            self.pushed = {flow_event_id for flow_event_id in self.pushed if flow_event_id > self.high_water}
+        if not rows:
+            return 0
+        columns = rows_to_columns(rows)
+        for name, values in columns.items():
+            self.chunks[name].append(values)
+        if pushed:
+            self.pushed.update(int(flow_event_id) for flow_event_id in columns["flow_event_id"])
+        return len(rows)
+
+    def column(self, name: str) -> np.ndarray:
+        chunks = self.chunks[name]
+        if not chunks:
+            return np.empty(0, dtype=_DTYPES[name])
+        if len(chunks) > 1:
+            # Merge lazily so many small appends cost one concatenate at read time
+            self.chunks[name] = [np.concatenate(chunks)]
+        return self.chunks[name][0]
+
+
+class FlowEventSnapshot:
+    """
+    Append-only columnar copy of log_patient_flow_events.
+
+    New rows are pulled with a keyset query past the highest flow_event_id
+    pulled so far, so a refresh costs proportional to the new events, not
+    the whole log. Rows pushed in directly after inserts are visible at once
+    but do not move that watermark, so a pull still reads lower ids other
+    writers commit meanwhile; it skips the pushed ones. A periodic full
+    reload, built off to the side and swapped in, picks up edits, deletes
+    and late-committed rows.
+    """
+
+    def __init__(
+        self,
+        fetch_page: FetchPage,
+        fetch_stages: FetchStages,
+        refresh_interval: float = REFRESH_INTERVAL,
+        full_reload_interval: float = FULL_RELOAD_INTERVAL,
+        page_size: int = SNAPSHOT_PAGE_SIZE,
+    ) -> None:
+        self.fetch_page = fetch_page
+        self.fetch_stages = fetch_stages
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self.page_size = page_size
+        self.stage_order: List[int] = []
+        self.refreshed_at: float | None = None
+        self.reloaded_at: float | None = None
+        self._data = _Columns()
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def high_water(self) -> int | None:
+        return self._data.high_water
+
+    def column(self, name: str) -> np.ndarray:
+        """Return one column as a single contiguous array"""
+        return self._data.column(name)
+
+    def append_rows(self, rows: Sequence[Row]) -> int:
+        """Append freshly inserted rows. Returns the number added."""
+        return self._data.append(rows, pushed=True)
+
+    def _is_fresh(self) -> bool:
+        return self.refreshed_at is not None and time.monotonic() - self.refreshed_at < self.refresh_interval
+
+    async def refresh(self, force: bool = False) -> None:
+        """Pull new events (or fully reload when due) unless refreshed recently"""
+        if not force and self._is_fresh():
+            return
+        async with self._lock:
+            if not force and self._is_fresh():
+                return  # another request refreshed while we waited
+
+            reload = self.reloaded_at is None or time.monotonic() - self.reloaded_at >= self.full_reload_interval
+            target = _Columns() if reload else self._data
+            self.stage_order = await self.fetch_stages()
+            while True:
+                rows = await self.fetch_page(target.high_water, self.page_size)
+                target.append(rows)
+                if len(rows) < self.page_size:
+                    break
+
+            if reload:
+                self._data = target
+                self.reloaded_at = time.monotonic()
+            self.refreshed_at = time.monotonic()
+
+    def select(self, site_id: int | None = None, start: str | None = None, end: str | None = None) -> Dict[str, np.ndarray]:
+        """Columns restricted to one site and an inclusive event_date range"""
+        site = self.column("site_id")
+        day = self.column("event_day")
+        mask = np.ones(len(site), dtype=bool)
+        if site_id is not None:
+            mask &= site == site_id
+        if start is not None:
+            mask &= day >= np.datetime64(start, "D").astype(np.int32)
+        if end is not None:
+            mask &= day <= np.datetime64(end, "D").astype(np.int32)
+        return {
+            "subject": self.column("subject_id")[mask],
+            "event_type": self.column("event_type_id")[mask],
+            "event_day": day[mask],
+            "event_id": self.column("flow_event_id")[mask],
+        }
+
+    def funnel(self, site_id: int | None = None, start: str | None = None, end: str | None = None) -> Dict[str, Any]:
+        """Event counts, stage conversion and transition timing for one site/period"""
+        return compute_funnel(**self.select(site_id, start, end), stage_order=self.stage_order)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "rows": len(self),
+            "high_water_flow_event_id": self.high_water,
+            "refreshed_seconds_ago": (
+                round(time.monotonic() - self.refreshed_at, 1) if self.refreshed_at is not None else None
+            ),
+        }
+
+
+def compute_funnel(
+    subject: np.ndarray,
+    event_type: np.ndarray,
+    event_day: np.ndarray,
+    event_id: np.ndarray,
+    stage_order: Sequence[int],
+) -> Dict[str, Any]:
+    """
+    Vectorized funnel analytics over filtered column arrays.
+
+    - counts: events and distinct subjects per event_type_id
+    - conversions: share of subjects reaching stage N that also reach stage N+1
+      (stages ordered by ref_flow_event_types.display_order)
+    - transitions: consecutive-event pairs per subject, with gap-in-days
+      percentiles and a histogram
+    """
+    types, type_index = np.unique(event_type, return_inverse=True)
+    n_types = len(types)
+
+    events_per_type = np.bincount(type_index, minlength=n_types)
+    # Distinct (subject, stage) pairs, encoded as one int64 key per pair
+    width = max(n_types, 1)
+    subject_stage = np.unique(subject * width + type_index)
+    subjects_per_type = np.bincount(subject_stage % width, minlength=n_types)
+    reached = {int(t): int(subjects_per_type[i]) for i, t in enumerate(types)}
+
+    counts = [
+        {"event_type_id": int(t), "events": int(events_per_type[i]), "subjects": int(subjects_per_type[i])}
+        for i, t in enumerate(types)
+    ]
+
+    stages = [stage for stage in stage_order if stage in reached] or [int(t) for t in types]
+    stage_index = {int(t): i for i, t in enumerate(types)}
+    # Distinct subjects grouped by stage (subjects ascending within each group)
+    pair_stage, pair_subject = subject_stage % width, subject_stage // width
+    order = np.lexsort((pair_subject, pair_stage))
+    pair_subject = pair_subject[order]
+    bounds = np.searchsorted(pair_stage[order], np.arange(n_types + 1))
+
+    conversions = []
+    for current, following in zip(stages, stages[1:]):
+        i, j = stage_index[current], stage_index[following]
+        from_subjects = pair_subject[bounds[i]:bounds[i + 1]]
+        to_subjects = pair_subject[bounds[j]:bounds[j + 1]]
+        converted = int(np.isin(from_subjects, to_subjects, assume_unique=True).sum())
+        conversions.append({
+            "from_event_type_id": current,
+            "to_event_type_id": following,
+            "from_subjects": len(from_subjects),
+            "converted_subjects": converted,
+            "rate": round(converted / len(from_subjects), 4) if len(from_subjects) else None,
+        })
+
+    return {
+        "events": int(len(subject)),
+        "subjects": int(len(np.unique(subject))),
+        "counts": counts,
+        "conversions": conversions,
+        "transitions": _transitions(subject, type_index, types, event_day, event_id),
+    }
+
+
+def funnel_job(columns: Dict[str, np.ndarray], stage_order: Sequence[int]) -> Dict[str, Any]:
+    """compute_funnel over FlowEventSnapshot.select() columns, for the analytics process pool"""
+    return compute_funnel(**columns, stage_order=stage_order)
+
+
+def _transitions(
+    subject: np.ndarray,
+    type_index: np.ndarray,
+    types: np.ndarray,
+    event_day: np.ndarray,
+    event_id: np.ndarray,
+) -> List[Dict[str, Any]]:
+    if len(subject) < 2:
+        return []
+
+    # Order each subject's journey by date, then insertion order
+    order = np.lexsort((event_id, event_day, subject))
+    subject, type_index, event_day = subject[order], type_index[order], event_day[order]
+
+    same_subject = subject[1:] == subject[:-1]
+    from_type = type_index[:-1][same_subject]
+    to_type = type_index[1:][same_subject]
+    gaps = (event_day[1:] - event_day[:-1])[same_subject]
+    if len(gaps) == 0:
+        return []
+
+    pair_key = from_type.astype(np.int64) * len(types) + to_type
+    pair_order = np.argsort(pair_key, kind="stable")
+    pair_key, gaps = pair_key[pair_order], gaps[pair_order]
+    keys, starts, pair_counts = np.unique(pair_key, return_index=True, return_counts=True)
+    bins = np.array(GAP_BINS_DAYS + (np.iinfo(np.int32).max,))
+    labels = [f"<={upper}d" for upper in GAP_BINS_DAYS] + [f">{GAP_BINS_DAYS[-1]}d"]
+
+    transitions = []
+    for key, begin, count in zip(keys, starts, pair_counts):
+        segment = gaps[begin:begin + count]
+        p25, p50, p75, p90 = np.percentile(segment, [25, 50, 75, 90])
+        histogram = np.bincount(np.searchsorted(bins, segment, side="left"), minlength=len(bins))
+        transitions.append({
+            "from_event_type_id": int(types[key // len(types)]),
+            "to_event_type_id": int(types[key % len(types)]),
+            "count": int(count),
+            "gap_days": {
+                "mean": round(float(segment.mean()), 2),
+                "p25": float(p25),
+                "p50": float(p50),
+                "p75": float(p75),
+                "p90": float(p90),
+            },
+            "gap_histogram": {label: int(n) for label, n in zip(labels, histogram)},
+        })
+    return transitions
@@ -0,0 +1,315 @@
+"""
+bench_endpoints.py
+==================
+Endpoint load benchmark for backend/main.py.
+
+Runs the real FastAPI app in-process against FakePostgrest (an in-memory
+PostgREST stand-in with artificial latency), drives each endpoint at fixed
+concurrency levels and reports req/s, p50/p95/p99 latency and peak RSS.
+
+Usage:
+  # Defaults: 10k flow events, 2ms fake DB latency, concurrency 1,8,32
+  python backend/benchmarks/bench_endpoints.py
+
+  # Larger dataset, JSON output for comparison across commits
+  python backend/benchmarks/bench_endpoints.py \\
+      --flow-events 200000 --latency-ms 5 --concurrency 1,16,64 \\
+      --output bench-$(git rev-parse --short HEAD).json
+
+  # Compare two runs
+  python backend/benchmarks/bench_endpoints.py --compare before.json after.json
+
+Notes:
+  - Each (endpoint, concurrency) scenario runs in a fresh process, so peak RSS
+    is per scenario rather than the high-water mark of the whole run
+  - FakePostgrest encodes its responses in the same process, so absolute
+    numbers include that cost; compare runs made with the same settings
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Scenarios
+# Key = endpoint label in reports
+# Value = (method, path template); {subject_id} is filled per request
+# ─────────────────────────────────────────────────────────────────────────────
+
+ENDPOINTS = {
+    "GET /api/sites":                   ("GET",  "/api/sites"),
+    "GET /api/flow-event-types":        ("GET",  "/api/flow-event-types"),
+    "GET /api/flow-events":             ("GET",  "/api/flow-events?limit={page_size}"),
+    "GET /api/flow-events?subject_id":  ("GET",  "/api/flow-events?subject_id={subject_id}"),
+    "POST /api/flow-events":            ("POST", "/api/flow-events"),
+}
+
+
+@dataclass
+class BenchConfig:
+    """Settings shared by every scenario in a run"""
+    latency_ms: float = 2.0
+    sites: int = 25
+    flow_events: int = 10_000
+    subjects: int = 2_000
+    page_size: int = 500
+    requests: int = 2_000
+    warmup: int = 50
+
+
+@dataclass
+class BenchResult:
+    """Measurements for one (endpoint, concurrency) scenario"""
+    endpoint: str
+    concurrency: int
+    requests: int
+    errors: int
+    duration_s: float
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    peak_rss_mb: float
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already-sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Scenario runner (executes inside a fresh worker process)
+# ─────────────────────────────────────────────────────────────────────────────
+
+async def _drive(endpoint: str, concurrency: int, config: BenchConfig) -> BenchResult:
+    os.environ.setdefault("SUPABASE_URL", "http://fake-postgrest.local")
+    os.environ.setdefault("SUPABASE_SERVICE_KEY", "benchmark-service-key")
+
+    import httpx
+    import main
+    from benchmarks.fake_postgrest import FakePostgrest
+    from db import LazyClient, create_async_client
+
+    fake = FakePostgrest.seeded(
+        sites=config.sites,
+        flow_events=config.flow_events,
+        subjects=config.subjects,
+        latency_ms=config.latency_ms,
+    )
+    main.supabase = LazyClient(lambda: create_async_client(
+        os.environ["SUPABASE_URL"],
+        os.environ["SUPABASE_SERVICE_KEY"],
+        observer=main.observe_db_call,
+        transport=fake,
+    ))
+
+    method, template = ENDPOINTS[endpoint]
+    rng = random.Random(7)
+
+    def build_request() -> dict:
+        subject_id = rng.randint(1, config.subjects)
+        request = {"method": method, "url": template.format(page_size=config.page_size, subject_id=subject_id)}
+        if method == "POST":
+            request["json"] = {
+                "subject_id": subject_id,
+                "event_type_id": rng.randint(1, 12),
+                "event_date": "2026-02-09",
+                "session_number": None,
+                "notes": None,
+            }
+        return request
+
+    latencies: list[float] = []
+    errors = 0
+
+    async with main.app.router.lifespan_context(main.app):
+        # App exceptions become 500s (counted as errors) instead of aborting the run
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def worker(count: int, record: bool) -> None:
+                nonlocal errors
+                for _ in range(count):
+                    started = time.perf_counter()
+                    response = await client.request(**build_request())
+                    elapsed = time.perf_counter() - started
+                    if record:
+                        latencies.append(elapsed)
+                        if response.status_code >= 400:
+                            errors += 1
+
+            await asyncio.gather(*(worker(config.warmup // concurrency or 1, False) for _ in range(concurrency)))
+
+            per_worker = max(1, config.requests // concurrency)
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(per_worker, True) for _ in range(concurrency)))
+            duration = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return BenchResult(
+        endpoint=endpoint,
+        concurrency=concurrency,
+        requests=len(ordered),
+        errors=errors,
+        duration_s=round(duration, 3),
+        rps=round(len(ordered) / duration, 1) if duration else 0.0,
+        p50_ms=round(percentile(ordered, 50) * 1000, 2),
+        p95_ms=round(percentile(ordered, 95) * 1000, 2),
+        p99_ms=round(percentile(ordered, 99) * 1000, 2),
+        peak_rss_mb=peak_rss_mb(),
+    )
+
+
+def run_scenario(endpoint: str, concurrency: int, config: BenchConfig) -> BenchResult:
+    """Entry point for the worker process"""
+    # Silence the startup banner so it doesn't interleave with the report
+    sys.stdout = open(os.devnull, "w")
+    return asyncio.run(_drive(endpoint, concurrency, config))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Reporting
+# ─────────────────────────────────────────────────────────────────────────────
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results: list[BenchResult]) -> None:
+    print(f"\n{'endpoint':36} {'conc':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err':>5} {'rss MB':>7}")
+    print("─" * 92)
+    for r in results:
+        print(
+            f"{r.endpoint:36} {r.concurrency:>5} {r.rps:>9.1f} {r.p50_ms:>8.2f} "
+            f"{r.p95_ms:>8.2f} {r.p99_ms:>8.2f} {r.errors:>5} {r.peak_rss_mb:>7.1f}"
+        )
+
+
+def compare(before_path: str, after_path: str) -> None:
+    """Print req/s and p99 deltas between two JSON result files"""
+    before = json.loads(Path(before_path).read_text())
+    after = json.loads(Path(after_path).read_text())
+    baseline = {(r["endpoint"], r["concurrency"]): r for r in before["results"]}
+
+    print(f"\nbefore: {before['meta'].get('commit')}  after: {after['meta'].get('commit')}")
+    print(f"{'endpoint':36} {'conc':>5} {'req/s':>10} {'Δ req/s':>9} {'p99 ms':>8} {'Δ p99':>8}")
+    print("─" * 82)
+    for r in after["results"]:
+        b = baseline.get((r["endpoint"], r["concurrency"]))
+        if b is None:
+            continue
+        d_rps = (r["rps"] - b["rps"]) / b["rps"] * 100 if b["rps"] else 0.0
+        d_p99 = (r["p99_ms"] - b["p99_ms"]) / b["p99_ms"] * 100 if b["p99_ms"] else 0.0
+        print(f"{r['endpoint']:36} {r['concurrency']:>5} {r['rps']:>10.1f} {d_rps:>+8.1f}% {r['p99_ms']:>8.2f} {d_p99:>+7.1f}%")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Main
+# ─────────────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark backend endpoints against an in-process PostgREST stand-in."
+    )
+    defaults = BenchConfig()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms,
+                        help="Artificial latency per PostgREST call (ms).")
+    parser.add_argument("--sites", type=int, default=defaults.sites)
+    parser.add_argument("--flow-events", type=int, default=defaults.flow_events,
+                        help="Rows seeded into log_patient_flow_events.")
+    parser.add_argument("--subjects", type=int, default=defaults.subjects)
+    parser.add_argument("--page-size", type=int, default=defaults.page_size,
+                        help="limit= used for GET /api/flow-events.")
+    parser.add_argument("--requests", type=int, default=defaults.requests,
+                        help="Measured requests per scenario.")
+    parser.add_argument("--warmup", type=int, default=defaults.warmup)
+    parser.add_argument("--concurrency", default="1,8,32",
+                        help="Comma-separated concurrency levels.")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS),
+                        help="Comma-separated subset of endpoint labels to run.")
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="Compare two JSON result files and exit.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    config = BenchConfig(
+        latency_ms=args.latency_ms,
+        sites=args.sites,
+        flow_events=args.flow_events,
+        subjects=args.subjects,
+        page_size=args.page_size,
+        requests=args.requests,
+        warmup=args.warmup,
+    )
+    levels = [int(level) for level in args.concurrency.split(",")]
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",")]
+    unknown = [endpoint for endpoint in endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        parser.error(f"Unknown endpoints: {unknown}. Choose from: {list(ENDPOINTS)}")
+
+    print("=" * 60)
+    print(f"Benchmarking {len(endpoints)} endpoints × {len(levels)} concurrency levels")
+    print(f"  fake DB latency: {config.latency_ms} ms | flow events: {config.flow_events}")
+    print("=" * 60)
+
+    results: list[BenchResult] = []
+    for endpoint in endpoints:
+        for level in levels:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                result = pool.submit(run_scenario, endpoint, level, config).result()
+            results.append(result)
+            print(f"  {endpoint:36} c={level:<4} {result.rps:>9.1f} req/s  p99 {result.p99_ms:.2f} ms")
+
+    print_table(results)
+
+    if args.output:
+        payload = {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "config": asdict(config),
+            },
+            "results": [asdict(result) for result in results],
+        }
+        Path(args.output).write_text(json.dumps(payload, indent=2))
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+fake_postgrest.py
+=================
+In-process PostgREST stand-in for benchmarking the backend without Supabase.
+
+Implements the subset of the PostgREST REST dialect that backend/main.py
+uses (select with eq./gt./gte./lt./lte. filters, order, limit, and JSON
+inserts/upserts) as an httpx transport, with configurable artificial latency and dataset sizes.
+
+Usage:
+  from benchmarks.fake_postgrest import FakePostgrest
+
+  fake = FakePostgrest.seeded(sites=50, flow_events=200_000, latency_ms=5)
+  client = create_async_client("http://fake.local", "key", transport=fake)
+"""
+
+import asyncio
+import json
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+import httpx
+
+Row = Dict[str, Any]
+
+# Primary key per table, used for ordering, gt. cursors and insert ids
+PRIMARY_KEYS = {
+    "sites": "site_id",
+    "ref_flow_event_types": "event_type_id",
+    "log_patient_flow_events": "flow_event_id",
+    "log_clinical_records": "id",
+    "log_safety_events": "ae_id",
+    "log_ae_notifications": "notification_id",
+}
+
+COMPARISONS = {
+    "gt": lambda value, operand: value > operand,
+    "gte": lambda value, operand: value >= operand,
+    "lt": lambda value, operand: value < operand,
+    "lte": lambda value, operand: value <= operand,
+}
+
+
+class FakePostgrest(httpx.AsyncBaseTransport):
+    """
+    httpx transport answering PostgREST-style requests from in-memory tables.
+
+    Every request sleeps `latency_ms` (± `jitter` fraction) before answering,
+    standing in for the network + database round trip.
+    """
+
+    def __init__(self, tables: Dict[str, List[Row]], latency_ms: float = 0.0, jitter: float = 0.1) -> None:
+        self.tables = tables
+        self.latency = latency_ms / 1000
+        self.jitter = jitter
+        self.requests = 0
+        for name, rows in tables.items():
+            rows.sort(key=lambda row: row[PRIMARY_KEYS[name]])
+
+    @classmethod
+    def seeded(
+        cls,
+        sites: int = 25,
+        event_types: int = 12,
+        flow_events: int = 10_000,
+        subjects: int = 2_000,
+        latency_ms: float = 0.0,
+        seed: int = 42,
+    ) -> "FakePostgrest":
+        """Build a deterministic dataset shaped like the real tables"""
+        rng = random.Random(seed)
+        start = date(2024, 1, 1)
+        tables = {
+            "sites": [
+                {"site_id": i, "site_code": f"SITE-{i:03d}", "site_name": f"Research Site {i}", "is_active": True}
+                for i in range(1, sites + 1)
+            ],
+            "ref_flow_event_types": [
+                {
+                    "event_type_id": i,
+                    "event_type_name": f"event_type_{i}",
+                    "event_category": rng.choice(["screening", "treatment", "followup", "completion"]),
+                    "display_order": i,
+                    "is_active": True,
+                }
+                for i in range(1, event_types + 1)
+            ],
+            "log_patient_flow_events": [
+                {
+                    "flow_event_id": i,
+                    "site_id": rng.randint(1, sites),
+                    "subject_id": rng.randint(1, subjects),
+                    "event_type_id": rng.randint(1, event_types),
+                    "event_date": (start + timedelta(days=rng.randint(0, 700))).isoformat(),
+                    "session_number": rng.choice([None, 1, 2, 3]),
+                    "notes": None,
+                    "created_at": "2026-01-01T00:00:00+00:00",
+                }
+                for i in range(1, flow_events + 1)
+            ],
+        }
+        return cls(tables, latency_ms=latency_ms)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+        table = request.url.path.rsplit("/", 1)[-1]
+        if table not in self.tables:
+            return _error(404, f'relation "public.{table}" does not exist')
+
+        if request.method == "GET":
+            return httpx.Response(200, json=self._select(table, request.url.params))
+        if request.method == "POST":
+            await request.aread()
+            payload = json.loads(request.content)
+            if "resolution=ignore-duplicates" in request.headers.get("prefer", ""):
+                payload = self._drop_conflicts(table, payload, request.url.params.get("on_conflict", ""))
+            return httpx.Response(201, json=self._insert(table, payload))
+        return _error(405, f"{request.method} not supported by FakePostgrest")
+
+    def _select(self, table: str, params: httpx.QueryParams) -> List[Row]:
+        rows = self.tables[table]
+        key = PRIMARY_KEYS[table]
+        limit = int(params["limit"]) if "limit" in params else None
+        after = None
+
+        for column, value in params.multi_items():
+            if column in ("select", "order", "limit", "offset"):
+                continue
+            op, _, operand = value.partition(".")
+            if op == "gt" and column == key:
+                after = type(rows[0][key])(operand) if rows else operand
+            elif op == "eq":
+                rows = [row for row in rows if str(row.get(column)) == operand]
+            elif op in COMPARISONS:
+                compare = COMPARISONS[op]
+                rows = [
+                    row for row in rows
+                    if row.get(column) is not None and compare(row[column], type(row[column])(operand))
+                ]
+
+        # Rows are stored in primary-key order (what main.py requests for paging),
+        # so a keyset cursor is a binary search rather than a scan
+        start = _bisect_rows(rows, key, after) if after is not None else 0
+        rows = rows[start:]
+        column, _, direction = params.get("order", key).split(",")[0].partition(".")
+        if column != key or direction.startswith("desc"):
+            rows = sorted(rows, key=lambda row: row[column], reverse=direction.startswith("desc"))
+        return rows[:limit] if limit is not None else rows
+
+    def _drop_conflicts(self, table: str, payload: Row | List[Row], on_conflict: str) -> List[Row]:
+        columns = [column for column in on_conflict.split(",") if column]
+        existing = {tuple(row.get(column) for column in columns) for row in self.tables[table]}
+        rows = []
+        for row in payload if isinstance(payload, list) else [payload]:
+            conflict = tuple(row.get(column) for column in columns)
+            if conflict not in existing:
+                existing.add(conflict)
+                rows.append(row)
+        return rows
+
+    def _insert(self, table: str, payload: Row | List[Row]) -> List[Row]:
+        rows = payload if isinstance(payload, list) else [payload]
+        key = PRIMARY_KEYS[table]
+        existing = self.tables[table]
+        next_id = (existing[-1][key] if existing else 0) + 1
+        inserted = []
+        for offset, row in enumerate(rows):
+            stored = {**row, key: next_id + offset, "created_at": "2026-01-01T00:00:00+00:00"}
+            existing.append(stored)
+            inserted.append(stored)
+        return inserted
+
+
+def _bisect_rows(rows: List[Row], key: str, value: Any) -> int:
+    """Index of the first row whose `key` is strictly greater than `value`"""
+    lo, hi = 0, len(rows)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if rows[mid][key] <= value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _error(status_code: int, message: str) -> httpx.Response:
+    return httpx.Response(status_code, json={"message": message, "code": str(status_code), "hint": None, "details": None})
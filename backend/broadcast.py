@@ -0,0 +1,220 @@
+"""
+PPN Research Portal - Change Broadcasting
+One shared cursor poll per channel (e.g. per site), fanned out to every
+connected client through bounded per-connection buffers, with resume
+from a client's last seen id and an id overlap for late-committing rows
+"""
+
+import asyncio
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Set
+
+FLOW_STREAM_POLL_INTERVAL = float(os.getenv("FLOW_STREAM_POLL_INTERVAL", "1"))
+FLOW_STREAM_PAGE_SIZE = int(os.getenv("FLOW_STREAM_PAGE_SIZE", "500"))
+FLOW_STREAM_CLIENT_BUFFER = int(os.getenv("FLOW_STREAM_CLIENT_BUFFER", "1000"))
+# Ids re-read behind the cursor each poll, for rows that commit after higher ids
+FLOW_STREAM_OVERLAP = int(os.getenv("FLOW_STREAM_OVERLAP", "1000"))
+MAX_BACKOFF = 30.0
+# Polls started by wake() are spaced at least this far apart
+MIN_WAKE_INTERVAL = 0.05
+
+Row = Dict[str, Any]
+# fetch_after(channel, cursor, limit) -> rows with id > cursor, in id order (ids are integers)
+FetchAfter = Callable[[Hashable, Any, int], Awaitable[List[Row]]]
+# fetch_head(channel) -> highest id currently in the channel (None when empty)
+FetchHead = Callable[[Hashable], Awaitable[Any]]
+
+# Queued in place of a subscriber's backlog when it overflows; ends that stream
+_OVERFLOW = object()
+
+
+class _Subscriber:
+    def __init__(self, maxsize: int) -> None:
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+
+class _Channel:
+    def __init__(self, key: Hashable) -> None:
+        self.key = key
+        self.cursor: int | None = None
+        self.floor = 0  # head when the poll started; overlap re-reads stop here
+        self.subscribers: Set[_Subscriber] = set()
+        self.seen: Set[int] = set()  # ids delivered within the overlap window
+        self.wake = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.delivered = 0
+        self.last_error: str | None = None
+
+
+class Broadcaster:
+    """
+    Fans one upstream cursor poll per channel out to many subscribers.
+
+    A channel's poll task starts with its first subscriber and stops with its
+    last, so N clients watching the same channel cost one query stream, not
+    N. Rows are only ever delivered by the poll, in id order; writers in
+    this process call `wake()` so it polls now instead of at the next tick.
+
+    Ids are assigned before commit, so a row can become visible after a
+    higher id was already delivered. Each poll therefore re-reads `overlap`
+    ids behind the cursor and delivers only ids it has not seen. A resume
+    replays the same window behind the client's last id, so it may repeat
+    rows the client already had; clients dedupe on the event id.
+
+    Each subscriber has a bounded buffer. One that falls `buffer_size` rows
+    behind has its stream ended rather than slowing everyone else; it
+    reconnects with its last seen id and catches up from the database.
+    """
+
+    def __init__(
+        self,
+        fetch_after: FetchAfter,
+        fetch_head: FetchHead,
+        id_field: str,
+        poll_interval: float = FLOW_STREAM_POLL_INTERVAL,
+        page_size: int = FLOW_STREAM_PAGE_SIZE,
+        buffer_size: int = FLOW_STREAM_CLIENT_BUFFER,
+        overlap: int = FLOW_STREAM_OVERLAP,
+    ) -> None:
+        self.fetch_after = fetch_after
+        self.fetch_head = fetch_head
+        self.id_field = id_field
+        self.poll_interval = poll_interval
+        self.page_size = page_size
+        self.buffer_size = buffer_size
+        self.overlap = overlap
+        self.channels: Dict[Hashable, _Channel] = {}
+        self.overflows = 0
+
+    async def subscribe(self, key: Hashable, last_id: Any = None) -> AsyncIterator[Row]:
+        """
+        Yield rows for channel `key` as they appear. With `last_id`, rows
+        from `overlap` ids before it are replayed from the database first,
+        then the stream continues live; rows the replay sent are not
+        repeated.
+        """
+        channel = self.channels.get(key)
+        if channel is None:
+            channel = self.channels[key] = _Channel(key)
+            channel.task = asyncio.create_task(self._poll(channel), name=f"broadcast-{key}")
+        subscriber = _Subscriber(self.buffer_size)
+        channel.subscribers.add(subscriber)
+        replayed: Set[int] = set()
+        try:
+            if last_id is not None:
+                after = max(last_id - self.overlap, 0)
+                while True:
+                    rows = await self.fetch_after(key, after, self.page_size)
+                    for row in rows:
+                        replayed.add(row[self.id_field])
+                        yield row
+                    if len(rows) < self.page_size:
+                        break
+                    after = rows[-1][self.id_field]
+            while True:
+                row = await subscriber.queue.get()
+                if row is _OVERFLOW:
+                    return
+                if row[self.id_field] in replayed:
+                    continue
+                yield row
+        finally:
+            channel.subscribers.discard(subscriber)
+            if not channel.subscribers and self.channels.get(key) is channel:
+                del self.channels[key]
+                channel.task.cancel()
+
+    def wake(self, key: Hashable) -> None:
+        """Poll channel `key` now, e.g. right after writing rows to it"""
+        channel = self.channels.get(key)
+        if channel is not None:
+            channel.wake.set()
+
+    def _deliver(self, channel: _Channel, row: Row) -> None:
+        channel.delivered += 1
+        for subscriber in channel.subscribers:
+            if subscriber.overflowed:
+                continue
+            try:
+                subscriber.queue.put_nowait(row)
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+                self.overflows += 1
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(_OVERFLOW)
+
+    async def _poll(self, channel: _Channel) -> None:
+        backoff = self.poll_interval
+        while channel.cursor is None:
+            try:
+                head = await self.fetch_head(channel.key)
+                channel.cursor = channel.floor = head if head is not None else 0
+            except Exception as e:
+                channel.last_error = f"{type(e).__name__}: {e}"
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+
+        loop = asyncio.get_running_loop()
+        backoff = self.poll_interval
+        while True:
+            started = loop.time()
+            channel.wake.clear()
+            try:
+                await self._catch_up(channel)
+            except Exception as e:
+                channel.last_error = f"{type(e).__name__}: {e}"
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+            backoff = self.poll_interval
+            try:
+                await asyncio.wait_for(channel.wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                continue
+            await asyncio.sleep(max(started + MIN_WAKE_INTERVAL - loop.time(), 0))
+
+    async def _catch_up(self, channel: _Channel) -> None:
+        """Read from `overlap` ids behind the cursor and deliver unseen rows in id order"""
+        after = max(channel.cursor - self.overlap, channel.floor)
+        while True:
+            rows = await self.fetch_after(channel.key, after, self.page_size)
+            for row in rows:
+                row_id = row[self.id_field]
+                if row_id not in channel.seen:
+                    channel.seen.add(row_id)
+                    self._deliver(channel, row)
+            if rows:
+                after = rows[-1][self.id_field]
+                channel.cursor = max(channel.cursor, after)
+            if len(rows) < self.page_size:
+                break
+        # Ids at or below the next poll's start are never re-read
+        start = max(channel.cursor - self.overlap, channel.floor)
+        channel.seen = {row_id for row_id in channel.seen if row_id > start}
+
+    async def stop(self) -> None:
+        """Cancel every channel's poll; open streams end with their connections"""
+        channels, self.channels = list(self.channels.values()), {}
+        for channel in channels:
+            channel.task.cancel()
+        await asyncio.gather(*(channel.task for channel in channels), return_exceptions=True)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "channels": {
+                str(key): {
+                    "subscribers": len(channel.subscribers),
+                    "cursor": channel.cursor,
+                    "delivered": channel.delivered,
+                    "last_error": channel.last_error,
+                }
+                for key, channel in self.channels.items()
+            },
+            "subscribers": sum(len(channel.subscribers) for channel in self.channels.values()),
+            "overflows": self.overflows,
+            "poll_interval_s": self.poll_interval,
+            "overlap": self.overlap,
+            "buffer_size": self.buffer_size,
+        }
@@ -0,0 +1,91 @@
+"""
+PPN Research Portal - Reference Data Cache
+In-process TTL cache with strong ETags for slowly-changing reference tables
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable
+
+from serialization import dumps
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    """Pre-encoded JSON body plus its strong ETag"""
+    body: bytes
+    etag: str
+    expires_at: float
+
+    @classmethod
+    def encode(cls, data: Any, ttl: float) -> "CachedBody":
+        body = dumps(data)
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        return cls(body=body, etag=etag, expires_at=time.monotonic() + ttl)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after `ttl` seconds.
+
+    Entries are encoded once on load, so hits and 304 revalidations never
+    touch the database or the JSON encoder.
+    """
+
+    def __init__(self, ttl: float, maxsize: int) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+
+    def get(self, key: Hashable) -> CachedBody | None:
+        """Return the live entry for `key`, dropping it if it has expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expired:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, data: Any) -> CachedBody:
+        """Encode and store `data` under `key`, evicting the oldest entry if full"""
+        entry = CachedBody.encode(data, self.ttl)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, key: Hashable | None = None) -> int:
+        """Drop one key (or every key when None). Returns the number removed."""
+        if key is None:
+            removed = len(self._entries)
+            self._entries.clear()
+            return removed
+        return 1 if self._entries.pop(key, None) is not None else 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against a strong ETag (RFC 9110)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+# Shared cache for reference tables (ref_flow_event_types, sites, ...)
+reference_cache = TTLCache(
+    ttl=float(os.getenv("REFERENCE_CACHE_TTL", "300")),
+    maxsize=int(os.getenv("REFERENCE_CACHE_MAXSIZE", "128")),
+)
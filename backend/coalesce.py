@@ -0,0 +1,76 @@
+"""
+PPN Research Portal - Request Coalescing
+Single-flight execution: identical concurrent reads share one upstream call
+"""
+
+import asyncio
+import functools
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+# observer(name, role) with role "leader" (made the upstream call) or "follower" (shared it)
+FlightObserver = Callable[[str, str], None]
+
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls by key.
+
+    The first caller for a key starts the upstream call as a task; callers
+    arriving while it is in flight await the same task and receive the same
+    result or the same exception. The key is forgotten as soon as the call
+    settles, so nothing is cached - only in-flight work is shared.
+
+    Waiters are shielded from each other: a client disconnecting cancels its
+    own wait, not the shared call the other waiters depend on.
+    """
+
+    def __init__(self, enabled: bool = COALESCE_ENABLED, observer: FlightObserver | None = None) -> None:
+        self.enabled = enabled
+        self.observer = observer
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]], name: str = "") -> T:
+        """Await `fn()`, or join the identical call already in flight for `key`"""
+        if not self.enabled:
+            return await fn()
+
+        task = self._calls.get(key)
+        role = "follower"
+        if task is None:
+            role = "leader"
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(functools.partial(self._settle, key))
+        if self.observer is not None:
+            self.observer(name or str(key), role)
+        return await asyncio.shield(task)
+
+    def _settle(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved; waiters (if any) re-raise it themselves
+
+    def coalesce(self, name: str, key: Callable[..., Hashable]):
+        """
+        Decorator coalescing calls to an async function.
+
+        `key` receives the function's arguments and returns what identifies
+        an identical read (e.g. `lambda db, table: table`); calls with equal
+        keys share one execution.
+        """
+        def decorator(fn: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+            @functools.wraps(fn)
+            async def wrapper(*args: Any, **kwargs: Any) -> T:
+                flight_key = (name, key(*args, **kwargs))
+                return await self.do(flight_key, lambda: fn(*args, **kwargs), name=name)
+            return wrapper
+        return decorator
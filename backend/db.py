@@ -0,0 +1,187 @@
+"""
+PPN Research Portal - Async Data Access Layer
+Pooled, non-blocking PostgREST client for the FastAPI backend
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Union
+
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+
+
+# ============================================================================
+# POOL CONFIGURATION
+# ============================================================================
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """Connection pool limits for the PostgREST HTTP client"""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    timeout: float = 10.0
+    http2: bool = True
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        """Read pool limits from DB_POOL_* environment variables"""
+        defaults = cls()
+        return cls(
+            max_connections=int(os.getenv("DB_POOL_MAX_CONNECTIONS", defaults.max_connections)),
+            max_keepalive_connections=int(
+                os.getenv("DB_POOL_MAX_KEEPALIVE", defaults.max_keepalive_connections)
+            ),
+            keepalive_expiry=float(os.getenv("DB_POOL_KEEPALIVE_EXPIRY", defaults.keepalive_expiry)),
+            timeout=float(os.getenv("DB_TIMEOUT", defaults.timeout)),
+            http2=os.getenv("DB_HTTP2", "true").lower() in ("1", "true", "yes"),
+        )
+
+
+# ============================================================================
+# CLIENT
+# ============================================================================
+
+# observer(table, operation, status, seconds)
+CallObserver = Callable[[str, str, str, float], None]
+
+_OPERATIONS = {
+    "GET": "select",
+    "HEAD": "count",
+    "POST": "insert",
+    "PATCH": "update",
+    "PUT": "upsert",
+    "DELETE": "delete",
+}
+
+
+def classify_request(request: httpx.Request) -> tuple[str, str]:
+    """Map a PostgREST request to (table, operation) for instrumentation"""
+    path = request.url.path
+    table = path.rsplit("/", 1)[-1] or "unknown"
+    if "/rpc/" in path:
+        return table, "rpc"
+    operation = _OPERATIONS.get(request.method, request.method.lower())
+    if operation == "insert" and "resolution=" in request.headers.get("prefer", ""):
+        operation = "upsert"
+    return table, operation
+
+
+class TimedAsyncClient(httpx.AsyncClient):
+    """httpx.AsyncClient that reports each round trip (including body read) to an observer"""
+
+    def __init__(self, *args, observer: CallObserver | None = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.observer = observer
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        if self.observer is None:
+            return await super().send(request, **kwargs)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await super().send(request, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            table, operation = classify_request(request)
+            self.observer(table, operation, status, time.perf_counter() - started)
+
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """
+    AsyncPostgrestClient backed by a keep-alive HTTP/2 connection pool.
+
+    Every `.execute()` is awaited on the event loop instead of blocking it,
+    so concurrent requests on one worker share the pool.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        pool: PoolSettings,
+        headers: Dict[str, str] = DEFAULT_POSTGREST_CLIENT_HEADERS,
+        schema: str = "public",
+        observer: CallObserver | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.pool = pool
+        self.observer = observer
+        self.transport = transport
+        super().__init__(base_url, schema=schema, headers=headers, timeout=pool.timeout)
+
+    def create_session(
+        self,
+        base_url: str,
+        headers: Dict[str, str],
+        timeout: Union[int, float, httpx.Timeout],
+    ) -> httpx.AsyncClient:
+        return TimedAsyncClient(
+            base_url=base_url,
+            observer=self.observer,
+            transport=self.transport,
+            headers=headers,
+            timeout=timeout,
+            http2=self.pool.http2,
+            limits=httpx.Limits(
+                max_connections=self.pool.max_connections,
+                max_keepalive_connections=self.pool.max_keepalive_connections,
+                keepalive_expiry=self.pool.keepalive_expiry,
+            ),
+        )
+
+
+class LazyClient:
+    """
+    Holds the pooled client and creates it on first use.
+
+    Importing the app therefore needs no credentials and opens no connections;
+    the pool (and its TLS context) is only built when a request needs it.
+    """
+
+    def __init__(self, factory: Callable[[], PooledPostgrestClient]) -> None:
+        self._factory = factory
+        self._client: PooledPostgrestClient | None = None
+
+    @property
+    def initialized(self) -> bool:
+        return self._client is not None
+
+    def get(self) -> PooledPostgrestClient:
+        if self._client is None:
+            self._client = self._factory()
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the pool if it was ever created"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_async_client(
+    supabase_url: str,
+    service_key: str,
+    pool: PoolSettings | None = None,
+    observer: CallObserver | None = None,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> PooledPostgrestClient:
+    """
+    Create a pooled PostgREST client for the Supabase REST endpoint.
+    `transport` overrides the network layer (e.g. an in-process PostgREST stand-in).
+    """
+    return PooledPostgrestClient(
+        f"{supabase_url.rstrip('/')}/rest/v1",
+        pool=pool or PoolSettings.from_env(),
+        observer=observer,
+        transport=transport,
+        headers={
+            **DEFAULT_POSTGREST_CLIENT_HEADERS,
+            "apikey": service_key,
+            "Authorization": f"Bearer {service_key}",
+        },
+    )
@@ -0,0 +1,13 @@
+"""
+PPN Research Portal - Clinical Algorithm Engines
+Server-side implementations of the specs in docs/algorithm-specs/
+"""
+
+# Adverse events, as the app records them (createSessionEvent in
+# src/services/clinicalLog.ts). The specs say log_adverse_events/ae_grade;
+# every engine reads the live table through these names instead.
+AE_TABLE = "log_safety_events"
+AE_KEY = "ae_id"                # text primary key, a random UUID (not ordered)
+AE_GRADE = "ctcae_grade"        # CTCAE v5.0, 1-5
+AE_RESOLVED = "is_resolved"
+AE_CREATED = "created_at"
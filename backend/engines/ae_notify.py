@@ -0,0 +1,340 @@
+"""
+PPN Research Portal - AE_NOTIFY_GRADE3PLUS_V1
+Streaming Grade 3+ adverse-event notification processor: new log_safety_events
+rows in, micro-batched log_ae_notifications writes out
+(spec: docs/algorithm-specs/AE_NOTIFY_GRADE3PLUS_V1.md)
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Tuple
+
+from engines import AE_CREATED, AE_GRADE, AE_KEY, AE_TABLE
+from health import percentile
+
+ALGORITHM_ID = "AE_NOTIFY_GRADE3PLUS_V1"
+
+NOTIFY_GRADE = 3            # grade >= 3 notifies (spec §6)
+GRADES = range(1, 6)        # CTCAE v5.0 grades 1-5; anything else is rejected (spec §9)
+
+SOURCE_TABLE = AE_TABLE
+SOURCE_KEY = AE_KEY
+SOURCE_COLUMNS = f"{AE_KEY},session_id,{AE_GRADE},{AE_CREATED}"
+# Created by migrations/086_create_log_ae_notifications.sql
+NOTIFICATION_TABLE = "log_ae_notifications"
+# One notification per event and grade: replays are no-ops, an edit to a new grade notifies again (spec §12)
+NOTIFICATION_CONFLICT = "ae_id,ae_grade"
+
+AE_NOTIFY_ENABLED = os.getenv("AE_NOTIFY_ENABLED", "false").lower() in ("1", "true", "yes")
+POLL_INTERVAL = float(os.getenv("AE_NOTIFY_POLL_INTERVAL", "0.25"))
+# Each poll re-reads this many seconds behind the newest event seen: created_at is
+# the inserting transaction's start time, so an event can commit after later-stamped ones
+OVERLAP = float(os.getenv("AE_NOTIFY_OVERLAP", "60"))
+PAGE_SIZE = int(os.getenv("AE_NOTIFY_PAGE_SIZE", "500"))
+QUEUE_SIZE = int(os.getenv("AE_NOTIFY_QUEUE_SIZE", "2000"))
+BATCH_SIZE = int(os.getenv("AE_NOTIFY_BATCH_SIZE", "200"))
+MAX_BATCH_DELAY = float(os.getenv("AE_NOTIFY_MAX_BATCH_DELAY", "0.02"))
+DEDUP_SIZE = int(os.getenv("AE_NOTIFY_DEDUP_SIZE", "100000"))
+DRAIN_TIMEOUT = float(os.getenv("AE_NOTIFY_DRAIN_TIMEOUT", "5"))
+MAX_BACKOFF = 30.0
+
+Row = Dict[str, Any]
+# Polling position: (created_at, ae_id). ae_id is a random UUID, so it only breaks ties.
+Position = Tuple[str, Any]
+# fetch_after(position, limit) -> qualifying source rows in (created_at, ae_id) order
+# strictly after `position`, or from created_at onwards when its ae_id is None
+FetchAfter = Callable[[Position | None, int], Awaitable[List[Row]]]
+# fetch_cursor() -> newest event already notified; fetch_head() -> newest event recorded
+FetchPosition = Callable[[], Awaitable[Position | None]]
+WriteNotifications = Callable[[List[Row]], Awaitable[Any]]
+# observer(outcome, count, latencies) for metrics
+NotifyObserver = Callable[[str, int, List[float]], None]
+
+
+def classify(row: Any) -> str:
+    """'notify', 'below_threshold' or 'invalid' (NULL/out-of-range grade or no event id)"""
+    if not isinstance(row, dict) or row.get(SOURCE_KEY) is None:
+        return "invalid"
+    grade = row.get(AE_GRADE)
+    if isinstance(grade, bool) or not isinstance(grade, int) or grade not in GRADES:
+        return "invalid"
+    return "notify" if grade >= NOTIFY_GRADE else "below_threshold"
+
+
+def notification(row: Row, notified_at: str) -> Row:
+    """log_ae_notifications record for a qualifying AE (spec §6, plus the event it came from)"""
+    return {
+        "ae_id": row[SOURCE_KEY],
+        "session_id": row.get("session_id"),
+        "ae_grade": row[AE_GRADE],
+        "ae_timestamp": row.get(AE_CREATED),
+        "notified_at": notified_at,
+    }
+
+
+def position(row: Row) -> Position:
+    return row[AE_CREATED], row[SOURCE_KEY]
+
+
+def _timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def rewind(cursor: Position, seconds: float) -> Position:
+    """Open-ended position `seconds` before `cursor`, for re-reading the overlap window"""
+    return (_timestamp(cursor[0]) - timedelta(seconds=seconds)).isoformat(), None
+
+
+def _later(a: Position, b: Position | None) -> bool:
+    return b is None or (_timestamp(a[0]), str(a[1])) > (_timestamp(b[0]), str(b[1]))
+
+
+class QueueFull(RuntimeError):
+    """Raised when a pushed event cannot be queued without waiting"""
+
+
+class AENotificationProcessor:
+    """
+    Consumes new adverse events and writes a notification for every Grade 3+ one.
+
+    Events arrive from a polling cursor over `log_safety_events` ordered by
+    (created_at, ae_id) and, optionally, from a change feed pushed through
+    `push()` (e.g. a database webhook). The cursor resumes from the newest
+    event already notified or, on a first start, from the newest event
+    recorded, so history is not notified wholesale. Every poll re-reads the
+    last `overlap` seconds to catch events that committed late. Both
+    feed one bounded queue: the poller waits for space, so a slow or failing
+    writer stops it fetching instead of growing memory, and pushes fail fast
+    with QueueFull so the sender retries later.
+
+    A single writer drains the queue in micro-batches - whatever is queued,
+    up to `batch_size`, after waiting at most `max_batch_delay` for company -
+    so a quiet period costs one small write per event and a spike collapses
+    into a few large ones. Failed writes are retried with backoff and never
+    dropped. Events are deduplicated by (event, grade) in memory; the upsert
+    ignores duplicates too, so replays and several replicas stay idempotent.
+    """
+
+    def __init__(
+        self,
+        fetch_after: FetchAfter,
+        write: WriteNotifications,
+        fetch_cursor: FetchPosition | None = None,
+        fetch_head: FetchPosition | None = None,
+        poll_interval: float = POLL_INTERVAL,
+        overlap: float = OVERLAP,
+        page_size: int = PAGE_SIZE,
+        queue_size: int = QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        max_batch_delay: float = MAX_BATCH_DELAY,
+        dedup_size: int = DEDUP_SIZE,
+        drain_timeout: float = DRAIN_TIMEOUT,
+        observer: NotifyObserver | None = None,
+    ) -> None:
+        self.fetch_after = fetch_after
+        self.write = write
+        self.fetch_cursor = fetch_cursor
+        self.fetch_head = fetch_head
+        self.poll_interval = poll_interval
+        self.overlap = overlap
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.max_batch_delay = max_batch_delay
+        self.dedup_size = dedup_size
+        self.drain_timeout = drain_timeout
+        self.observer = observer
+        self.queue: "asyncio.Queue[Tuple[Row, float]]" = asyncio.Queue(maxsize=queue_size)
+        self.cursor: Position | None = None    # newest event seen
+        self.floor: Position | None = None     # head at a first start; never re-read behind it
+        self.counts: Dict[str, int] = {
+            "queued": 0, "written": 0, "duplicate": 0, "below_threshold": 0, "invalid": 0, "write_errors": 0,
+        }
+        self.latencies: Deque[float] = deque(maxlen=1000)
+        self.last_error: str | None = None
+        self.last_error_at: float | None = None
+        self.last_poll_at: float | None = None
+        self._seen: "OrderedDict[Tuple[Any, int], None]" = OrderedDict()
+        self._poller: asyncio.Task | None = None
+        self._writer: asyncio.Task | None = None
+
+    @staticmethod
+    def _key(row: Any) -> Tuple[Any, Any] | None:
+        return (row.get(SOURCE_KEY), row.get(AE_GRADE)) if isinstance(row, dict) else None
+
+    def _accept(self, row: Any) -> bool:
+        """Classify and dedupe one event; True when it should be queued"""
+        outcome = classify(row)
+        if outcome == "notify":
+            key = self._key(row)
+            if key in self._seen:
+                outcome = "duplicate"
+            else:
+                self._seen[key] = None
+                while len(self._seen) > self.dedup_size:
+                    self._seen.popitem(last=False)
+        self._count("queued" if outcome == "notify" else outcome)
+        return outcome == "notify"
+
+    async def offer(self, rows: Iterable[Row]) -> int:
+        """Queue qualifying events, waiting for space (backpressure). Returns the number queued."""
+        queued = 0
+        for row in rows:
+            if self._accept(row):
+                await self.queue.put((row, time.monotonic()))
+                queued += 1
+        return queued
+
+    def push(self, rows: List[Row]) -> int:
+        """
+        Queue change-feed events without waiting. Raises QueueFull, queueing
+        nothing, when the batch's qualifying events do not all fit.
+        """
+        qualifying = sum(classify(row) == "notify" for row in rows)
+        if qualifying > self.queue.maxsize - self.queue.qsize():
+            raise QueueFull(f"AE notification queue full ({self.queue.qsize()}/{self.queue.maxsize})")
+        queued = 0
+        for row in rows:
+            if self._accept(row):
+                self.queue.put_nowait((row, time.monotonic()))
+                queued += 1
+        return queued
+
+    async def _poll(self) -> None:
+        backoff = self.poll_interval
+        while self.fetch_cursor is not None and self.cursor is None:
+            try:
+                self.cursor = await self.fetch_cursor()
+                if self.cursor is None and self.fetch_head is not None:
+                    self.cursor = self.floor = await self.fetch_head()
+                break
+            except Exception as e:
+                self._error(e)
+                backoff = await self._backoff(backoff)
+
+        backoff = self.poll_interval
+        after = self._overlap_start()
+        while True:
+            try:
+                rows = await self.fetch_after(after, self.page_size)
+            except Exception as e:
+                self._error(e)
+                backoff = await self._backoff(backoff)
+                continue
+            backoff = self.poll_interval
+            self.last_poll_at = time.time()
+            # Overlap re-reads are expected; skip them here rather than count duplicates
+            await self.offer(row for row in rows if self._key(row) not in self._seen)
+            if rows:
+                after = position(rows[-1])
+                if _later(after, self.cursor):
+                    self.cursor = after
+            if len(rows) < self.page_size:
+                await asyncio.sleep(self.poll_interval)
+                after = self._overlap_start()
+
+    def _overlap_start(self) -> Position | None:
+        """Where the next poll starts: `overlap` seconds behind the cursor, but not behind the floor"""
+        if self.cursor is None:
+            return None
+        after = rewind(self.cursor, self.overlap)
+        if self.floor is not None and _timestamp(after[0]) <= _timestamp(self.floor[0]):
+            return self.floor
+        return after
+
+    async def _next_batch(self) -> List[Tuple[Row, float]]:
+        batch = [await self.queue.get()]
+        if self.queue.empty() and self.max_batch_delay > 0:
+            await asyncio.sleep(self.max_batch_delay)
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _write_batch(self, batch: List[Tuple[Row, float]]) -> None:
+        backoff = self.poll_interval
+        notified_at = datetime.now(timezone.utc).isoformat()
+        records = [notification(row, notified_at) for row, _ in batch]
+        while True:
+            try:
+                await self.write(records)
+                break
+            except Exception as e:
+                self._count("write_errors")
+                self._error(e)
+                backoff = await self._backoff(backoff)
+        now = time.monotonic()
+        latencies = [now - queued_at for _, queued_at in batch]
+        self.latencies.extend(latencies)
+        self._count("written", len(batch), latencies)
+        for _ in batch:
+            self.queue.task_done()
+
+    async def _write(self) -> None:
+        while True:
+            await self._write_batch(await self._next_batch())
+
+    async def _backoff(self, delay: float) -> float:
+        await asyncio.sleep(delay)
+        return min(max(delay * 2, 0.5), MAX_BACKOFF)
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None and not self._writer.done()
+
+    def start(self, poll: bool = True) -> None:
+        """Start the writer and (unless `poll` is False) the polling cursor"""
+        if not self.running:
+            self._writer = asyncio.create_task(self._write(), name="ae-notify-writer")
+        if poll and (self._poller is None or self._poller.done()):
+            self._poller = asyncio.create_task(self._poll(), name="ae-notify-poller")
+
+    async def stop(self) -> None:
+        """Stop polling, give queued notifications `drain_timeout` to be written, then stop the writer"""
+        await _cancel(self._poller)
+        if self.running:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        await _cancel(self._writer)
+        self._poller = self._writer = None
+
+    def _count(self, outcome: str, count: int = 1, latencies: List[float] | None = None) -> None:
+        self.counts[outcome] += count
+        if self.observer is not None:
+            self.observer(outcome, count, latencies or [])
+
+    def _error(self, e: Exception) -> None:
+        self.last_error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        self.last_error_at = time.time()
+
+    def status(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        p50, p99 = percentile(ordered, 50), percentile(ordered, 99)
+        return {
+            "algorithm_id": ALGORITHM_ID,
+            "running": self.running,
+            "polling": self._poller is not None and not self._poller.done(),
+            "cursor": self.cursor,
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "batch_size": self.batch_size,
+            "events": dict(self.counts),
+            "latency_p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+            "latency_p99_ms": round(p99 * 1000, 2) if p99 is not None else None,
+            "last_poll_at": self.last_poll_at,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+        }
+
+
+async def _cancel(task: asyncio.Task | None) -> None:
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
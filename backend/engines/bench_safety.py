@@ -0,0 +1,451 @@
+"""
+PPN Research Portal - BENCH_SAFETY_RATE_V1
+Per-session adverse event rates for every practitioner/substance/month segment,
+with n<5 suppression and cached peer distributions
+(spec: docs/algorithm-specs/BENCH_SAFETY_RATE_V1.md)
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from engines import AE_CREATED, AE_GRADE, AE_KEY
+
+ALGORITHM_ID = "BENCH_SAFETY_RATE_V1"
+
+# Segments with fewer contributing sessions are suppressed (spec §7, non-negotiable)
+MIN_SESSIONS = 5
+GRADE3 = 3
+NO_SUBSTANCE = -1
+
+SESSION_TABLE = "log_clinical_records"
+SESSION_COLUMNS = "id,practitioner_id,substance_id,session_date"
+AE_COLUMNS = f"{AE_KEY},session_id,{AE_GRADE},{AE_CREATED}"
+
+REFRESH_INTERVAL = float(os.getenv("BENCH_SAFETY_REFRESH_INTERVAL", "30"))
+FULL_RELOAD_INTERVAL = float(os.getenv("BENCH_SAFETY_FULL_RELOAD_INTERVAL", "900"))
+PEER_CACHE_SIZE = int(os.getenv("BENCH_SAFETY_PEER_CACHE_SIZE", "256"))
+
+Row = Dict[str, Any]
+FetchRows = Callable[[], Awaitable[List[Row]]]
+# fetch_new_adverse_events(created_after) -> rows with created_at > created_after
+FetchNewRows = Callable[[str], Awaitable[List[Row]]]
+
+
+def _month(value: str | date) -> int:
+    """Months since 1970-01 for an ISO date/timestamp"""
+    return int(np.datetime64(str(value)[:7], "M").astype(np.int64))
+
+
+def _month_label(month: int) -> str:
+    return str(np.datetime64(month, "M"))
+
+
+def _pct(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1) * 100, np.nan)
+
+
+# ============================================================================
+# SEGMENT TABLE (one grouped pass)
+# ============================================================================
+
+@dataclass
+class SafetySegments:
+    """
+    Sessions and sessions-with-AE counted per (practitioner, substance, month).
+
+    Only non-empty segments are stored, as parallel arrays. Each session
+    remembers its segment and whether it already counts as an AE / Grade 3+
+    session, so AEs arriving later are added without double counting
+    (the rate is per session, not per event - spec §12).
+    """
+    practitioners: np.ndarray       # practitioner_id per practitioner index
+    substances: np.ndarray          # substance_id per substance index (NO_SUBSTANCE = none)
+    seg_practitioner: np.ndarray
+    seg_substance: np.ndarray
+    seg_month: np.ndarray
+    seg_sessions: np.ndarray
+    seg_ae: np.ndarray
+    seg_grade3: np.ndarray
+    session_ids: np.ndarray         # sorted, for AE -> session lookup
+    session_segment: np.ndarray
+    session_has_ae: np.ndarray
+    session_has_grade3: np.ndarray
+
+    @classmethod
+    def build(cls, columns: Dict[str, np.ndarray]) -> "SafetySegments":
+        """
+        Build from column arrays: session_id, practitioner_id, substance_id,
+        month (sessions) and ae_session_id, ae_grade (adverse events).
+        """
+        order = np.argsort(columns["session_id"], kind="stable")
+        session_ids = columns["session_id"][order]
+        practitioners, practitioner_index = np.unique(columns["practitioner_id"][order], return_inverse=True)
+        substances, substance_index = np.unique(columns["substance_id"][order], return_inverse=True)
+        month = columns["month"][order]
+
+        # Segment key per session -> dense segment index
+        month_base = int(month.min()) if len(month) else 0
+        month_span = int(month.max()) - month_base + 1 if len(month) else 1
+        key = (practitioner_index.astype(np.int64) * len(substances) + substance_index) * month_span + (month - month_base)
+        segment_keys, session_segment = np.unique(key, return_inverse=True)
+
+        n_segments = len(segment_keys)
+        seg_month = segment_keys % month_span + month_base
+        seg_substance = (segment_keys // month_span) % max(len(substances), 1)
+        seg_practitioner = segment_keys // month_span // max(len(substances), 1)
+
+        segments = cls(
+            practitioners=practitioners,
+            substances=substances,
+            seg_practitioner=seg_practitioner,
+            seg_substance=seg_substance,
+            seg_month=seg_month,
+            seg_sessions=np.bincount(session_segment, minlength=n_segments),
+            seg_ae=np.zeros(n_segments, dtype=np.int64),
+            seg_grade3=np.zeros(n_segments, dtype=np.int64),
+            session_ids=session_ids,
+            session_segment=session_segment,
+            session_has_ae=np.zeros(len(session_ids), dtype=bool),
+            session_has_grade3=np.zeros(len(session_ids), dtype=bool),
+        )
+        segments.add_adverse_events(columns["ae_session_id"], columns["ae_grade"])
+        return segments
+
+    def add_adverse_events(self, session_ids: np.ndarray, grades: np.ndarray) -> int:
+        """
+        Count AEs against their sessions. Returns the number of AEs whose
+        session is not in the table (logged against a session newer than it).
+        """
+        if len(session_ids) == 0 or len(self.session_ids) == 0:
+            return len(session_ids)
+        position = np.searchsorted(self.session_ids, session_ids)
+        position = np.minimum(position, len(self.session_ids) - 1)
+        known = self.session_ids[position] == session_ids
+        position, grades = position[known], grades[known]
+
+        for flags, counts, hit in (
+            (self.session_has_ae, self.seg_ae, position),
+            (self.session_has_grade3, self.seg_grade3, position[grades >= GRADE3]),
+        ):
+            newly = np.unique(hit[~flags[hit]])
+            flags[newly] = True
+            np.add.at(counts, self.session_segment[newly], 1)
+        return int((~known).sum())
+
+    def practitioner_index(self, practitioner_id: str) -> int | None:
+        position = int(np.searchsorted(self.practitioners, practitioner_id))
+        if position < len(self.practitioners) and self.practitioners[position] == practitioner_id:
+            return position
+        return None
+
+    def substance_index(self, substance_id: int) -> int | None:
+        position = int(np.searchsorted(self.substances, substance_id))
+        if position < len(self.substances) and self.substances[position] == substance_id:
+            return position
+        return None
+
+    def segment_mask(self, substance: int | None, first_month: int, last_month: int) -> np.ndarray:
+        mask = (self.seg_month >= first_month) & (self.seg_month <= last_month)
+        if substance is not None:
+            mask &= self.seg_substance == substance
+        return mask
+
+
+def build_segments(columns: Dict[str, np.ndarray]) -> SafetySegments:
+    """SafetySegments.build as a module-level function, for the analytics process pool"""
+    return SafetySegments.build(columns)
+
+
+def rows_to_columns(sessions: Sequence[Row], adverse_events: Sequence[Row]) -> Dict[str, np.ndarray]:
+    """Convert PostgREST rows into the columns SafetySegments.build expects"""
+    sessions = [row for row in sessions if row.get("practitioner_id") and row.get("session_date")]
+    return {
+        "session_id": np.array([str(row["id"]) for row in sessions], dtype=str),
+        "practitioner_id": np.array([str(row["practitioner_id"]) for row in sessions], dtype=str),
+        "substance_id": np.fromiter(
+            (row["substance_id"] if row.get("substance_id") is not None else NO_SUBSTANCE for row in sessions),
+            dtype=np.int64, count=len(sessions),
+        ),
+        "month": np.fromiter((_month(row["session_date"]) for row in sessions), dtype=np.int64, count=len(sessions)),
+        **adverse_event_columns(adverse_events),
+    }
+
+
+def adverse_event_columns(adverse_events: Sequence[Row]) -> Dict[str, np.ndarray]:
+    adverse_events = [row for row in adverse_events if row.get("session_id")]
+    return {
+        "ae_session_id": np.array([str(row["session_id"]) for row in adverse_events], dtype=str),
+        "ae_grade": np.fromiter(
+            (row.get(AE_GRADE) or 0 for row in adverse_events), dtype=np.int64, count=len(adverse_events)
+        ),
+    }
+
+
+# ============================================================================
+# PEER DISTRIBUTIONS + BENCHMARKS
+# ============================================================================
+
+@dataclass(frozen=True)
+class PeerDistribution:
+    """Per-practitioner totals for one (substance, month range) cohort"""
+    sessions: np.ndarray       # indexed by practitioner index
+    ae: np.ndarray
+    grade3: np.ndarray
+    eligible_rates: np.ndarray  # sorted AE rates of practitioners with n >= MIN_SESSIONS
+
+    @classmethod
+    def compute(cls, segments: SafetySegments, mask: np.ndarray) -> "PeerDistribution":
+        n = len(segments.practitioners)
+        owner = segments.seg_practitioner[mask]
+        sessions = np.bincount(owner, weights=segments.seg_sessions[mask], minlength=n).astype(np.int64)
+        ae = np.bincount(owner, weights=segments.seg_ae[mask], minlength=n).astype(np.int64)
+        grade3 = np.bincount(owner, weights=segments.seg_grade3[mask], minlength=n).astype(np.int64)
+        eligible = sessions >= MIN_SESSIONS
+        return cls(sessions, ae, grade3, np.sort(_pct(ae[eligible], sessions[eligible])))
+
+
+def _rate(value: float) -> float:
+    return round(float(value), 2)
+
+
+def segment_rates(segments: SafetySegments, mask: np.ndarray) -> List[Dict[str, Any]]:
+    """Month-level segment rates with n<5 segments suppressed (no rate, no counts)"""
+    index = np.flatnonzero(mask)
+    sessions = segments.seg_sessions[index]
+    ae_rate = _pct(segments.seg_ae[index], sessions)
+    grade3_rate = _pct(segments.seg_grade3[index], sessions)
+    suppressed = sessions < MIN_SESSIONS
+
+    results = []
+    for i, seg in enumerate(index):
+        substance = int(segments.substances[segments.seg_substance[seg]])
+        row = {
+            "practitioner_id": str(segments.practitioners[segments.seg_practitioner[seg]]),
+            "substance_id": None if substance == NO_SUBSTANCE else substance,
+            "month": _month_label(int(segments.seg_month[seg])),
+            "suppressed": bool(suppressed[i]),
+        }
+        if not suppressed[i]:
+            row.update(n_sessions=int(sessions[i]), ae_rate_pct=_rate(ae_rate[i]), ae_grade3_rate_pct=_rate(grade3_rate[i]))
+        results.append(row)
+    return results
+
+
+class BenchSafetyEngine:
+    """
+    BENCH_SAFETY_RATE_V1 over an in-memory segment table.
+
+    The table is rebuilt from log_clinical_records + log_safety_events every
+    `full_reload_interval`; in between, new safety events are polled by
+    created_at and folded in, which invalidates the cached peer
+    distributions. Peer distributions are cached per (substance, month range)
+    and shared by every practitioner's benchmark query for that cohort.
+    """
+
+    def __init__(
+        self,
+        fetch_sessions: FetchRows,
+        fetch_adverse_events: FetchRows,
+        fetch_new_adverse_events: FetchNewRows,
+        build: Callable[[Dict[str, np.ndarray]], Awaitable[SafetySegments]] | None = None,
+        refresh_interval: float = REFRESH_INTERVAL,
+        full_reload_interval: float = FULL_RELOAD_INTERVAL,
+        peer_cache_size: int = PEER_CACHE_SIZE,
+    ) -> None:
+        self.fetch_sessions = fetch_sessions
+        self.fetch_adverse_events = fetch_adverse_events
+        self.fetch_new_adverse_events = fetch_new_adverse_events
+        self.build = build
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self.peer_cache_size = peer_cache_size
+        self.segments: SafetySegments | None = None
+        self.version = 0
+        self.ae_high_water: str | None = None
+        self.unmatched_adverse_events = 0
+        self.refreshed_at: float | None = None
+        self.reloaded_at: float | None = None
+        self.reload_seconds: float | None = None
+        self._peers: "OrderedDict[Tuple[int | None, int, int], PeerDistribution]" = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self.refreshed_at is not None and time.monotonic() - self.refreshed_at < self.refresh_interval
+
+    async def refresh(self, force: bool = False) -> None:
+        """Fold in new safety events, or rebuild the table when a reload is due"""
+        if not force and self._is_fresh():
+            return
+        async with self._lock:
+            if not force and self._is_fresh():
+                return
+
+            reload_due = (
+                self.segments is None
+                or self.unmatched_adverse_events > 0  # AEs for sessions newer than the table
+                or time.monotonic() - self.reloaded_at >= self.full_reload_interval
+            )
+            if force or reload_due:
+                await self._reload()
+            else:
+                rows = await self.fetch_new_adverse_events(self.ae_high_water)
+                self.add_adverse_events(rows)
+            self.refreshed_at = time.monotonic()
+
+    async def _reload(self) -> None:
+        started = time.perf_counter()
+        sessions, adverse_events = await asyncio.gather(self.fetch_sessions(), self.fetch_adverse_events())
+        columns = rows_to_columns(sessions, adverse_events)
+        segments = await self.build(columns) if self.build else build_segments(columns)
+
+        self.segments = segments
+        # AEs whose session is still missing after a full reload are orphans; don't reload for them again
+        self.unmatched_adverse_events = 0
+        self.ae_high_water = max((row["created_at"] for row in adverse_events if row.get("created_at")), default=self.ae_high_water)
+        self._invalidate()
+        self.reloaded_at = time.monotonic()
+        self.reload_seconds = time.perf_counter() - started
+
+    def add_adverse_events(self, rows: Sequence[Row]) -> None:
+        """Fold newly logged safety events into the table and drop cached peer data"""
+        if not rows or self.segments is None:
+            return
+        columns = adverse_event_columns(rows)
+        self.unmatched_adverse_events += self.segments.add_adverse_events(columns["ae_session_id"], columns["ae_grade"])
+        self.ae_high_water = max(
+            [self.ae_high_water or ""] + [row["created_at"] for row in rows if row.get("created_at")]
+        ) or None
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        self.version += 1
+        self._peers.clear()
+
+    def peer_distribution(self, substance: int | None, first_month: int, last_month: int) -> PeerDistribution:
+        key = (substance, first_month, last_month)
+        peers = self._peers.get(key)
+        if peers is None:
+            peers = PeerDistribution.compute(self.segments, self.segments.segment_mask(substance, first_month, last_month))
+            self._peers[key] = peers
+            while len(self._peers) > self.peer_cache_size:
+                self._peers.popitem(last=False)
+        else:
+            self._peers.move_to_end(key)
+        return peers
+
+    def _cohort(self, substance_id: int | None, start: date | None, end: date | None) -> Tuple[int | None, int, int, bool]:
+        last_month = _month(end or date.today())
+        # Default: trailing 12 months including the end month (spec §7)
+        first_month = _month(start) if start is not None else last_month - 11
+        substance = None
+        if substance_id is not None:
+            substance = self.segments.substance_index(substance_id)
+        return substance, first_month, last_month, substance_id is not None and substance is None
+
+    def benchmark(
+        self,
+        practitioner_id: str,
+        substance_id: int | None = None,
+        start: date | None = None,
+        end: date | None = None,
+    ) -> Dict[str, Any]:
+        """Own vs. peer AE rates for one practitioner and cohort (spec §6)"""
+        substance, first_month, last_month, unknown_substance = self._cohort(substance_id, start, end)
+        own = self.segments.practitioner_index(practitioner_id)
+
+        if unknown_substance:
+            n = len(self.segments.practitioners)
+            peers = PeerDistribution(*(np.zeros(n, dtype=np.int64),) * 3, np.empty(0))
+        else:
+            peers = self.peer_distribution(substance, first_month, last_month)
+
+        own_sessions = int(peers.sessions[own]) if own is not None else 0
+        own_ae = int(peers.ae[own]) if own is not None else 0
+        own_grade3 = int(peers.grade3[own]) if own is not None else 0
+        # Peer cohort = the network minus this practice
+        peer_sessions = int(peers.sessions.sum()) - own_sessions
+        peer_ae = int(peers.ae.sum()) - own_ae
+        peer_grade3 = int(peers.grade3.sum()) - own_grade3
+        peer_practices = int((peers.sessions > 0).sum()) - (1 if own_sessions else 0)
+
+        result: Dict[str, Any] = {
+            "algorithm_id": ALGORITHM_ID,
+            "practitioner_id": practitioner_id,
+            "substance_id": substance_id,
+            "start": _month_label(first_month),
+            "end": _month_label(last_month),
+            "n_own": own_sessions,
+            "own_rate": None,
+            "own_grade3_rate": None,
+            "own_message": None,
+            "n_peer": peer_sessions,
+            "n_peer_practices": peer_practices,
+            "peer_rate": None,
+            "peer_grade3_rate": None,
+            "peer_message": None,
+            "delta": None,
+            "percentile_rank": None,
+        }
+
+        if own_sessions >= MIN_SESSIONS:
+            result["own_rate"] = _rate(own_ae / own_sessions * 100)
+            result["own_grade3_rate"] = _rate(own_grade3 / own_sessions * 100)
+        else:
+            result["own_message"] = "Insufficient data — log more sessions to unlock comparison"
+
+        if unknown_substance:
+            result["peer_message"] = "No benchmark data for this substance yet"
+        elif peer_sessions >= MIN_SESSIONS:
+            result["peer_rate"] = _rate(peer_ae / peer_sessions * 100)
+            result["peer_grade3_rate"] = _rate(peer_grade3 / peer_sessions * 100)
+        else:
+            result["peer_message"] = "Insufficient peer data for this segment"
+
+        if result["own_rate"] is not None and result["peer_rate"] is not None:
+            result["delta"] = _rate(result["own_rate"] - result["peer_rate"])
+            own_rate = own_ae / own_sessions * 100
+            # Share of other eligible practices with a lower AE rate
+            others = len(peers.eligible_rates) - 1
+            if others > 0:
+                lower = int(np.searchsorted(peers.eligible_rates, own_rate, side="left"))
+                result["percentile_rank"] = round(lower / others * 100, 1)
+        return result
+
+    def segment_rates(
+        self,
+        practitioner_id: str | None = None,
+        substance_id: int | None = None,
+        start: date | None = None,
+        end: date | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Suppressed month-level rates for every matching segment"""
+        substance, first_month, last_month, unknown_substance = self._cohort(substance_id, start, end)
+        if unknown_substance:
+            return []
+        mask = self.segments.segment_mask(substance, first_month, last_month)
+        if practitioner_id is not None:
+            own = self.segments.practitioner_index(practitioner_id)
+            if own is None:
+                return []
+            mask &= self.segments.seg_practitioner == own
+        return segment_rates(self.segments, mask)
+
+    def status(self) -> Dict[str, Any]:
+        segments = self.segments
+        return {
+            "algorithm_id": ALGORITHM_ID,
+            "sessions": len(segments.session_ids) if segments else 0,
+            "practitioners": len(segments.practitioners) if segments else 0,
+            "segments": len(segments.seg_sessions) if segments else 0,
+            "version": self.version,
+            "cached_peer_cohorts": len(self._peers),
+            "reload_seconds": round(self.reload_seconds, 3) if self.reload_seconds is not None else None,
+        }
@@ -0,0 +1,327 @@
+"""
+PPN Research Portal - CONTRAINDICATION_IBOGAINE_V1
+Indexed contraindication rule engine for batch intake screening
+(spec: docs/algorithm-specs/CONTRAINDICATION_IBOGAINE_V1.md)
+"""
+
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+ALGORITHM_ID = "CONTRAINDICATION_IBOGAINE_V1"
+
+# Reference tables the rule index is compiled from (via the reference cache)
+INTERACTION_TABLE = "ref_clinical_interactions"
+MEDICATION_TABLE = "ref_medications"
+SUBSTANCE_TABLE = "ref_substances"
+RULE_TABLES = (INTERACTION_TABLE, MEDICATION_TABLE, SUBSTANCE_TABLE)
+
+# Engine runs only for these primary substances (spec §6); anything else is NOT_APPLICABLE
+APPLICABLE_SUBSTANCES = frozenset({"ibogaine", "ibogaine_hcl", "tpa"})
+
+# QTc bands (spec §7): [450, 500) RELATIVE, >= 500 ABSOLUTE
+QTC_BANDS = np.array([450.0, 500.0])
+QTC_NORMAL, QTC_ELEVATED, QTC_ABSOLUTE, QTC_MISSING = range(4)
+
+# ref_clinical_interactions.risk_bucket -> tier. Lower buckets (efficacy
+# blunting, monitor only, insufficient evidence) are not contraindications.
+BUCKET_TIERS = {
+    "ABSOLUTE_CONTRAINDICATION": "ABSOLUTE",
+    "STRONG_CAUTION": "RELATIVE",
+    "CLINICIAN_REVIEW": "RELATIVE",
+}
+# Fallback for rows whose risk_bucket has not been backfilled
+SEVERITY_TIERS = {"life-threatening": "ABSOLUTE", "high": "RELATIVE"}
+
+TIERS = ("ABSOLUTE", "RELATIVE", "NONE", "NOT_APPLICABLE")
+
+# Clinical flags: code -> (tier, UI label) per spec §7
+FLAGS = {
+    "QTC_ABSOLUTE": ("ABSOLUTE", "QTc significantly elevated — major cardiac risk"),
+    "SEIZURE_DISORDER": ("ABSOLUTE", "Active seizure disorder: Ibogaine lowers seizure threshold"),
+    "HEPATIC_SEVERE": ("ABSOLUTE", "Severe hepatic impairment: Ibogaine is hepatotoxic"),
+    "QTC_ELEVATED": ("RELATIVE", "QTc elevated baseline — close monitoring required"),
+    "QTC_MISSING": ("RELATIVE", "Baseline QTc not documented — required before dosing"),
+    "ARRHYTHMIA_HISTORY": ("RELATIVE", "Cardiac arrhythmia history noted"),
+    "PSYCHOSIS_HISTORY": ("RELATIVE", "Psychiatric risk factor: prior psychosis"),
+    "HEPATIC_MODERATE": ("RELATIVE", "Moderate hepatic impairment: dose adjustment consideration"),
+}
+# Unanswered safety checks are UNKNOWN, not negative (spec §9)
+NOTES = {
+    "SEIZURE_UNKNOWN": "Seizure history: not documented",
+    "HEPATIC_SEVERITY_UNKNOWN": "Hepatic impairment severity: not documented",
+}
+
+# Hepatic severity codes; Child-Pugh B/C map onto moderate/severe
+HEPATIC_NONE, HEPATIC_MODERATE, HEPATIC_SEVERE, HEPATIC_UNKNOWN = range(4)
+HEPATIC_SEVERITIES = {"moderate": HEPATIC_MODERATE, "b": HEPATIC_MODERATE, "severe": HEPATIC_SEVERE, "c": HEPATIC_SEVERE}
+
+# Identifiers echoed back so callers can join results to their rows
+PASSTHROUGH_FIELDS = ("id", "session_id", "patient_uuid", "patient_link_code", "practitioner_id")
+
+Row = Dict[str, Any]
+
+
+def _substance_key(name: Any) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(name).lower()).strip("_")
+
+
+def _is_ibogaine(name: Any) -> bool:
+    key = _substance_key(name)
+    return key in APPLICABLE_SUBSTANCES or key.startswith("ibogaine")
+
+
+def name_aliases(name: str) -> List[str]:
+    """
+    Lookup keys for a drug name: the full name plus its base and
+    parenthesised parts, so 'Sertraline (Zoloft)' matches 'sertraline'
+    and 'zoloft', and 'Zepbound (tirzepatide)' matches 'tirzepatide'.
+    """
+    name = " ".join(name.lower().split())
+    aliases = [name, re.sub(r"\s*\(.*?\)\s*", " ", name).strip()]
+    aliases.extend(part.strip() for part in re.findall(r"\((.*?)\)", name))
+    return [alias for alias in dict.fromkeys(aliases) if alias]
+
+
+def _rule_tier(row: Row) -> str | None:
+    bucket = row.get("risk_bucket")
+    if bucket:
+        return BUCKET_TIERS.get(bucket)
+    return SEVERITY_TIERS.get(str(row.get("severity_grade") or "").lower())
+
+
+class RuleIndex:
+    """
+    Ibogaine interaction rules compiled once into hash indexes.
+
+    `by_name` maps every alias of an interactor to its rule numbers and
+    `by_medication` maps ref_medications.medication_id to the rules its
+    name matches, so screening a patient is one dict lookup per medication
+    instead of a scan of the rule table. `version` identifies the reference
+    data the index was compiled from.
+    """
+
+    def __init__(
+        self,
+        rules: List[Row],
+        by_name: Dict[str, Tuple[int, ...]],
+        by_medication: Dict[str, Tuple[int, ...]],
+        substance_ids: frozenset,
+        version: Any = None,
+    ) -> None:
+        self.rules = rules
+        self.by_name = by_name
+        self.by_medication = by_medication
+        self.substance_ids = substance_ids
+        self.version = version
+
+    @classmethod
+    def compile(
+        cls,
+        interactions: Iterable[Row],
+        medications: Iterable[Row] = (),
+        substances: Iterable[Row] = (),
+        version: Any = None,
+    ) -> "RuleIndex":
+        rules: List[Row] = []
+        by_name: Dict[str, List[int]] = {}
+        for row in interactions:
+            tier = _rule_tier(row)
+            if tier is None or not row.get("interactor_name") or not _is_ibogaine(row.get("substance_name", "")):
+                continue
+            rules.append({
+                "tier": tier,
+                "code": "DRUG_INTERACTION",
+                "label": f"Drug interaction: {row['interactor_name']}",
+                "rule_key": row.get("rule_key"),
+                "interactor": row["interactor_name"],
+                "risk_bucket": row.get("risk_bucket"),
+                "note": row.get("screening_note"),
+            })
+            for alias in name_aliases(row["interactor_name"]):
+                by_name.setdefault(alias, []).append(len(rules) - 1)
+
+        by_medication: Dict[str, Tuple[int, ...]] = {}
+        for row in medications:
+            matched = sorted({
+                rule for alias in name_aliases(row.get("medication_name") or "") for rule in by_name.get(alias, ())
+            })
+            if matched:
+                by_medication[str(row["medication_id"])] = tuple(matched)
+
+        substance_ids = frozenset(
+            str(row["substance_id"]) for row in substances
+            if row.get("substance_id") is not None and _is_ibogaine(row.get("substance_name", ""))
+        )
+        return cls(rules, {k: tuple(v) for k, v in by_name.items()}, by_medication, substance_ids, version)
+
+    def applies_to(self, item: Row) -> bool:
+        if item.get("primary_substance") is not None:
+            return _is_ibogaine(item["primary_substance"])
+        return str(item.get("primary_substance_id")) in self.substance_ids
+
+    def match(self, medication_ids: Iterable[Any], medication_names: Iterable[str]) -> List[int]:
+        """Rule numbers matched by a patient's medications, deduplicated, in rule order"""
+        matched = set()
+        for medication_id in medication_ids:
+            matched.update(self.by_medication.get(str(medication_id), ()))
+        for name in medication_names:
+            if not isinstance(name, str):
+                continue
+            for alias in name_aliases(name):
+                matched.update(self.by_name.get(alias, ()))
+        return sorted(matched)
+
+    def status(self) -> Dict[str, Any]:
+        tiers = Counter(rule["tier"] for rule in self.rules)
+        return {
+            "algorithm_id": ALGORITHM_ID,
+            "rules": len(self.rules),
+            "absolute_rules": tiers["ABSOLUTE"],
+            "relative_rules": tiers["RELATIVE"],
+            "indexed_names": len(self.by_name),
+            "indexed_medications": len(self.by_medication),
+        }
+
+
+# ============================================================================
+# BATCH SCREENING
+# ============================================================================
+
+def _flag(value: Any) -> int:
+    """Safety-check answer as 1 (TRUE), 0 (FALSE) or -1 (not answered)"""
+    if value is None:
+        return -1
+    return 1 if value is True else 0
+
+
+def _qtc(value: Any) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return np.nan
+    return float(value)
+
+
+def _hepatic(item: Row) -> int:
+    if item.get("has_hepatic_impairment") is not True:
+        return HEPATIC_NONE
+    severity = item.get("hepatic_impairment_severity") or item.get("child_pugh_class")
+    return HEPATIC_SEVERITIES.get(str(severity).strip().lower(), HEPATIC_UNKNOWN)
+
+
+def _validate(item: Any, default_substance: str | None) -> str | None:
+    if not isinstance(item, dict):
+        return str(item) if isinstance(item, ValueError) else "Row must be a JSON object"
+    if item.get("primary_substance") is None and item.get("primary_substance_id") is None and not default_substance:
+        return "primary_substance or primary_substance_id is required"
+    for field in ("medication_ids", "medications"):
+        if not isinstance(item.get(field, []), list):
+            return f"{field} must be a list"
+    qtc = item.get("qtc_baseline_ms")
+    if qtc is not None and np.isnan(_qtc(qtc)):
+        return "qtc_baseline_ms must be a number"
+    return None
+
+
+def screen(index: RuleIndex, items: Sequence[Any], default_substance: str | None = None) -> List[Row]:
+    """
+    Screen a batch of intakes: {primary_substance | primary_substance_id,
+    medication_ids?, medications?, qtc_baseline_ms?, has_* safety checks,
+    hepatic_impairment_severity | child_pugh_class?}. One result per item.
+
+    The threshold and safety-check rules are evaluated as masks over the
+    whole batch; medications resolve through the rule index. Advisory
+    only - the result never blocks a session (spec §2, §10).
+    """
+    n = len(items)
+    errors = [_validate(item, default_substance) for item in items]
+    valid = [i for i in range(n) if errors[i] is None]
+    rows: List[Row] = [items[i] if errors[i] is None else {} for i in range(n)]
+    if default_substance:
+        rows = [
+            row if row.get("primary_substance") is not None or row.get("primary_substance_id") is not None
+            else {**row, "primary_substance": default_substance}
+            for row in rows
+        ]
+
+    applicable = np.zeros(n, dtype=bool)
+    applicable[valid] = [index.applies_to(rows[i]) for i in valid]
+
+    qtc = np.fromiter((_qtc(row.get("qtc_baseline_ms")) for row in rows), dtype=float, count=n)
+    qtc_band = np.where(np.isnan(qtc), QTC_MISSING, np.digitize(np.nan_to_num(qtc), QTC_BANDS))
+    seizure = np.fromiter((_flag(row.get("has_active_seizure_disorder")) for row in rows), dtype=np.int8, count=n)
+    arrhythmia = np.fromiter((_flag(row.get("has_cardiac_arrhythmia_history")) for row in rows), dtype=np.int8, count=n)
+    psychosis = np.fromiter((_flag(row.get("has_psychiatric_psychosis_history")) for row in rows), dtype=np.int8, count=n)
+    hepatic = np.fromiter((_hepatic(row) for row in rows), dtype=np.int8, count=n)
+
+    masks = {
+        "QTC_ABSOLUTE": qtc_band == QTC_ABSOLUTE,
+        "SEIZURE_DISORDER": seizure == 1,
+        "HEPATIC_SEVERE": hepatic == HEPATIC_SEVERE,
+        "QTC_ELEVATED": qtc_band == QTC_ELEVATED,
+        "QTC_MISSING": qtc_band == QTC_MISSING,
+        "ARRHYTHMIA_HISTORY": arrhythmia == 1,
+        "PSYCHOSIS_HISTORY": psychosis == 1,
+        "HEPATIC_MODERATE": hepatic == HEPATIC_MODERATE,
+    }
+    note_masks = {"SEIZURE_UNKNOWN": seizure == -1, "HEPATIC_SEVERITY_UNKNOWN": hepatic == HEPATIC_UNKNOWN}
+
+    absolute: List[List[Row]] = [[] for _ in range(n)]
+    relative: List[List[Row]] = [[] for _ in range(n)]
+    notes: List[List[str]] = [[] for _ in range(n)]
+    for code, mask in masks.items():
+        tier, label = FLAGS[code]
+        target = absolute if tier == "ABSOLUTE" else relative
+        for i in np.flatnonzero(mask & applicable):
+            flag = {"code": code, "label": label}
+            if code in ("QTC_ABSOLUTE", "QTC_ELEVATED"):
+                flag["qtc_baseline_ms"] = rows[i]["qtc_baseline_ms"]
+            target[i].append(flag)
+    for code, mask in note_masks.items():
+        for i in np.flatnonzero(mask & applicable):
+            notes[i].append(NOTES[code])
+
+    for i in np.flatnonzero(applicable):
+        row = rows[i]
+        for rule in index.match(row.get("medication_ids") or (), row.get("medications") or ()):
+            flag = {key: value for key, value in index.rules[rule].items() if key != "tier"}
+            (absolute if index.rules[rule]["tier"] == "ABSOLUTE" else relative)[i].append(flag)
+
+    results = []
+    for i, item in enumerate(items):
+        result = {field: item[field] for field in PASSTHROUGH_FIELDS if isinstance(item, dict) and field in item}
+        if errors[i]:
+            result.update({"tier": None, "error": errors[i]})
+        elif not applicable[i]:
+            result["tier"] = "NOT_APPLICABLE"
+        else:
+            result.update({
+                "tier": "ABSOLUTE" if absolute[i] else "RELATIVE" if relative[i] else "NONE",
+                "absolute_flags": absolute[i],
+                "relative_flags": relative[i],
+                "notes": notes[i],
+            })
+        results.append(result)
+    return results
+
+
+def summarize(results: Iterable[Row]) -> Dict[str, Any]:
+    """Patients per tier and per flag code"""
+    tiers: Counter = Counter()
+    flags: Counter = Counter()
+    errors = 0
+    for row in results:
+        if row.get("error"):
+            errors += 1
+            continue
+        tiers[row["tier"]] += 1
+        for flag in row.get("absolute_flags", []) + row.get("relative_flags", []):
+            flags[flag["rule_key"] or flag["interactor"] if flag["code"] == "DRUG_INTERACTION" else flag["code"]] += 1
+    return {
+        "algorithm_id": ALGORITHM_ID,
+        "advisory_only": True,
+        "tiers": {tier: tiers[tier] for tier in TIERS},
+        "errors": errors,
+        "flags": dict(flags.most_common()),
+    }
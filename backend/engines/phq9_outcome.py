@@ -0,0 +1,188 @@
+"""
+PPN Research Portal - OUTCOME_RESPONSE_PHQ9_V1
+Vectorized PHQ-9 response/remission classification for baseline/follow-up pairs
+(spec: docs/algorithm-specs/OUTCOME_RESPONSE_PHQ9_V1.md)
+"""
+
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+ALGORITHM_ID = "OUTCOME_RESPONSE_PHQ9_V1"
+
+PHQ9_MIN, PHQ9_MAX = 0, 27
+REMISSION_MAX = 4           # follow-up total <= 4
+RESPONSE_PCT = 50.0         # >= 50% reduction
+PARTIAL_RESPONSE_PCT = 25.0
+
+# assessment_timing values (ref_assessment_timings) and their nominal day offsets
+WINDOW_DAYS = {"post_7d": 7, "post_30d": 30, "post_90d": 90, "post_180d": 180}
+WINDOWS = tuple(WINDOW_DAYS)
+PRIMARY_WINDOW = "post_90d"
+
+# Class codes; -1 means not computable (phq9_response_class = NULL)
+CLASSES = ("REMISSION", "RESPONSE", "PARTIAL_RESPONSE", "NON_RESPONSE", "BASELINE_REMISSION")
+REMISSION, RESPONSE, PARTIAL_RESPONSE, NON_RESPONSE, BASELINE_REMISSION = range(len(CLASSES))
+NOT_COMPUTABLE = -1
+
+# Pairs in the benchmark rate denominator. BASELINE_REMISSION is flagged for
+# review and left out. PARTIAL_RESPONSE is a PPN-internal label, not a benchmark
+# export category, so in the rates it counts as a non-responder (spec §7, §12)
+BENCHMARK_CLASSES = (REMISSION, RESPONSE, PARTIAL_RESPONSE, NON_RESPONSE)
+# Benchmark export category per class code
+BENCHMARK_EXPORT = {
+    REMISSION: "REMISSION",
+    RESPONSE: "RESPONSE",
+    PARTIAL_RESPONSE: "NON_RESPONSE",
+    NON_RESPONSE: "NON_RESPONSE",
+}
+
+# Identifiers echoed back so callers can join results to their rows
+PASSTHROUGH_FIELDS = ("id", "session_id", "patient_uuid", "practitioner_id")
+
+Row = Dict[str, Any]
+
+
+def classify(baseline: np.ndarray, followup: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Classify score pairs. Missing or out-of-range scores are NaN.
+
+    Returns (class codes, pct_change). Baseline 0 is BASELINE_REMISSION
+    whatever the follow-up (spec §9), since there is no reduction to measure;
+    otherwise REMISSION supersedes the %-reduction tiers (spec §6).
+    """
+    valid = ~(np.isnan(baseline) | np.isnan(followup))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_change = np.where(valid & (baseline > 0), (baseline - followup) / baseline * 100, np.nan)
+
+    codes = np.select(
+        [
+            ~valid,
+            baseline == 0,
+            followup <= REMISSION_MAX,
+            pct_change >= RESPONSE_PCT,
+            pct_change >= PARTIAL_RESPONSE_PCT,
+        ],
+        [NOT_COMPUTABLE, BASELINE_REMISSION, REMISSION, RESPONSE, PARTIAL_RESPONSE],
+        default=NON_RESPONSE,
+    ).astype(np.int8)
+    return codes, pct_change
+
+
+def window_for_days(days: np.ndarray) -> np.ndarray:
+    """Map follow-up day offsets to the nearest assessment window index"""
+    nominal = np.array(list(WINDOW_DAYS.values()), dtype=float)
+    midpoints = (nominal[1:] + nominal[:-1]) / 2
+    return np.searchsorted(midpoints, days, side="left")
+
+
+def _score(value: Any) -> float:
+    """PHQ-9 total as float, NaN when missing or outside 0-27 (NULL rejected)"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return np.nan
+    if value != int(value) or not PHQ9_MIN <= value <= PHQ9_MAX:
+        return np.nan
+    return float(value)
+
+
+def score_pairs(items: Sequence[Any], default_window: str = PRIMARY_WINDOW) -> List[Row]:
+    """
+    Score submitted pairs: {phq9_baseline_total, phq9_followup_total,
+    assessment_window?, id/session_id/...}. One result per item, in order.
+    """
+    n = len(items)
+    baseline = np.full(n, np.nan)
+    followup = np.full(n, np.nan)
+    windows: List[str | None] = [None] * n
+    errors: List[str | None] = [None] * n
+
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors[i] = str(item) if isinstance(item, ValueError) else "Row must be a JSON object"
+            continue
+        window = item.get("assessment_window") or default_window
+        if window not in WINDOW_DAYS:
+            errors[i] = f"assessment_window must be one of {', '.join(WINDOWS)}"
+            continue
+        windows[i] = window
+        baseline[i] = _score(item.get("phq9_baseline_total"))
+        followup[i] = _score(item.get("phq9_followup_total"))
+        if np.isnan(baseline[i]) or np.isnan(followup[i]):
+            errors[i] = "phq9_baseline_total and phq9_followup_total must be integers 0-27"
+
+    codes, pct_change = classify(baseline, followup)
+
+    results = []
+    for i, item in enumerate(items):
+        row = {field: item[field] for field in PASSTHROUGH_FIELDS if isinstance(item, dict) and field in item}
+        row.update(_result(windows[i], baseline[i], followup[i], pct_change[i], codes[i]))
+        if errors[i]:
+            row["error"] = errors[i]
+        results.append(row)
+    return results
+
+
+def score_deltas(rows: Sequence[Row]) -> List[Row]:
+    """
+    Score mv_outcome_deltas_by_timepoint rows (baseline_phq9, f_phq9,
+    timepoint_days), assigning each to its nearest assessment window.
+    """
+    n = len(rows)
+    baseline = np.fromiter((_score(row.get("baseline_phq9")) for row in rows), dtype=float, count=n)
+    followup = np.fromiter((_score(row.get("f_phq9")) for row in rows), dtype=float, count=n)
+    days = np.fromiter(
+        (row.get("timepoint_days") if row.get("timepoint_days") is not None else np.nan for row in rows),
+        dtype=float, count=n,
+    )
+    window_index = window_for_days(days)
+    codes, pct_change = classify(baseline, followup)
+
+    results = []
+    for i, row in enumerate(rows):
+        window = WINDOWS[window_index[i]] if not np.isnan(days[i]) else None
+        result = {
+            "patient_uuid": row.get("patient_uuid"),
+            "timepoint_days": row.get("timepoint_days"),
+            "followup_date": row.get("f_assessment_date"),
+        }
+        result.update(_result(window, baseline[i], followup[i], pct_change[i], codes[i]))
+        results.append(result)
+    return results
+
+
+def _result(window: str | None, baseline: float, followup: float, pct_change: float, code: int) -> Row:
+    return {
+        "assessment_window": window,
+        "phq9_baseline_total": None if np.isnan(baseline) else int(baseline),
+        "phq9_followup_total": None if np.isnan(followup) else int(followup),
+        "pct_change": None if np.isnan(pct_change) else round(float(pct_change), 1),
+        "phq9_response_class": None if code == NOT_COMPUTABLE else CLASSES[code],
+        "flagged_for_review": bool(code == BASELINE_REMISSION),
+        "benchmark_eligible": bool(code in BENCHMARK_CLASSES),
+        "benchmark_class": BENCHMARK_EXPORT.get(int(code)),
+    }
+
+
+def summarize(results: Iterable[Row]) -> Dict[str, Any]:
+    """
+    Per-window class counts plus response/remission rates over benchmark-eligible
+    pairs, where partial responders count as non-responders
+    """
+    summary: Dict[str, Dict[str, Any]] = {}
+    for row in results:
+        window = row["assessment_window"] or "unknown"
+        bucket = summary.setdefault(
+            window, {"pairs": 0, "not_computable": 0, "responders": 0, **{name: 0 for name in CLASSES}}
+        )
+        bucket["pairs"] += 1
+        bucket[row["phq9_response_class"] or "not_computable"] += 1
+        # Remission supersedes response in the class, so count >=50% reductions directly
+        if row["benchmark_eligible"] and row["pct_change"] is not None and row["pct_change"] >= RESPONSE_PCT:
+            bucket["responders"] += 1
+
+    for bucket in summary.values():
+        eligible = sum(bucket[CLASSES[code]] for code in BENCHMARK_CLASSES)
+        bucket["benchmark_eligible"] = eligible
+        bucket["response_rate"] = round(bucket["responders"] / eligible, 4) if eligible else None
+        bucket["remission_rate"] = round(bucket["REMISSION"] / eligible, 4) if eligible else None
+    return {"algorithm_id": ALGORITHM_ID, "windows": summary}
@@ -0,0 +1,452 @@
+"""
+PPN Research Portal - RELEASE_READY_PSILOCYBIN_V1
+Incremental release-readiness state per active session, driven by dose,
+release-check and adverse-event changes plus a timer wheel for the 4-hour
+observation threshold, with push updates to subscribers
+(spec: docs/algorithm-specs/RELEASE_READY_PSILOCYBIN_V1.md)
+"""
+
+import asyncio
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterable, List, Set, Tuple
+
+from engines import AE_GRADE, AE_KEY, AE_RESOLVED, AE_TABLE
+
+ALGORITHM_ID = "RELEASE_READY_PSILOCYBIN_V1"
+
+MIN_OBSERVATION_HOURS = 4.0
+NOTIFY_GRADE = 3
+
+READY, NOT_READY, NOT_APPLICABLE = "READY", "NOT_READY", "NOT_APPLICABLE"
+# Spec §6 criteria, in display order
+CRITERIA = ("hrs_sufficient", "ambulates", "alert", "vitals_ok", "no_grade3_ae", "escort_present")
+# log_release_checks column behind each checklist criterion; unchecked (NULL) is unmet (spec §9)
+CHECKLIST = {
+    "ambulates": "ambulates_independently",
+    "alert": "alert_and_oriented",
+    "vitals_ok": "vitals_stable",
+    "escort_present": "responsible_party_present",
+}
+
+DOSE_TABLE = "log_dose_events"
+DOSE_COLUMNS = "session_id,dose_timestamp"
+CHECK_TABLE = "log_release_checks"
+CHECK_COLUMNS = "session_id," + ",".join(CHECKLIST.values()) + ",practitioner_released_at,created_at"
+AE_COLUMNS = f"{AE_KEY},session_id,{AE_GRADE},{AE_RESOLVED}"
+# Session ids per in.() filter when loading, keeping request URLs short
+SESSION_BATCH = 200
+
+RELEASE_READY_ENABLED = os.getenv("RELEASE_READY_ENABLED", "false").lower() in ("1", "true", "yes")
+TICK_SECONDS = float(os.getenv("RELEASE_READY_TICK", "1"))
+WHEEL_SLOTS = int(os.getenv("RELEASE_READY_WHEEL_SLOTS", "3600"))
+# Sessions leave the active set this long after their last dose (or first sighting without one)
+ACTIVE_HOURS = float(os.getenv("RELEASE_READY_ACTIVE_HOURS", "24"))
+FULL_RELOAD_INTERVAL = float(os.getenv("RELEASE_READY_FULL_RELOAD_INTERVAL", "900"))
+SUBSCRIBER_QUEUE = int(os.getenv("RELEASE_READY_SUBSCRIBER_QUEUE", "256"))
+MAX_BACKOFF = 60.0
+
+Row = Dict[str, Any]
+# fetch_doses(since ISO) -> dose events at or after `since`
+FetchDoses = Callable[[str], Awaitable[List[Row]]]
+# fetch_for_sessions(session_ids) -> rows for those sessions
+FetchForSessions = Callable[[List[Any]], Awaitable[List[Row]]]
+
+
+def _epoch(value: Any) -> float | None:
+    """ISO timestamp (or epoch seconds) as epoch seconds; None when missing or unparseable"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _iso(epoch: float | None) -> str | None:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat() if epoch is not None else None
+
+
+# ============================================================================
+# TIMER WHEEL
+# ============================================================================
+
+class TimerWheel:
+    """
+    Hashed timing wheel: `slots` buckets of `tick` seconds each.
+
+    Scheduling and cancelling are O(1) whatever the number of timers, and
+    advancing only visits the buckets for elapsed ticks. A timer due more
+    than one revolution ahead stays in its bucket until its tick comes round.
+    A key has at most one timer: rescheduling moves it.
+    """
+
+    def __init__(self, tick: float = TICK_SECONDS, slots: int = WHEEL_SLOTS, now: float | None = None) -> None:
+        self.tick = tick
+        self.buckets: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self.current = math.floor((time.time() if now is None else now) / tick)
+        self._due: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def schedule(self, key: Hashable, at: float) -> None:
+        """Fire `key` at epoch `at` (on the next advance if already past)"""
+        due = max(math.ceil(at / self.tick), self.current + 1)
+        if self._due.get(key) == due:
+            return
+        self.cancel(key)
+        self._due[key] = due
+        self.buckets[due % len(self.buckets)][key] = due
+
+    def cancel(self, key: Hashable) -> None:
+        due = self._due.pop(key, None)
+        if due is not None:
+            del self.buckets[due % len(self.buckets)][key]
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Move the wheel to `now` and return the keys that came due, in due order"""
+        target = math.floor(now / self.tick)
+        steps = min(target - self.current, len(self.buckets))
+        fired: List[Tuple[int, Hashable]] = []
+        for step in range(1, steps + 1):
+            bucket = self.buckets[(self.current + step) % len(self.buckets)]
+            for key, due in list(bucket.items()):
+                if due <= target:
+                    fired.append((due, key))
+                    del bucket[key]
+                    del self._due[key]
+        self.current = max(self.current, target)
+        fired.sort(key=lambda entry: entry[0])
+        return [key for _, key in fired]
+
+
+# ============================================================================
+# SESSION STATE
+# ============================================================================
+
+@dataclass
+class SessionReadiness:
+    """Inputs and last evaluated readiness for one active session"""
+    session_id: Any
+    last_dose_at: float | None = None
+    checks: Row = field(default_factory=dict)
+    open_grade3_aes: Set[Any] = field(default_factory=set)
+    released_at: str | None = None
+    first_seen_at: float = field(default_factory=time.time)
+    release_ready: str = NOT_APPLICABLE
+    failing: Tuple[str, ...] = ()
+    version: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def ready_at(self) -> float | None:
+        return self.last_dose_at + MIN_OBSERVATION_HOURS * 3600 if self.last_dose_at is not None else None
+
+    @property
+    def expires_at(self) -> float:
+        return (self.last_dose_at or self.first_seen_at) + ACTIVE_HOURS * 3600
+
+    def criteria(self, now: float) -> Dict[str, bool]:
+        criteria = {name: self.checks.get(column) is True for name, column in CHECKLIST.items()}
+        criteria["hrs_sufficient"] = self.ready_at is not None and now >= self.ready_at
+        criteria["no_grade3_ae"] = not self.open_grade3_aes
+        return {name: criteria[name] for name in CRITERIA}
+
+    def evaluate(self, now: float) -> Tuple[str, Tuple[str, ...]]:
+        """(release_ready, failing criteria); N/A without a dose event (spec §9)"""
+        if self.last_dose_at is None:
+            return NOT_APPLICABLE, ()
+        failing = tuple(name for name, met in self.criteria(now).items() if not met)
+        return (NOT_READY if failing else READY), failing
+
+    def as_dict(self, now: float | None = None) -> Row:
+        now = time.time() if now is None else now
+        return {
+            "session_id": self.session_id,
+            "release_ready": self.release_ready,
+            "failing_criteria": list(self.failing),
+            "criteria": self.criteria(now) if self.last_dose_at is not None else None,
+            "last_dose_at": _iso(self.last_dose_at),
+            "ready_at": _iso(self.ready_at),
+            "hrs_since_dosing": round((now - self.last_dose_at) / 3600, 2) if self.last_dose_at is not None else None,
+            "open_grade3_ae_ids": sorted(self.open_grade3_aes, key=str),
+            "practitioner_released_at": self.released_at,
+            "version": self.version,
+            "updated_at": _iso(self.updated_at),
+        }
+
+
+class Subscription:
+    """One push subscriber: a bounded queue of (event, payload), optionally filtered by session"""
+
+    def __init__(self, session_ids: Iterable[Any] | None = None, maxsize: int = SUBSCRIBER_QUEUE) -> None:
+        self.session_ids = frozenset(str(session_id) for session_id in session_ids) if session_ids else None
+        self.queue: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue(maxsize=maxsize)
+        self.resyncs = 0
+
+    def matches(self, session_id: Any) -> bool:
+        return self.session_ids is None or str(session_id) in self.session_ids
+
+
+# ============================================================================
+# TRACKER
+# ============================================================================
+
+class ReleaseReadinessTracker:
+    """
+    Release readiness for every active session, kept up to date incrementally.
+
+    A dose event, release check or adverse-event change re-evaluates only the
+    session it belongs to. The 4-hour threshold and the active-window expiry
+    are timers on a TimerWheel, so crossing them costs nothing until they
+    fire. Whenever a session's readiness or failing criteria change,
+    subscribers receive a `readiness` event; sessions leaving the active set
+    (practitioner release or expiry) send `removed`. A subscriber that falls
+    `SUBSCRIBER_QUEUE` events behind is resynced with a fresh `snapshot`
+    instead of buffering without bound.
+
+    The full state is rebuilt from the tables on start and every
+    `full_reload_interval` seconds, to pick up changes that bypassed the
+    change feed.
+    """
+
+    def __init__(
+        self,
+        fetch_doses: FetchDoses,
+        fetch_checks: FetchForSessions,
+        fetch_adverse_events: FetchForSessions,
+        wheel: TimerWheel | None = None,
+        full_reload_interval: float = FULL_RELOAD_INTERVAL,
+        subscriber_queue: int = SUBSCRIBER_QUEUE,
+    ) -> None:
+        self.fetch_doses = fetch_doses
+        self.fetch_checks = fetch_checks
+        self.fetch_adverse_events = fetch_adverse_events
+        self.wheel = wheel or TimerWheel()
+        self.full_reload_interval = full_reload_interval
+        self.subscriber_queue = subscriber_queue
+        self.sessions: Dict[str, SessionReadiness] = {}
+        self.loaded_at: float | None = None
+        self.events_applied = 0
+        self.last_error: str | None = None
+        self.last_error_at: float | None = None
+        self._subscribers: Set[Subscription] = set()
+        self._pending: List[Tuple[str, str, Row]] | None = None  # changes seen during a reload
+        self._task: asyncio.Task | None = None
+
+    def apply(self, table: str, record: Row, change: str = "INSERT") -> bool:
+        """
+        Apply one row change from DOSE_TABLE, CHECK_TABLE or AE_TABLE.
+        Returns False when the row is not one the tracker understands.
+        """
+        if not isinstance(record, dict) or record.get("session_id") is None:
+            return False
+        if table not in (DOSE_TABLE, CHECK_TABLE, AE_TABLE):
+            return False
+        if self._pending is not None:
+            self._pending.append((table, change, record))
+        self.events_applied += 1
+        self._apply(self.sessions, table, record, change, time.time())
+        self._refresh(str(record["session_id"]))
+        return True
+
+    def _apply(self, sessions: Dict[str, SessionReadiness], table: str, record: Row, change: str, now: float) -> None:
+        key = str(record["session_id"])
+        state = sessions.get(key)
+        if state is None:
+            if change == "DELETE":
+                return
+            state = sessions[key] = SessionReadiness(session_id=record["session_id"], first_seen_at=now)
+
+        if table == DOSE_TABLE:
+            dosed_at = _epoch(record.get("dose_timestamp"))
+            if change != "DELETE" and dosed_at is not None:
+                state.last_dose_at = max(state.last_dose_at or dosed_at, dosed_at)
+        elif table == CHECK_TABLE:
+            if change != "DELETE":
+                state.checks = {column: record.get(column) for column in CHECKLIST.values()}
+                state.released_at = record.get("practitioner_released_at")
+        else:
+            grade = record.get(AE_GRADE)
+            blocking = (
+                change != "DELETE" and isinstance(grade, int) and grade >= NOTIFY_GRADE
+                and record.get(AE_RESOLVED) is not True
+            )
+            if blocking:
+                state.open_grade3_aes.add(record.get(AE_KEY))
+            else:
+                state.open_grade3_aes.discard(record.get(AE_KEY))
+
+    def _refresh(self, key: str, now: float | None = None) -> None:
+        """Re-evaluate one session, reschedule its timers and publish if its readiness changed"""
+        state = self.sessions.get(key)
+        if state is None:
+            return
+        now = time.time() if now is None else now
+        if state.released_at is not None or now >= state.expires_at:
+            self._remove(key, "released" if state.released_at is not None else "expired", now)
+            return
+
+        self.wheel.schedule((key, "expire"), state.expires_at)
+        if state.ready_at is not None and state.ready_at > now:
+            self.wheel.schedule((key, "threshold"), state.ready_at)
+        else:
+            self.wheel.cancel((key, "threshold"))
+
+        release_ready, failing = state.evaluate(now)
+        if (release_ready, failing) != (state.release_ready, state.failing) or state.version == 0:
+            state.release_ready, state.failing = release_ready, failing
+            state.version += 1
+            state.updated_at = now
+            self._publish("readiness", state.session_id, state.as_dict(now))
+
+    def _remove(self, key: str, reason: str, now: float) -> None:
+        state = self.sessions.pop(key)
+        self.wheel.cancel((key, "expire"))
+        self.wheel.cancel((key, "threshold"))
+        # Final state is kept with the release for audit (spec §10)
+        state.release_ready, state.failing = state.evaluate(now)
+        self._publish("removed", state.session_id, {**state.as_dict(now), "reason": reason})
+
+    def tick(self, now: float | None = None) -> int:
+        """Advance the timer wheel; returns the number of timers that fired"""
+        now = time.time() if now is None else now
+        fired = self.wheel.advance(now)
+        for key, _ in fired:
+            self._refresh(key, now)
+        return len(fired)
+
+    async def load(self) -> None:
+        """Rebuild every active session from the tables, then publish what changed"""
+        self._pending = []
+        try:
+            now = time.time()
+            sessions: Dict[str, SessionReadiness] = {}
+            for row in await self.fetch_doses(_iso(now - ACTIVE_HOURS * 3600)):
+                self._apply(sessions, DOSE_TABLE, row, "INSERT", now)
+            session_ids = [state.session_id for state in sessions.values()]
+            if session_ids:
+                for row in await self.fetch_checks(session_ids):
+                    if str(row.get("session_id")) in sessions:
+                        self._apply(sessions, CHECK_TABLE, row, "INSERT", now)
+                for row in await self.fetch_adverse_events(session_ids):
+                    if str(row.get("session_id")) in sessions:
+                        self._apply(sessions, AE_TABLE, row, "INSERT", now)
+            # Changes that arrived while the tables were being read win over the reload
+            for table, change, record in self._pending:
+                self._apply(sessions, table, record, change, now)
+        finally:
+            self._pending = None
+
+        previous, self.sessions = self.sessions, sessions
+        for key, state in previous.items():
+            if key not in sessions:
+                self.wheel.cancel((key, "expire"))
+                self.wheel.cancel((key, "threshold"))
+                self._publish("removed", state.session_id, {**state.as_dict(now), "reason": "reloaded"})
+            else:
+                carried = sessions[key]
+                carried.release_ready, carried.failing = state.release_ready, state.failing
+                carried.version, carried.first_seen_at = state.version, state.first_seen_at
+        for key in list(sessions):
+            self._refresh(key, now)
+        self.loaded_at = time.monotonic()
+
+    async def _run(self) -> None:
+        backoff = self.wheel.tick
+        while self.loaded_at is None:
+            try:
+                await self.load()
+            except Exception as e:
+                self._error(e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            self.tick()
+            if time.monotonic() - self.loaded_at >= self.full_reload_interval:
+                try:
+                    await self.load()
+                except Exception as e:
+                    self._error(e)
+                    self.loaded_at = time.monotonic()  # retry at the next interval
+
+    def start(self) -> None:
+        """Start the background load + timer task"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="release-readiness")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self, session_ids: Iterable[Any] | None = None) -> List[Row]:
+        now = time.time()
+        wanted = {str(session_id) for session_id in session_ids} if session_ids else None
+        return [
+            state.as_dict(now) for key, state in self.sessions.items()
+            if wanted is None or key in wanted
+        ]
+
+    def _publish(self, event: str, session_id: Any, payload: Row) -> None:
+        for subscription in self._subscribers:
+            if not subscription.matches(session_id):
+                continue
+            try:
+                subscription.queue.put_nowait((event, payload))
+            except asyncio.QueueFull:
+                # Too far behind: drop the backlog and send a fresh snapshot instead
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait(("resync", None))
+                subscription.resyncs += 1
+
+    async def subscribe(self, session_ids: Iterable[Any] | None = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield ('snapshot', [states]) and then ('readiness' | 'removed', state) as sessions change"""
+        subscription = Subscription(session_ids, self.subscriber_queue)
+        self._subscribers.add(subscription)
+        try:
+            yield "snapshot", self.snapshot(subscription.session_ids)
+            while True:
+                event, payload = await subscription.queue.get()
+                if event == "resync":
+                    yield "snapshot", self.snapshot(subscription.session_ids)
+                else:
+                    yield event, payload
+        finally:
+            self._subscribers.discard(subscription)
+
+    def _error(self, e: Exception) -> None:
+        self.last_error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+        self.last_error_at = time.time()
+
+    def status(self) -> Row:
+        counts = {READY: 0, NOT_READY: 0, NOT_APPLICABLE: 0}
+        for state in self.sessions.values():
+            counts[state.release_ready] += 1
+        return {
+            "algorithm_id": ALGORITHM_ID,
+            "running": self._task is not None and not self._task.done(),
+            "loaded": self.loaded_at is not None,
+            "active_sessions": len(self.sessions),
+            "sessions_by_state": counts,
+            "timers": len(self.wheel),
+            "subscribers": len(self._subscribers),
+            "events_applied": self.events_applied,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+        }
@@ -0,0 +1,124 @@
+"""
+PPN Research Portal - Database Health Sampler
+Background latency sampling so liveness/readiness probes answer from memory
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict
+
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile of an already-sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class DatabaseHealthSampler:
+    """
+    Runs `probe()` every `interval` seconds on a background task and keeps a
+    rolling window of latencies plus the last error.
+
+    Readiness only flips after `failure_threshold` consecutive failures (or
+    when samples go stale), so a brief Supabase hiccup does not take every
+    replica out of rotation at once.
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[], Awaitable[Any]],
+        interval: float = 5.0,
+        window: int = 120,
+        timeout: float = 2.0,
+        failure_threshold: int = 3,
+    ) -> None:
+        self.probe = probe
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.last_error: str | None = None
+        self.last_error_at: float | None = None
+        self.last_success_at: float | None = None
+        self.samples = 0
+        self._task: asyncio.Task | None = None
+
+    @classmethod
+    def from_env(cls, probe: Callable[[], Awaitable[Any]]) -> "DatabaseHealthSampler":
+        """Build a sampler configured from HEALTH_* environment variables"""
+        return cls(
+            probe,
+            interval=float(os.getenv("HEALTH_SAMPLE_INTERVAL", "5")),
+            window=int(os.getenv("HEALTH_SAMPLE_WINDOW", "120")),
+            timeout=float(os.getenv("HEALTH_SAMPLE_TIMEOUT", "2")),
+            failure_threshold=int(os.getenv("HEALTH_FAILURE_THRESHOLD", "3")),
+        )
+
+    async def sample_once(self) -> None:
+        """Run one probe and record its latency or error"""
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.probe(), timeout=self.timeout)
+        except Exception as e:
+            self.consecutive_failures += 1
+            self.last_error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            self.last_error_at = time.time()
+        else:
+            self.latencies.append(time.perf_counter() - started)
+            self.consecutive_failures = 0
+            self.last_success_at = time.time()
+        finally:
+            self.samples += 1
+
+    async def _run(self) -> None:
+        while True:
+            await self.sample_once()
+            # Jitter so replicas drift apart instead of probing in lockstep
+            await asyncio.sleep(self.interval * random.uniform(0.9, 1.1))
+
+    def start(self) -> None:
+        """Start the background sampling task"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="db-health-sampler")
+
+    async def stop(self) -> None:
+        """Cancel the background sampling task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def ready(self) -> bool:
+        """Database is reachable per the most recent samples"""
+        if self.last_success_at is None:
+            return False
+        stale_after = self.interval * (self.failure_threshold + 1) + self.timeout
+        if time.time() - self.last_success_at > stale_after:
+            return False
+        return self.consecutive_failures < self.failure_threshold
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Rolling latency percentiles (ms) and error state, without any I/O"""
+        ordered = sorted(self.latencies)
+        p50, p99 = percentile(ordered, 50), percentile(ordered, 99)
+        return {
+            "ready": self.ready,
+            "samples": self.samples,
+            "window": len(ordered),
+            "latency_p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+            "latency_p99_ms": round(p99 * 1000, 2) if p99 is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+            "last_success_at": self.last_success_at,
+        }
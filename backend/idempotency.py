@@ -0,0 +1,206 @@
+"""
+PPN Research Portal - Idempotency Keys
+Replays the stored response for a retried write instead of repeating it
+"""
+
+import hashlib
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Tuple
+
+from coalesce import SingleFlight
+from serialization import dumps
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAXSIZE = int(os.getenv("IDEMPOTENCY_MAXSIZE", "10000"))
+# Optional PostgREST table persisting keys across restarts and replicas (unset: memory only)
+IDEMPOTENCY_TABLE = os.getenv("IDEMPOTENCY_TABLE", "")
+MAX_KEY_LENGTH = 255
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# observer(outcome) with outcome "created", "replayed", "coalesced" or "conflict"
+IdempotencyObserver = Callable[[str], None]
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    """Encoded response for one idempotency key, plus the request it answered"""
+    status_code: int
+    body: bytes
+    fingerprint: str
+    expires_at: float  # epoch seconds, so persisted entries survive restarts
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+
+class IdempotencyConflict(ValueError):
+    """The key was already used for a request with a different body"""
+
+
+def fingerprint(payload: Any) -> str:
+    """Stable hash of a request payload"""
+    return hashlib.sha256(dumps(payload)).hexdigest()
+
+
+class IdempotencyBackend(ABC):
+    """
+    Persistent store behind the in-memory LRU, consulted on memory misses and
+    written through on every new response
+    """
+
+    @abstractmethod
+    async def load(self, key: str) -> StoredResponse | None:
+        """Stored response for `key`, or None"""
+
+    @abstractmethod
+    async def save(self, key: str, response: StoredResponse) -> None:
+        """Persist `response` under `key`, replacing any previous one"""
+
+
+class PostgrestIdempotencyBackend(IdempotencyBackend):
+    """
+    Keys in a PostgREST table with columns idempotency_key (primary key),
+    status_code, body, fingerprint and expires_at (epoch seconds)
+    """
+
+    def __init__(self, client_factory: Callable[[], Any], table: str) -> None:
+        self.client_factory = client_factory
+        self.table = table
+
+    async def load(self, key: str) -> StoredResponse | None:
+        response = await (
+            self.client_factory().table(self.table)
+            .select("status_code,body,fingerprint,expires_at")
+            .eq("idempotency_key", key).limit(1).execute()
+        )
+        if not response.data:
+            return None
+        row = response.data[0]
+        return StoredResponse(
+            status_code=row["status_code"],
+            body=row["body"].encode(),
+            fingerprint=row["fingerprint"],
+            expires_at=float(row["expires_at"]),
+        )
+
+    async def save(self, key: str, response: StoredResponse) -> None:
+        await self.client_factory().table(self.table).upsert({
+            "idempotency_key": key,
+            "status_code": response.status_code,
+            "body": response.body.decode(),
+            "fingerprint": response.fingerprint,
+            "expires_at": response.expires_at,
+        }, on_conflict="idempotency_key").execute()
+
+
+class IdempotencyStore:
+    """
+    Size-bounded LRU of responses by idempotency key, expiring after `ttl`
+    seconds, with an optional persistent backend behind it.
+
+    `run()` executes a write once per key: a retry gets the stored response
+    back, and duplicates arriving while the first is still in flight wait for
+    it and share its response rather than writing again. Only completed
+    writes are stored, so a request that raised can be retried with the same
+    key. Reusing a key for a different payload is an IdempotencyConflict.
+    """
+
+    def __init__(
+        self,
+        ttl: float = IDEMPOTENCY_TTL,
+        maxsize: int = IDEMPOTENCY_MAXSIZE,
+        backend: IdempotencyBackend | None = None,
+        observer: IdempotencyObserver | None = None,
+    ) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.backend = backend
+        self.observer = observer
+        self.backend_errors = 0
+        self._entries: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._flight = SingleFlight(enabled=True)
+
+    async def get(self, key: str) -> StoredResponse | None:
+        """Live entry for `key` from memory, else from the backend"""
+        entry = self._entries.get(key)
+        if entry is not None and entry.expired:
+            del self._entries[key]
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        if self.backend is None:
+            return None
+        try:
+            entry = await self.backend.load(key)
+        except Exception:
+            self.backend_errors += 1
+            return None
+        if entry is None or entry.expired:
+            return None
+        self._remember(key, entry)
+        return entry
+
+    async def put(self, key: str, entry: StoredResponse) -> None:
+        self._remember(key, entry)
+        if self.backend is not None:
+            try:
+                await self.backend.save(key, entry)
+            except Exception:
+                self.backend_errors += 1
+
+    def _remember(self, key: str, entry: StoredResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def run(
+        self,
+        key: str,
+        request_fingerprint: str,
+        execute: Callable[[], Awaitable[Tuple[int, bytes]]],
+    ) -> Tuple[StoredResponse, bool]:
+        """
+        Return (response, replayed) for `key`, awaiting `execute()` -> (status
+        code, body) only if no response is stored or in flight for it
+        """
+        executed = False
+
+        async def once() -> Tuple[StoredResponse, bool]:
+            nonlocal executed
+            executed = True
+            entry = await self.get(key)
+            if entry is not None:
+                return entry, False
+            status_code, body = await execute()
+            entry = StoredResponse(status_code, body, request_fingerprint, time.time() + self.ttl)
+            await self.put(key, entry)
+            return entry, True
+
+        entry = await self.get(key)
+        if entry is not None:
+            fresh = False
+        else:
+            entry, fresh = await self._flight.do(key, once)
+        if entry.fingerprint != request_fingerprint:
+            self._observe("conflict")
+            raise IdempotencyConflict(f"{key!r} was already used for a different request")
+        if fresh and executed:
+            self._observe("created")
+            return entry, False
+        self._observe("coalesced" if fresh else "replayed")
+        return entry, True
+
+    def _observe(self, outcome: str) -> None:
+        if self.observer is not None:
+            self.observer(outcome)
+
+    def __len__(self) -> int:
+        return len(self._entries)
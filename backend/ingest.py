@@ -0,0 +1,325 @@
+"""
+PPN Research Portal - Bulk Ingest
+Chunked multi-row inserts for JSON-array and NDJSON flow event batches, and
+write-behind micro-batching of single-event inserts
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Set, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+BATCH_CHUNK_SIZE = int(os.getenv("FLOW_EVENT_BATCH_CHUNK_SIZE", "500"))
+MAX_BATCH_ROWS = int(os.getenv("FLOW_EVENT_BATCH_MAX_ROWS", "100000"))
+
+WRITE_BEHIND_ENABLED = os.getenv("FLOW_EVENT_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+WRITE_BEHIND_MAX_ROWS = int(os.getenv("FLOW_EVENT_WRITE_BEHIND_MAX_ROWS", "500"))
+WRITE_BEHIND_MAX_DELAY = float(os.getenv("FLOW_EVENT_WRITE_BEHIND_MAX_DELAY_MS", "10")) / 1000
+WRITE_BEHIND_CONCURRENCY = int(os.getenv("FLOW_EVENT_WRITE_BEHIND_CONCURRENCY", "4"))
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("FLOW_EVENT_WRITE_BEHIND_QUEUE_SIZE", "10000"))
+WRITE_BEHIND_DRAIN_TIMEOUT = float(os.getenv("FLOW_EVENT_WRITE_BEHIND_DRAIN_TIMEOUT", "10"))
+
+Row = Dict[str, Any]
+InsertChunk = Callable[[List[Row]], Awaitable[List[Row]]]
+# observer(rows, seconds) per multi-row insert, for metrics
+FlushObserver = Callable[[int, float], None]
+# The slice of a batch one insert covered, and the rows it returned or the error it raised
+InsertOutcome = Tuple[slice, List[Row] | Exception]
+
+
+class BatchRowResult(BaseModel):
+    """Outcome of one row in a bulk ingest request"""
+    index: int
+    status: str  # created | invalid | failed
+    id: int | None = None
+    error: str | None = None
+
+
+class BatchIngestResult(BaseModel):
+    """Summary plus per-row outcomes for a bulk ingest request"""
+    received: int
+    created: int
+    failed: int
+    truncated: bool = False  # True when input beyond max_rows was not read
+    results: List[BatchRowResult]
+
+
+def is_ndjson(content_type: str | None) -> bool:
+    """True when the request body is newline-delimited JSON"""
+    return bool(content_type) and content_type.split(";")[0].strip() in NDJSON_CONTENT_TYPES
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Parse an NDJSON byte stream incrementally.
+    Yields (index, object) or (index, ValueError) per non-blank line.
+    """
+    buffer = b""
+    index = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, _loads(line)
+                index += 1
+    if buffer.strip():
+        yield index, _loads(buffer)
+
+
+async def iter_json_array(items: List[Any]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (index, object) pairs from an already-decoded JSON array body"""
+    for index, item in enumerate(items):
+        yield index, item
+
+
+def _loads(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+
+async def insert_bisecting(
+    insert: InsertChunk,
+    rows: List[Row],
+    split_on: Tuple[Type[Exception], ...] = (),
+    offset: int = 0,
+) -> List[InsertOutcome]:
+    """
+    Insert `rows` with one multi-row `insert`. A batch rejected with one of
+    `split_on` (the database refused it, so nothing was written) is bisected
+    until the offending rows are isolated. Other failures are reported for
+    the whole batch rather than retried, since the insert may have landed.
+    Returns (slice of `rows`, inserted rows or error) per insert.
+    """
+    span = slice(offset, offset + len(rows))
+    try:
+        return [(span, await insert(rows))]
+    except split_on as e:
+        if len(rows) == 1:
+            return [(span, e)]
+        middle = len(rows) // 2
+        first, second = await asyncio.gather(
+            insert_bisecting(insert, rows[:middle], split_on, offset),
+            insert_bisecting(insert, rows[middle:], split_on, offset + middle),
+        )
+        return first + second
+    except Exception as e:
+        return [(span, e)]
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+        for err in error.errors()
+    )
+
+
+async def ingest_rows(
+    items: AsyncIterator[Tuple[int, Any]],
+    model: Type[BaseModel],
+    insert_chunk: InsertChunk,
+    id_field: str,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+    max_rows: int = MAX_BATCH_ROWS,
+    split_on: Tuple[Type[Exception], ...] = (),
+) -> BatchIngestResult:
+    """
+    Validate each item against `model` and insert valid rows in chunks of
+    `chunk_size` via `insert_chunk`. Rows are flushed as soon as a chunk
+    fills, so an NDJSON upload is inserted while it is still being read.
+
+    A chunk rejected with one of `split_on` is bisected so only the rows the
+    database refused are marked `failed`; any other failure marks the whole
+    chunk `failed`. Other chunks are unaffected.
+    Input beyond `max_rows` is not read and the result is flagged `truncated`.
+    """
+    results: List[BatchRowResult] = []
+    pending: List[Tuple[int, Row]] = []
+
+    async def flush():
+        if not pending:
+            return
+        rows = [row for _, row in pending]
+        for span, outcome in await insert_bisecting(insert_chunk, rows, split_on):
+            part = pending[span]
+            if isinstance(outcome, Exception):
+                for index, _ in part:
+                    results.append(BatchRowResult(index=index, status="failed", error=str(outcome)))
+                continue
+            for (index, _), row in zip(part, outcome):
+                results.append(BatchRowResult(index=index, status="created", id=row.get(id_field)))
+            for index, _ in part[len(outcome):]:
+                results.append(BatchRowResult(index=index, status="failed", error="Row not returned by insert"))
+        pending.clear()
+
+    received = 0
+    truncated = False
+    async for index, item in items:
+        if received >= max_rows:
+            truncated = True
+            break
+        received += 1
+        if isinstance(item, Exception):
+            results.append(BatchRowResult(index=index, status="invalid", error=str(item)))
+            continue
+        try:
+            pending.append((index, model.model_validate(item).model_dump()))
+        except ValidationError as e:
+            results.append(BatchRowResult(index=index, status="invalid", error=_format_validation_error(e)))
+            continue
+        if len(pending) >= chunk_size:
+            await flush()
+    await flush()
+
+    results.sort(key=lambda result: result.index)
+    created = sum(1 for result in results if result.status == "created")
+    return BatchIngestResult(
+        received=received,
+        created=created,
+        failed=received - created,
+        truncated=truncated,
+        results=results,
+    )
+
+
+class WriteBehindBuffer:
+    """
+    Coalesces single-row inserts from concurrent requests into multi-row ones.
+
+    `submit()` queues a validated row and resolves with the stored row (or
+    raises the insert's error) once the batch holding it is written, so
+    callers keep acknowledge-after-write semantics. A batch is flushed when
+    it reaches `max_rows` or `max_delay` seconds after its first row, with
+    up to `concurrency` inserts in flight; while they are all busy rows keep
+    queueing, so batches grow with load and the request count does not.
+
+    A batch rejected with one of `split_on` (the database refused it, so
+    nothing was written) is bisected until the offending rows are isolated,
+    and only their callers see the error. Other failures are reported to
+    every caller in the batch rather than retried, since the insert may have
+    landed. `stop()` drains the queue before returning.
+    """
+
+    def __init__(
+        self,
+        insert: InsertChunk,
+        max_rows: int = WRITE_BEHIND_MAX_ROWS,
+        max_delay: float = WRITE_BEHIND_MAX_DELAY,
+        concurrency: int = WRITE_BEHIND_CONCURRENCY,
+        queue_size: int = WRITE_BEHIND_QUEUE_SIZE,
+        drain_timeout: float = WRITE_BEHIND_DRAIN_TIMEOUT,
+        split_on: Tuple[Type[Exception], ...] = (),
+        observer: FlushObserver | None = None,
+    ) -> None:
+        self.insert = insert
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.concurrency = concurrency
+        self.drain_timeout = drain_timeout
+        self.split_on = split_on
+        self.observer = observer
+        self.queue: "asyncio.Queue[Tuple[Row, asyncio.Future]]" = asyncio.Queue(maxsize=queue_size)
+        self.counts: Dict[str, int] = {"rows": 0, "failed": 0, "inserts": 0}
+        self._full = asyncio.Event()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._flushes: Set[asyncio.Task] = set()
+        self._collector: asyncio.Task | None = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._collector is not None and not self._collector.done() and not self._closing
+
+    async def submit(self, row: Row) -> Row:
+        """Queue `row` (waiting for space if the buffer is full) and return it as stored"""
+        if not self.running:
+            raise RuntimeError("Write-behind buffer is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((row, future))
+        if self.queue.qsize() >= self.max_rows:
+            self._full.set()
+        return await future
+
+    async def _collect(self) -> None:
+        while True:
+            await self._slots.acquire()
+            batch = [await self.queue.get()]
+            if self.queue.qsize() + 1 < self.max_rows and not self._closing:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.max_rows and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if self.queue.qsize() < self.max_rows and not self._closing:
+                self._full.clear()
+            task = asyncio.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[Row, asyncio.Future]]) -> None:
+        try:
+            await self._write(batch)
+        except asyncio.CancelledError:
+            self._fail(batch, RuntimeError("Write-behind buffer stopped"))
+            raise
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+            self._slots.release()
+
+    async def _write(self, batch: List[Tuple[Row, asyncio.Future]]) -> None:
+        rows = [row for row, _ in batch]
+        for span, outcome in await insert_bisecting(self._insert, rows, self.split_on):
+            part = batch[span]
+            if isinstance(outcome, Exception):
+                self._fail(part, outcome)
+                continue
+            for (_, future), row in zip(part, outcome):
+                if not future.done():
+                    future.set_result(row)
+            self._fail(part[len(outcome):], RuntimeError("Row not returned by insert"))
+
+    async def _insert(self, rows: List[Row]) -> List[Row]:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        inserted = await self.insert(rows)
+        self.counts["inserts"] += 1
+        self.counts["rows"] += len(inserted)
+        if self.observer is not None:
+            self.observer(len(rows), loop.time() - started)
+        return inserted
+
+    def _fail(self, batch: List[Tuple[Row, asyncio.Future]], error: Exception) -> None:
+        for _, future in batch:
+            if not future.done():
+                self.counts["failed"] += 1
+                future.set_exception(error)
+
+    def start(self) -> None:
+        if self._collector is None or self._collector.done():
+            self._closing = False
+            self._collector = asyncio.create_task(self._collect(), name="write-behind")
+
+    async def stop(self) -> None:
+        """Stop accepting rows, write what is queued (up to `drain_timeout`), then stop"""
+        if self._collector is None:
+            return
+        self._closing = True
+        self._full.set()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._collector.cancel()
+        for task in list(self._flushes):
+            task.cancel()
+        await asyncio.gather(self._collector, *self._flushes, return_exceptions=True)
+        while not self.queue.empty():
+            self._fail([self.queue.get_nowait()], RuntimeError("Write-behind buffer stopped"))
+        self._collector = None
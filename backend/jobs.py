@@ -0,0 +1,299 @@
+"""
+PPN Research Portal - Analytics Jobs
+Lifespan-owned process pool for CPU-bound analytics, with bounded queueing,
+per-job timeouts, job status tracking and shared-memory column transfer
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+JOB_MAX_QUEUE = int(os.getenv("JOB_MAX_QUEUE", "32"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "120"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "256"))
+JOB_START_METHOD = os.getenv("JOB_START_METHOD", "spawn")
+
+# numpy is imported where used so the API process only loads it with the first job
+Columns = Dict[str, Any]  # name -> numpy array
+# name -> (offset, dtype str, shape) inside one shared memory block
+ColumnLayout = Dict[str, Tuple[int, str, Tuple[int, ...]]]
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when JOB_MAX_QUEUE jobs are already queued or running"""
+
+
+# ============================================================================
+# SHARED-MEMORY COLUMNS
+# ============================================================================
+
+class SharedColumns:
+    """
+    Column arrays copied once into a single shared memory block.
+
+    Workers map the block by name and build numpy views over it, so the
+    columns never go through pickle or the pool's pipe. The parent owns the
+    block and unlinks it once the job settles.
+    """
+
+    def __init__(self, columns: Columns) -> None:
+        import numpy as np
+
+        layout: ColumnLayout = {}
+        offset = 0
+        for name, values in columns.items():
+            values = np.ascontiguousarray(values)
+            offset = -(-offset // 64) * 64  # 64-byte align each column
+            layout[name] = (offset, values.dtype.str, values.shape)
+            offset += values.nbytes
+
+        self.shm = SharedMemory(create=True, size=max(offset, 1))
+        self.layout = layout
+        for name, values in columns.items():
+            view = _view(self.shm, layout[name])
+            view[...] = values
+
+    @property
+    def handle(self) -> Tuple[str, ColumnLayout]:
+        return self.shm.name, self.layout
+
+    def release(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _view(shm: SharedMemory, spec: Tuple[int, str, Tuple[int, ...]]):
+    import numpy as np
+
+    offset, dtype, shape = spec
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+
+
+def _run_in_worker(fn: Callable[..., Any], handle: Tuple[str, ColumnLayout] | None, kwargs: Dict[str, Any]) -> Any:
+    """Worker-side trampoline: map shared columns, run the job, unmap"""
+    if handle is None:
+        return fn(**kwargs)
+    name, layout = handle
+    shm = SharedMemory(name=name)
+    try:
+        columns = {column: _view(shm, spec) for column, spec in layout.items()}
+        result = fn(columns, **kwargs)
+        del columns
+        return result
+    finally:
+        shm.close()
+
+
+# ============================================================================
+# JOB TRACKING
+# ============================================================================
+
+@dataclass
+class Job:
+    """One submitted analytics job and its outcome"""
+    job_id: str
+    name: str
+    timeout: float
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    status: str = "queued"  # queued | running | succeeded | failed | timed_out | cancelled
+    error: str | None = None
+    result: Any = None
+    future: Future | None = field(default=None, repr=False)
+    settled: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _timer: asyncio.TimerHandle | None = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed", "timed_out", "cancelled")
+
+    def as_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        if self.status == "queued" and self.future is not None and self.future.running():
+            self.status = "running"
+        info = {
+            "job_id": self.job_id,
+            "name": self.name,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+            "duration_s": round(self.finished_at - self.submitted_at, 3) if self.finished_at else None,
+            "timeout_s": self.timeout,
+            "error": self.error,
+        }
+        if include_result and self.status == "succeeded":
+            info["result"] = self.result
+        return info
+
+
+class AnalyticsExecutor:
+    """
+    Process pool for CPU-bound analytics, started and stopped by the app lifespan.
+
+    At most `max_queue` jobs may be pending (queued or running) at once;
+    further submissions raise JobQueueFull instead of growing an unbounded
+    backlog. A job exceeding its timeout is marked timed_out: a queued job
+    is cancelled, a running one cannot be interrupted, so it finishes in
+    its worker and its result is discarded. Such an overrunning job no
+    longer counts as pending, but its worker stays busy until it returns,
+    so the pool runs short a worker meanwhile (see `status()`). Finished
+    jobs are kept for status lookups up to `history`.
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        max_queue: int = JOB_MAX_QUEUE,
+        timeout: float = JOB_TIMEOUT,
+        history: int = JOB_HISTORY,
+        start_method: str = JOB_START_METHOD,
+    ) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.history = history
+        self.start_method = start_method
+        self._pool: ProcessPoolExecutor | None = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending = 0
+        self._overrunning: Set[str] = set()  # timed out, still running in a worker
+
+    @property
+    def started(self) -> bool:
+        return self._pool is not None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self) -> None:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context(self.start_method))
+
+    def stop(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        return list(reversed(self._jobs.values()))
+
+    def submit(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        columns: Columns | None = None,
+        timeout: float | None = None,
+        **kwargs: Any,
+    ) -> Job:
+        """
+        Queue `fn(columns, **kwargs)` (or `fn(**kwargs)` without columns) on the pool.
+
+        `fn` must be a module-level function so workers can import it.
+        Returns immediately; poll get(job_id) or await wait(job).
+        """
+        if self._pool is None:
+            raise RuntimeError("Analytics executor is not running")
+        if self._pending >= self.max_queue:
+            raise JobQueueFull(f"{self._pending} analytics jobs pending (limit {self.max_queue})")
+
+        job = Job(job_id=uuid.uuid4().hex, name=name, timeout=timeout or self.timeout)
+        shared = SharedColumns(columns) if columns is not None else None
+        try:
+            job.future = self._pool.submit(_run_in_worker, fn, shared.handle if shared else None, kwargs)
+        except BaseException:
+            if shared is not None:
+                shared.release()
+            raise
+
+        self._pending += 1
+        self._remember(job)
+        loop = asyncio.get_running_loop()
+
+        def on_done(future: Future) -> None:
+            # Runs on the pool's management thread; hop back onto the event loop
+            try:
+                loop.call_soon_threadsafe(self._settle, job, future, shared)
+            except RuntimeError:  # loop already closed (shutdown)
+                if shared is not None:
+                    shared.release()
+
+        job.future.add_done_callback(on_done)
+        job._timer = loop.call_later(job.timeout, self._expire, job)
+        return job
+
+    async def wait(self, job: Job) -> Any:
+        """Await a job's result, raising its error (or TimeoutError) on failure"""
+        await job.settled.wait()
+        if job.status == "succeeded":
+            return job.result
+        if job.status == "timed_out":
+            raise TimeoutError(job.error)
+        raise RuntimeError(job.error)
+
+    async def run(self, name: str, fn: Callable[..., Any], columns: Columns | None = None, **kwargs: Any) -> Any:
+        """Submit a job and await its result"""
+        return await self.wait(self.submit(name, fn, columns, **kwargs))
+
+    def _settle(self, job: Job, future: Future, shared: SharedColumns | None) -> None:
+        if job.job_id in self._overrunning:
+            self._overrunning.discard(job.job_id)
+        else:
+            self._pending -= 1
+        if shared is not None:
+            shared.release()
+        if job._timer is not None:
+            job._timer.cancel()
+        if job.done:
+            return  # already timed out; drop the late result
+        job.finished_at = time.time()
+        if future.cancelled():
+            job.status = "cancelled"
+        elif future.exception() is not None:
+            job.status = "failed"
+            job.error = f"{type(future.exception()).__name__}: {future.exception()}"
+        else:
+            job.status = "succeeded"
+            job.result = future.result()
+        job.settled.set()
+
+    def _expire(self, job: Job) -> None:
+        if job.done:
+            return
+        if not job.future.cancel():  # only succeeds while still queued
+            # Already handed to a worker: stop counting it against admission
+            self._pending -= 1
+            self._overrunning.add(job.job_id)
+        job.status = "timed_out"
+        job.finished_at = time.time()
+        job.error = f"Job exceeded {job.timeout}s timeout"
+        job.settled.set()
+
+    def _remember(self, job: Job) -> None:
+        self._jobs[job.job_id] = job
+        excess = len(self._jobs) - self.history
+        if excess <= 0:
+            return
+        # Forget the oldest finished jobs; running ones stay until they settle
+        finished = [job_id for job_id, remembered in self._jobs.items() if remembered.done][:excess]
+        for job_id in finished:
+            del self._jobs[job_id]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.started,
+            "workers": self.workers,
+            "pending": self._pending,
+            "overrunning": len(self._overrunning),
+            "max_queue": self.max_queue,
+        }
@@ -3,25 +3,139 @@ PPN Research Portal - Backend API
 FastAPI application with Supabase integration
 """
 
-import os
-from typing import Dict, Any, List
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, Depends, status
-from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
-from supabase import create_client, Client
-from pydantic import BaseModel
-
-# Load environment variables
+from startup_timing import FirstRequestTimer, startup_report
+
+with startup_report.timing_imports():
+    import json
+    import os
+    from contextlib import asynccontextmanager
+    from typing import Dict, Any, List
+    from datetime import date, datetime
+    from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, status
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
+    from dotenv import load_dotenv
+    from postgrest.exceptions import APIError
+    from postgrest.types import ReturnMethod
+    from pydantic import BaseModel
+
+# Load environment variables (before app modules read their configuration)
 load_dotenv()
 
+with startup_report.timing_imports():
+    from broadcast import Broadcaster
+    from cache import CachedBody, etag_matches, reference_cache
+    from coalesce import SingleFlight
+    from compression import CompressionMiddleware
+    from db import LazyClient, PoolSettings, PooledPostgrestClient, create_async_client
+    from engines import AE_CREATED, AE_GRADE, AE_RESOLVED, AE_TABLE, ae_notify, release_ready
+    from health import DatabaseHealthSampler
+    from idempotency import (
+        IDEMPOTENCY_TABLE,
+        MAX_KEY_LENGTH,
+        REPLAYED_HEADER,
+        IdempotencyConflict,
+        IdempotencyStore,
+        PostgrestIdempotencyBackend,
+        fingerprint,
+    )
+    from jobs import AnalyticsExecutor, JobQueueFull
+    from metrics import (
+        PROMETHEUS_CONTENT_TYPE,
+        MetricsMiddleware,
+        observe_ae_notify,
+        observe_coalesced,
+        observe_db_call,
+        observe_idempotency,
+        observe_write_behind,
+        registry,
+    )
+    from ingest import (
+        MAX_BATCH_ROWS,
+        WRITE_BEHIND_ENABLED,
+        BatchIngestResult,
+        WriteBehindBuffer,
+        ingest_rows,
+        is_ndjson,
+        iter_json_array,
+        iter_ndjson,
+    )
+    from pagination import (
+        DEFAULT_PAGE_SIZE,
+        MAX_PAGE_SIZE,
+        NDJSON_MEDIA_TYPE,
+        fetch_keyset_page,
+        iter_keyset_pages,
+        iter_range_pages,
+        ndjson_lines,
+        wants_ndjson,
+    )
+    from serialization import FastJSONResponse, dumps, dumps_lines
+    from sse import SSE_HEADERS, SSE_MEDIA_TYPE, SSE_RETRY_MS, format_event, with_keepalive
+
+startup_report.mark("imports")
+
+
+# ============================================================================
+# LIFESPAN (STARTUP/SHUTDOWN)
+# ============================================================================
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan
+    Validates credentials and starts background work. The PostgREST pool is
+    created lazily by the first request (or health sample) that needs it.
+    """
+    supabase_url, supabase_service_key = supabase_credentials()
+    pool = PoolSettings.from_env()
+
+    print("=" * 60)
+    print("🚀 PPN Research Portal Backend API Starting")
+    print("=" * 60)
+    print(f"📊 Supabase URL: {supabase_url}")
+    print(f"🔒 Service Key: {'*' * 20}{supabase_service_key[-8:]}")
+    print(f"🔌 DB Pool: max={pool.max_connections} "
+          f"keepalive={pool.max_keepalive_connections} http2={pool.http2}")
+    print(f"🧮 Analytics workers: {analytics_jobs.workers} (queue {analytics_jobs.max_queue})")
+    print(f"📚 API Docs: http://localhost:8000/api/docs")
+    health_sampler.start()
+    analytics_jobs.start()
+    if ae_notify.AE_NOTIFY_ENABLED:
+        ae_notifier.start()
+        print(f"🚨 AE notifications: polling {ae_notify.SOURCE_TABLE} every {ae_notifier.poll_interval}s")
+    if release_ready.RELEASE_READY_ENABLED:
+        readiness_tracker.start()
+    if WRITE_BEHIND_ENABLED:
+        flow_event_writer.start()
+        print(f"✍️  Flow event write-behind: up to {flow_event_writer.max_rows} rows "
+              f"every {flow_event_writer.max_delay * 1000:g}ms")
+    startup_report.mark("lifespan_startup")
+    for line in startup_report.summary_lines():
+        print(line)
+    print("=" * 60)
+
+    yield
+
+    print("\n🛑 PPN Research Portal Backend API Shutting Down")
+    await flow_event_writer.stop()
+    await health_sampler.stop()
+    await ae_notifier.stop()
+    await readiness_tracker.stop()
+    await flow_broadcaster.stop()
+    analytics_jobs.stop()
+    await supabase.aclose()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="PPN Research Portal API",
     description="Backend API for PPN Research Portal - Clinical Research Data Management",
     version="1.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
 )
 
 # CORS Configuration - Allow frontend to make requests
@@ -37,22 +151,308 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli negotiated via Accept-Encoding for bodies over COMPRESSION_MIN_SIZE
+app.add_middleware(CompressionMiddleware)
+
+# Per-route latency histograms and in-flight counts (exposed on /metrics)
+app.add_middleware(MetricsMiddleware)
+
+# Cold-start tracking: time from process start to first request
+app.add_middleware(FirstRequestTimer)
+
 # Supabase client initialization
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")  # Use service key for backend
+def supabase_credentials() -> tuple[str, str]:
+    """Read SUPABASE_URL / SUPABASE_SERVICE_KEY (service key for backend)"""
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_service_key = os.getenv("SUPABASE_SERVICE_KEY")
+
+    if not supabase_url or not supabase_service_key:
+        raise ValueError(
+            "Missing Supabase credentials. Set SUPABASE_URL and SUPABASE_SERVICE_KEY in .env"
+        )
+    return supabase_url, supabase_service_key
+
+
+def create_supabase_client() -> PooledPostgrestClient:
+    """Async PostgREST client over a pooled keep-alive HTTP/2 connection pool"""
+    supabase_url, supabase_service_key = supabase_credentials()
+    return create_async_client(supabase_url, supabase_service_key, observer=observe_db_call)
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-    raise ValueError(
-        "Missing Supabase credentials. Set SUPABASE_URL and SUPABASE_SERVICE_KEY in .env"
-    )
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+# Created on first use, so importing this module does no I/O and needs no credentials
+supabase = LazyClient(create_supabase_client)
 
 
 # Dependency to get Supabase client
-def get_supabase() -> Client:
-    """Dependency injection for Supabase client"""
-    return supabase
+def get_supabase() -> PooledPostgrestClient:
+    """Dependency injection for the async Supabase (PostgREST) client"""
+    return supabase.get()
+
+
+async def probe_database() -> None:
+    """Cheapest round trip that proves PostgREST and the database are reachable"""
+    await supabase.get().table("sites").select("site_code").limit(1).execute()
+
+
+# Background DB sampler backing /api/health, /api/health/ready
+health_sampler = DatabaseHealthSampler.from_env(probe_database)
+
+# Process pool for CPU-bound analytics; workers spawn on first job
+analytics_jobs = AnalyticsExecutor()
+
+# Identical concurrent reads (same route + key) share one PostgREST call
+read_flight = SingleFlight(observer=observe_coalesced)
+
+# Responses to Idempotency-Key writes, replayed for retries of the same key
+idempotency_store = IdempotencyStore(
+    backend=PostgrestIdempotencyBackend(supabase.get, IDEMPOTENCY_TABLE) if IDEMPOTENCY_TABLE else None,
+    observer=observe_idempotency,
+)
+
+# Columnar flow-event snapshot for /api/analytics; built on first use so
+# numpy stays off the cold-start path
+flow_snapshot = None
+
+
+def get_flow_snapshot():
+    """Return the process-wide FlowEventSnapshot, creating it on first call"""
+    global flow_snapshot
+    if flow_snapshot is None:
+        from analytics import SNAPSHOT_COLUMNS, FlowEventSnapshot
+
+        async def fetch_page(after: int | None, limit: int) -> List[Dict[str, Any]]:
+            query = supabase.get().table("log_patient_flow_events").select(SNAPSHOT_COLUMNS)
+            if after is not None:
+                query = query.gt("flow_event_id", after)
+            response = await query.order("flow_event_id").limit(limit).execute()
+            return response.data
+
+        async def fetch_stages() -> List[int]:
+            response = await (
+                supabase.get().table("ref_flow_event_types").select("event_type_id").order("display_order").execute()
+            )
+            return [row["event_type_id"] for row in response.data]
+
+        flow_snapshot = FlowEventSnapshot(fetch_page, fetch_stages)
+    return flow_snapshot
+
+
+# BENCH_SAFETY_RATE_V1 segment table; built on first use (numpy, full table scan)
+safety_engine = None
+
+
+async def fetch_all_rows(table: str, columns: str, key: str) -> List[Dict[str, Any]]:
+    """Read a whole table in keyset pages"""
+    rows: List[Dict[str, Any]] = []
+    query_factory = lambda: supabase.get().table(table).select(columns)
+    async for page in iter_keyset_pages(query_factory, key, None, MAX_PAGE_SIZE):
+        rows.extend(page)
+    return rows
+
+
+def get_safety_engine():
+    """Return the process-wide BenchSafetyEngine, creating it on first call"""
+    global safety_engine
+    if safety_engine is None:
+        from engines.bench_safety import (
+            AE_COLUMNS,
+            ALGORITHM_ID,
+            SESSION_COLUMNS,
+            SESSION_TABLE,
+            BenchSafetyEngine,
+            build_segments,
+        )
+
+        async def fetch_new_adverse_events(created_after: str | None) -> List[Dict[str, Any]]:
+            query = supabase.get().table(AE_TABLE).select(AE_COLUMNS)
+            if created_after is not None:
+                query = query.gt("created_at", created_after)
+            response = await query.order("created_at").execute()
+            return response.data
+
+        async def build(columns):
+            # Network-wide rebuilds run in the process pool, off the event loop
+            return await analytics_jobs.run(f"{ALGORITHM_ID} rebuild", build_segments, columns)
+
+        safety_engine = BenchSafetyEngine(
+            fetch_sessions=lambda: fetch_all_rows(SESSION_TABLE, SESSION_COLUMNS, "id"),
+            fetch_adverse_events=lambda: fetch_all_rows(AE_TABLE, AE_COLUMNS, "ae_id"),
+            fetch_new_adverse_events=fetch_new_adverse_events,
+            build=build if analytics_jobs.started else None,
+        )
+    return safety_engine
+
+
+async def fetch_new_adverse_events(after: Any, limit: int) -> List[Dict[str, Any]]:
+    """Grade 3+ adverse events past a notification position, in (created_at, ae_id) order"""
+    created_at, ae_id = AE_CREATED, ae_notify.SOURCE_KEY
+    query = (
+        supabase.get().table(ae_notify.SOURCE_TABLE).select(ae_notify.SOURCE_COLUMNS)
+        .gte(AE_GRADE, ae_notify.NOTIFY_GRADE)
+        .not_.is_(created_at, "null")
+    )
+    if after is not None:
+        after_created, after_id = after
+        if after_id is None:
+            query = query.gte(created_at, after_created)
+        else:
+            query = query.or_(
+                f'{created_at}.gt."{after_created}",'
+                f'and({created_at}.eq."{after_created}",{ae_id}.gt."{after_id}")'
+            )
+    response = await query.order(f"{created_at},{ae_id}").limit(limit).execute()
+    return response.data
+
+
+async def fetch_ae_notification_cursor() -> Any:
+    """Newest adverse event already notified, so polling resumes after restarts"""
+    response = await (
+        supabase.get().table(ae_notify.NOTIFICATION_TABLE).select("ae_timestamp,ae_id")
+        .not_.is_("ae_timestamp", "null")
+        .order("ae_timestamp.desc,ae_id.desc").limit(1).execute()
+    )
+    return (response.data[0]["ae_timestamp"], response.data[0]["ae_id"]) if response.data else None
+
+
+async def fetch_adverse_event_head() -> Any:
+    """Newest adverse event recorded, where a first start begins (history is not notified)"""
+    response = await (
+        supabase.get().table(ae_notify.SOURCE_TABLE).select(f"{AE_CREATED},{ae_notify.SOURCE_KEY}")
+        .not_.is_(AE_CREATED, "null")
+        .order(f"{AE_CREATED}.desc,{ae_notify.SOURCE_KEY}.desc").limit(1).execute()
+    )
+    return ae_notify.position(response.data[0]) if response.data else None
+
+
+async def write_ae_notifications(records: List[Dict[str, Any]]) -> None:
+    """Upsert one micro-batch; notifications already written (replays, other replicas) are skipped"""
+    await supabase.get().table(ae_notify.NOTIFICATION_TABLE).upsert(
+        records,
+        on_conflict=ae_notify.NOTIFICATION_CONFLICT,
+        ignore_duplicates=True,
+        returning=ReturnMethod.minimal,
+    ).execute()
+
+
+# AE_NOTIFY_GRADE3PLUS_V1 processor; started by the lifespan when AE_NOTIFY_ENABLED
+ae_notifier = ae_notify.AENotificationProcessor(
+    fetch_after=fetch_new_adverse_events,
+    write=write_ae_notifications,
+    fetch_cursor=fetch_ae_notification_cursor,
+    fetch_head=fetch_adverse_event_head,
+    observer=observe_ae_notify,
+)
+
+
+async def fetch_session_rows(
+    table: str,
+    columns: str,
+    session_ids: List[Any],
+    order: tuple[str, ...],
+    refine=None,
+) -> List[Dict[str, Any]]:
+    """Rows for many sessions, with the in.() filter split into URL-sized batches"""
+    rows: List[Dict[str, Any]] = []
+    for offset in range(0, len(session_ids), release_ready.SESSION_BATCH):
+        batch = session_ids[offset:offset + release_ready.SESSION_BATCH]
+
+        def query_factory(batch=batch):
+            query = supabase.get().table(table).select(columns).in_("session_id", batch)
+            return refine(query) if refine is not None else query
+
+        async for page in iter_range_pages(query_factory, order, MAX_PAGE_SIZE):
+            rows.extend(page)
+    return rows
+
+
+async def fetch_recent_doses(since: str) -> List[Dict[str, Any]]:
+    """Dose events inside the release-readiness active window"""
+    query_factory = lambda: (
+        supabase.get().table(release_ready.DOSE_TABLE).select(release_ready.DOSE_COLUMNS)
+        .gte("dose_timestamp", since)
+    )
+    return [row async for page in iter_range_pages(query_factory, ("dose_timestamp",), MAX_PAGE_SIZE) for row in page]
+
+
+# RELEASE_READY_PSILOCYBIN_V1 per-session state; started by the lifespan when RELEASE_READY_ENABLED
+readiness_tracker = release_ready.ReleaseReadinessTracker(
+    fetch_doses=fetch_recent_doses,
+    fetch_checks=lambda session_ids: fetch_session_rows(
+        release_ready.CHECK_TABLE, release_ready.CHECK_COLUMNS, session_ids, ("created_at",)
+    ),
+    fetch_adverse_events=lambda session_ids: fetch_session_rows(
+        AE_TABLE, release_ready.AE_COLUMNS, session_ids, ("ae_id",),
+        refine=lambda query: (
+            query.gte(AE_GRADE, release_ready.NOTIFY_GRADE).or_(f"{AE_RESOLVED}.is.null,{AE_RESOLVED}.is.false")
+        ),
+    ),
+)
+
+
+# CONTRAINDICATION_IBOGAINE_V1 rule index; recompiled when its reference tables change
+ibogaine_rules = None
+
+
+async def get_ibogaine_rules():
+    """
+    Return the compiled CONTRAINDICATION_IBOGAINE_V1 rule index.
+
+    The rule tables are read through the reference cache, so the index is
+    recompiled only when a table's ETag changes (TTL reload or
+    /api/cache/invalidate), not per request.
+    """
+    global ibogaine_rules
+    from engines.ibogaine_contraindication import RULE_TABLES, RuleIndex
+
+    db = supabase.get()
+    tables = [reference_cache.get(table) or await load_reference_table(db, table) for table in RULE_TABLES]
+    version = tuple(cached.etag for cached in tables)
+    if ibogaine_rules is None or ibogaine_rules.version != version:
+        ibogaine_rules = RuleIndex.compile(*(json.loads(cached.body) for cached in tables), version=version)
+    return ibogaine_rules
+
+
+async def fetch_site_flow_events(site_id: int, cursor: int, limit: int) -> List[Dict[str, Any]]:
+    """Flow events for one site with flow_event_id > cursor, in id order"""
+    response = await (
+        supabase.get().table("log_patient_flow_events").select("*")
+        .eq("site_id", site_id).gt("flow_event_id", cursor)
+        .order("flow_event_id").limit(limit).execute()
+    )
+    return response.data
+
+
+async def fetch_site_flow_head(site_id: int) -> int | None:
+    """Highest flow_event_id for one site"""
+    response = await (
+        supabase.get().table("log_patient_flow_events").select("flow_event_id")
+        .eq("site_id", site_id).order("flow_event_id", desc=True).limit(1).execute()
+    )
+    return response.data[0]["flow_event_id"] if response.data else None
+
+
+# One shared cursor poll per site with open /api/flow-events/stream connections
+flow_broadcaster = Broadcaster(fetch_site_flow_events, fetch_site_flow_head, id_field="flow_event_id")
+
+
+def notify_flow_events(rows: List[Dict[str, Any]]) -> None:
+    """Push newly inserted flow events into the analytics snapshot and wake their site streams"""
+    if flow_snapshot is not None and rows:
+        flow_snapshot.append_rows(rows)
+    for site_id in {row.get("site_id") for row in rows} - {None}:
+        flow_broadcaster.wake(site_id)
+
+
+async def insert_flow_event_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One multi-row log_patient_flow_events insert, for the write-behind buffer"""
+    response = await supabase.get().table("log_patient_flow_events").insert(rows).execute()
+    notify_flow_events(response.data)
+    return response.data
+
+
+# Write-behind for POST /api/flow-events; started by the lifespan when FLOW_EVENT_WRITE_BEHIND.
+# A PostgREST APIError means the insert was rejected whole, so the batch can be split and retried.
+flow_event_writer = WriteBehindBuffer(insert_flow_event_rows, split_on=(APIError,), observer=observe_write_behind)
 
 
 # ============================================================================
@@ -78,7 +478,7 @@ class FlowEventCreate(BaseModel):
 
 class FlowEventResponse(BaseModel):
     """Response model for flow events"""
-    id: int
+    flow_event_id: int
     subject_id: int
     event_type_id: int
     event_date: str
@@ -87,6 +487,12 @@ class FlowEventResponse(BaseModel):
     created_at: str
 
 
+class FlowEventPage(BaseModel):
+    """Keyset-paginated page of flow events"""
+    data: List[Dict[str, Any]]
+    next_cursor: int | None
+
+
 # ============================================================================
 # API ENDPOINTS
 # ============================================================================
@@ -102,38 +508,97 @@ async def root() -> Dict[str, str]:
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Prometheus text exposition of request and Supabase call metrics"""
+    return Response(content=registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @app.get("/api/health", response_model=HealthCheck, tags=["Health"])
-async def health_check(db: Client = Depends(get_supabase)) -> HealthCheck:
+async def health_check() -> HealthCheck:
     """
     Health check endpoint
-    Verifies database connectivity and returns system status
+    Reports database connectivity from the background health sampler (no I/O)
     """
-    try:
-        # Test database connection by querying sites table
-        response = db.table("sites").select("site_code").limit(1).execute()
-        
-        return HealthCheck(
-            status="healthy",
-            timestamp=datetime.utcnow().isoformat(),
-            database="connected",
-            version="1.0.0"
-        )
-    except Exception as e:
+    if not health_sampler.ready:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Database connection failed: {str(e)}"
+            detail=f"Database connection failed: {health_sampler.last_error or 'no successful sample yet'}"
         )
 
+    return HealthCheck(
+        status="healthy",
+        timestamp=datetime.utcnow().isoformat(),
+        database="connected",
+        version="1.0.0"
+    )
+
+
+@app.get("/api/health/live", tags=["Health"])
+async def health_live() -> Dict[str, str]:
+    """
+    Liveness probe
+    Confirms the process is serving requests; performs no I/O
+    """
+    return {"status": "alive"}
+
+
+@app.get("/api/health/ready", tags=["Health"])
+async def health_ready() -> JSONResponse:
+    """
+    Readiness probe
+    Answers from the background DB sampler's rolling p50/p99 latency and last error
+    """
+    snapshot = health_sampler.snapshot()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if snapshot["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if snapshot["ready"] else "unavailable", "database": snapshot},
+    )
+
+
+@app.get("/api/health/startup", tags=["Health"])
+async def health_startup() -> Dict[str, Any]:
+    """
+    Cold-start report
+    Import time per module, lifespan phase timings and time to first request
+    """
+    return startup_report.as_dict()
+
+
+@read_flight.coalesce("reference_table", key=lambda db, table: table)
+async def load_reference_table(db: PooledPostgrestClient, table: str) -> CachedBody:
+    """Load and cache a reference table; concurrent cache misses share one query"""
+    response = await db.table(table).select("*").execute()
+    return reference_cache.set(table, response.data)
+
+
+async def cached_reference_response(
+    table: str,
+    db: PooledPostgrestClient,
+    if_none_match: str | None,
+) -> Response:
+    """
+    Serve a whole reference table from the TTL cache with a strong ETag.
+    A matching If-None-Match short-circuits to 304 without a DB round trip.
+    """
+    cached = reference_cache.get(table) or await load_reference_table(db, table)
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
 
 @app.get("/api/sites", tags=["Sites"])
-async def get_sites(db: Client = Depends(get_supabase)) -> List[Dict[str, Any]]:
+async def get_sites(
+    if_none_match: str | None = Header(None),
+    db: PooledPostgrestClient = Depends(get_supabase)
+) -> List[Dict[str, Any]]:
     """
     Get all sites
-    Returns list of all research sites in the network
+    Returns list of all research sites in the network (cached, ETag-aware)
     """
     try:
-        response = db.table("sites").select("*").execute()
-        return response.data
+        return await cached_reference_response("sites", db, if_none_match)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -141,40 +606,104 @@ async def get_sites(db: Client = Depends(get_supabase)) -> List[Dict[str, Any]]:
         )
 
 
-@app.get("/api/flow-events", tags=["Patient Flow"])
+def flow_events_query(db: PooledPostgrestClient, subject_id: int | None):
+    """Build the base log_patient_flow_events select, with optional subject filter"""
+    query = db.table("log_patient_flow_events").select("*")
+    if subject_id:
+        query = query.eq("subject_id", subject_id)
+    return query
+
+
+@read_flight.coalesce(
+    "flow_events_page",
+    key=lambda db, subject_id, cursor, limit: (subject_id, cursor, limit),
+)
+async def fetch_flow_events_page(
+    db: PooledPostgrestClient,
+    subject_id: int | None,
+    cursor: int | None,
+    limit: int,
+) -> tuple[List[Dict[str, Any]], int | None]:
+    """One keyset page of flow events; identical concurrent requests share it"""
+    return await fetch_keyset_page(lambda: flow_events_query(db, subject_id), "flow_event_id", cursor, limit)
+
+
+@app.get("/api/flow-events", response_model=FlowEventPage, tags=["Patient Flow"])
 async def get_flow_events(
     subject_id: int | None = None,
-    db: Client = Depends(get_supabase)
-) -> List[Dict[str, Any]]:
+    cursor: int | None = Query(None, description="flow_event_id to resume after (from next_cursor)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    accept: str | None = Header(None),
+    db: PooledPostgrestClient = Depends(get_supabase)
+):
     """
     Get patient flow events
-    Optional filter by subject_id
+    Optional filter by subject_id. Keyset-paginated on flow_event_id: pass the
+    returned next_cursor as `cursor` to fetch the following page.
+    With `Accept: application/x-ndjson` every remaining row is streamed page
+    by page, one JSON object per line.
     """
+    query_factory = lambda: flow_events_query(db, subject_id)
+
     try:
-        query = db.table("log_patient_flow_events").select("*")
-        
-        if subject_id:
-            query = query.eq("subject_id", subject_id)
-        
-        response = query.execute()
-        return response.data
+        rows, next_cursor = await fetch_flow_events_page(db, subject_id, cursor, limit)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch flow events: {str(e)}"
         )
 
+    if not wants_ndjson(accept):
+        # Rows come straight from PostgREST; skip response_model re-validation
+        return FastJSONResponse({"data": rows, "next_cursor": next_cursor})
 
-@app.post("/api/flow-events", response_model=FlowEventResponse, tags=["Patient Flow"])
-async def create_flow_event(
-    event: FlowEventCreate,
-    db: Client = Depends(get_supabase)
-) -> Dict[str, Any]:
+    async def pages():
+        yield rows
+        if next_cursor is not None:
+            async for page in iter_keyset_pages(query_factory, "flow_event_id", next_cursor, limit):
+                yield page
+
+    return StreamingResponse(ndjson_lines(pages()), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.get("/api/flow-events/stream", tags=["Patient Flow"])
+async def stream_flow_events(
+    site_id: int,
+    last_event_id: int | None = Header(None, description="Resume after this flow_event_id (sent by EventSource on reconnect)"),
+    resume_after: int | None = Query(None, description="flow_event_id to resume after, for clients that cannot set Last-Event-ID"),
+) -> StreamingResponse:
     """
-    Create a new patient flow event
+    Live patient flow events for one site (Server-Sent Events)
+    Every connection to a site shares one upstream cursor poll. Each row is a
+    `flow_event` event whose id is its flow_event_id, so a reconnecting
+    client resumes where it left off. A client that falls too far behind is
+    disconnected and catches up from the database when it reconnects.
     """
+    after = last_event_id if last_event_id is not None else resume_after
+
+    async def events():
+        yield format_event({"site_id": site_id, "resume_after": after}, event="ready", retry_ms=SSE_RETRY_MS)
+        async for row in flow_broadcaster.subscribe(site_id, after):
+            yield format_event(row, event="flow_event", event_id=row["flow_event_id"])
+
+    return StreamingResponse(with_keepalive(events()), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
+@app.get("/api/flow-events/stream/status", tags=["Patient Flow"])
+async def get_flow_stream_status() -> Dict[str, Any]:
+    """
+    Flow event stream fan-out status
+    Open sites, subscribers per site, poll cursors and slow-client disconnects
+    """
+    return flow_broadcaster.status()
+
+
+async def insert_flow_event(db: PooledPostgrestClient, event: FlowEventCreate) -> Dict[str, Any]:
+    """Insert one flow event (through the write-behind buffer when enabled) and return the stored row"""
     try:
-        response = db.table("log_patient_flow_events").insert(event.model_dump()).execute()
+        if flow_event_writer.running:
+            return await flow_event_writer.submit(event.model_dump())
+        response = await db.table("log_patient_flow_events").insert(event.model_dump()).execute()
         
         if not response.data:
             raise HTTPException(
@@ -182,6 +711,7 @@ async def create_flow_event(
                 detail="Failed to create flow event"
             )
         
+        notify_flow_events(response.data)
         return response.data[0]
     except Exception as e:
         raise HTTPException(
@@ -190,42 +720,505 @@ async def create_flow_event(
         )
 
 
-@app.get("/api/flow-event-types", tags=["Reference Data"])
-async def get_flow_event_types(db: Client = Depends(get_supabase)) -> List[Dict[str, Any]]:
+@app.post("/api/flow-events", response_model=FlowEventResponse, tags=["Patient Flow"])
+async def create_flow_event(
+    event: FlowEventCreate,
+    idempotency_key: str | None = Header(None, max_length=MAX_KEY_LENGTH),
+    db: PooledPostgrestClient = Depends(get_supabase)
+) -> Any:
     """
-    Get all flow event types
-    Returns reference data for patient flow event classifications
+    Create a new patient flow event
+    With an `Idempotency-Key` header the event is created at most once per
+    key: retries (and duplicates sent while the first is in flight) get the
+    original response back, marked `Idempotent-Replayed: true`.
     """
+    if idempotency_key is None:
+        return await insert_flow_event(db, event)
+
+    async def create() -> tuple[int, bytes]:
+        row = await insert_flow_event(db, event)
+        return status.HTTP_200_OK, dumps(FlowEventResponse.model_validate(row).model_dump())
+
     try:
-        response = db.table("ref_flow_event_types").select("*").execute()
+        stored, replayed = await idempotency_store.run(
+            f"POST /api/flow-events:{idempotency_key}", fingerprint(event.model_dump()), create
+        )
+    except IdempotencyConflict:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Idempotency-Key {idempotency_key!r} was already used for a different request"
+        )
+    headers = {REPLAYED_HEADER: "true"} if replayed else None
+    return Response(stored.body, status_code=stored.status_code, media_type="application/json", headers=headers)
+
+
+@app.post("/api/flow-events/batch", response_model=BatchIngestResult, tags=["Patient Flow"])
+async def create_flow_events_batch(
+    request: Request,
+    db: PooledPostgrestClient = Depends(get_supabase)
+) -> BatchIngestResult:
+    """
+    Bulk-create patient flow events
+    Accepts a JSON array or an NDJSON stream (Content-Type: application/x-ndjson)
+    of flow events. Rows are validated individually and inserted in chunked
+    multi-row statements; the response reports each row's outcome by index.
+    """
+    async def insert_chunk(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        response = await db.table("log_patient_flow_events").insert(rows).execute()
+        notify_flow_events(response.data)
         return response.data
+
+    if is_ndjson(request.headers.get("content-type")):
+        items = iter_ndjson(request.stream())
+    else:
+        try:
+            body = await request.json()
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid JSON body: {str(e)}"
+            )
+        if not isinstance(body, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Request body must be a JSON array of flow events"
+            )
+        if len(body) > MAX_BATCH_ROWS:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Batch exceeds {MAX_BATCH_ROWS} rows"
+            )
+        items = iter_json_array(body)
+
+    return await ingest_rows(items, FlowEventCreate, insert_chunk, id_field="flow_event_id", split_on=(APIError,))
+
+
+def engine_error(action: str, e: Exception) -> HTTPException:
+    """Map analytics failures onto 503 (pool saturated), 504 (job timeout) or 500"""
+    if isinstance(e, JobQueueFull):
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+    if isinstance(e, TimeoutError):
+        return HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        )
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"Failed to {action}: {str(e)}"
+    )
+
+
+@app.get("/api/analytics/flow-funnel", tags=["Analytics"])
+async def get_flow_funnel(
+    site_id: int | None = None,
+    start: date | None = Query(None, description="First event_date included (YYYY-MM-DD)"),
+    end: date | None = Query(None, description="Last event_date included (YYYY-MM-DD)"),
+) -> Dict[str, Any]:
+    """
+    Patient-flow funnel analytics
+    Per site and period: events and distinct subjects per event_type_id,
+    stage-to-stage conversion rates (stages in display_order) and
+    time-between-events distributions, computed server-side over a columnar
+    snapshot that is refreshed incrementally as new events arrive.
+    """
+    from analytics import OFFLOAD_MIN_ROWS, compute_funnel, funnel_job
+
+    try:
+        snapshot = get_flow_snapshot()
+        await snapshot.refresh()
+        selection = snapshot.select(
+            site_id=site_id,
+            start=start.isoformat() if start else None,
+            end=end.isoformat() if end else None,
+        )
+        if len(selection["subject"]) >= OFFLOAD_MIN_ROWS:
+            # Large selections run in the process pool so the event loop keeps serving
+            funnel = await analytics_jobs.run("flow_funnel", funnel_job, selection, stage_order=snapshot.stage_order)
+        else:
+            funnel = compute_funnel(**selection, stage_order=snapshot.stage_order)
+    except Exception as e:
+        raise engine_error("compute flow funnel", e)
+
+    return {
+        "site_id": site_id,
+        "start": start,
+        "end": end,
+        **funnel,
+        "snapshot": snapshot.status(),
+    }
+
+
+@app.get("/api/benchmarks/safety-rate", tags=["Benchmarks"])
+async def get_safety_rate_benchmark(
+    practitioner_id: str,
+    substance_id: int | None = None,
+    start: date | None = Query(None, description="Default: trailing 12 months"),
+    end: date | None = Query(None, description="Default: today"),
+) -> Dict[str, Any]:
+    """
+    BENCH_SAFETY_RATE_V1
+    Own vs. peer per-session AE rate and Grade 3+ rate, delta and percentile
+    rank. Any side with fewer than 5 sessions is suppressed.
+    """
+    try:
+        engine = get_safety_engine()
+        await engine.refresh()
+        return engine.benchmark(practitioner_id, substance_id, start, end)
+    except Exception as e:
+        raise engine_error("compute safety benchmark", e)
+
+
+@app.get("/api/benchmarks/safety-rate/segments", tags=["Benchmarks"])
+async def get_safety_rate_segments(
+    practitioner_id: str | None = None,
+    substance_id: int | None = None,
+    start: date | None = Query(None, description="Default: trailing 12 months"),
+    end: date | None = Query(None, description="Default: today"),
+) -> Dict[str, Any]:
+    """
+    BENCH_SAFETY_RATE_V1 segments
+    Rates for every practitioner/substance/month segment, n<5 segments suppressed
+    """
+    try:
+        engine = get_safety_engine()
+        await engine.refresh()
+        return {
+            "segments": engine.segment_rates(practitioner_id, substance_id, start, end),
+            "engine": engine.status(),
+        }
+    except Exception as e:
+        raise engine_error("compute safety segments", e)
+
+
+@app.post("/api/benchmarks/safety-rate/refresh", tags=["Benchmarks"])
+async def refresh_safety_rate_benchmarks() -> Dict[str, Any]:
+    """
+    Rebuild BENCH_SAFETY_RATE_V1 segments
+    Reloads sessions and safety events and drops cached peer distributions
+    """
+    try:
+        engine = get_safety_engine()
+        await engine.refresh(force=True)
+        return engine.status()
+    except Exception as e:
+        raise engine_error("refresh safety benchmarks", e)
+
+
+async def read_score_items(request: Request, noun: str = "score pairs") -> List[Any]:
+    """Decode a JSON-array or NDJSON body of items to score (at most MAX_BATCH_ROWS)"""
+    if is_ndjson(request.headers.get("content-type")):
+        items = [item async for _, item in iter_ndjson(request.stream())]
+    else:
+        try:
+            items = await request.json()
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid JSON body: {str(e)}"
+            )
+        if not isinstance(items, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Request body must be a JSON array of {noun}"
+            )
+    if len(items) > MAX_BATCH_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds {MAX_BATCH_ROWS} rows"
+        )
+    return items
+
+
+@app.post("/api/outcomes/phq9/score", tags=["Outcomes"])
+async def score_phq9_pairs(
+    request: Request,
+    assessment_window: str = Query("post_90d", description="Window for pairs that don't specify one"),
+    accept: str | None = Header(None),
+):
+    """
+    OUTCOME_RESPONSE_PHQ9_V1 batch scoring
+    Scores a JSON array or NDJSON stream of {phq9_baseline_total,
+    phq9_followup_total, assessment_window?, id?, session_id?} pairs.
+    Returns results plus a per-window summary, or with
+    `Accept: application/x-ndjson` streams one result per line.
+    """
+    from engines.phq9_outcome import WINDOW_DAYS, score_pairs, summarize
+
+    if assessment_window not in WINDOW_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"assessment_window must be one of {', '.join(WINDOW_DAYS)}"
+        )
+    items = await read_score_items(request)
+
+    if wants_ndjson(accept):
+        async def lines():
+            for offset in range(0, len(items), MAX_PAGE_SIZE):
+                yield dumps_lines(score_pairs(items[offset:offset + MAX_PAGE_SIZE], assessment_window))
+
+        return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+    results = score_pairs(items, assessment_window)
+    return FastJSONResponse({"summary": summarize(results), "results": results})
+
+
+@app.get("/api/outcomes/phq9/cohort", tags=["Outcomes"])
+async def score_phq9_cohort(
+    assessment_window: str | None = Query(None, description="post_7d, post_30d, post_90d or post_180d"),
+    start: date | None = Query(None, description="Earliest follow-up assessment date"),
+    end: date | None = Query(None, description="Latest follow-up assessment date"),
+    accept: str | None = Header(None),
+):
+    """
+    OUTCOME_RESPONSE_PHQ9_V1 cohort scoring
+    Scores every baseline/follow-up pair in mv_outcome_deltas_by_timepoint
+    matching the filters, page by page. Returns results plus a per-window
+    summary, or with `Accept: application/x-ndjson` streams them as scored.
+    """
+    from engines.phq9_outcome import WINDOW_DAYS, WINDOWS, score_deltas, summarize
+
+    if assessment_window is not None and assessment_window not in WINDOW_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"assessment_window must be one of {', '.join(WINDOW_DAYS)}"
+        )
+
+    def query_factory():
+        query = supabase.get().table("mv_outcome_deltas_by_timepoint").select(
+            "patient_uuid,timepoint_days,f_assessment_date,baseline_phq9,f_phq9"
+        )
+        if assessment_window is not None:
+            # Same nearest-window boundaries as score_deltas
+            days = list(WINDOW_DAYS.values())
+            position = WINDOWS.index(assessment_window)
+            if position > 0:
+                query = query.gt("timepoint_days", (days[position - 1] + days[position]) / 2)
+            if position < len(days) - 1:
+                query = query.lte("timepoint_days", (days[position] + days[position + 1]) / 2)
+        if start is not None:
+            query = query.gte("f_assessment_date", start.isoformat())
+        if end is not None:
+            query = query.lte("f_assessment_date", end.isoformat())
+        return query
+
+    pages = iter_range_pages(query_factory, ("patient_uuid", "timepoint_days"), MAX_PAGE_SIZE)
+
+    if wants_ndjson(accept):
+        async def lines():
+            async for rows in pages:
+                yield dumps_lines(score_deltas(rows))
+
+        return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+    try:
+        results = [result async for rows in pages for result in score_deltas(rows)]
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to fetch flow event types: {str(e)}"
+            detail=f"Failed to score PHQ-9 cohort: {str(e)}"
         )
+    return FastJSONResponse({"summary": summarize(results), "results": results})
 
 
-# ============================================================================
-# STARTUP/SHUTDOWN EVENTS
-# ============================================================================
+@app.post("/api/contraindications/ibogaine/screen", tags=["Safety"])
+async def screen_ibogaine_contraindications(
+    request: Request,
+    primary_substance: str | None = Query(None, description="Substance for intakes that don't specify one, e.g. ibogaine_hcl"),
+    accept: str | None = Header(None),
+):
+    """
+    CONTRAINDICATION_IBOGAINE_V1 batch screening
+    Screens a JSON array or NDJSON stream of patient intakes (e.g. a whole
+    waitlist) against the compiled rule index and returns an ABSOLUTE /
+    RELATIVE / NONE / NOT_APPLICABLE tier with flags per patient, plus a
+    summary; with `Accept: application/x-ndjson` streams one result per
+    line. Advisory only: flags never block a session.
+    """
+    from engines.ibogaine_contraindication import screen, summarize
 
-@app.on_event("startup")
-async def startup_event():
-    """Run on application startup"""
-    print("=" * 60)
-    print("🚀 PPN Research Portal Backend API Starting")
-    print("=" * 60)
-    print(f"📊 Supabase URL: {SUPABASE_URL}")
-    print(f"🔒 Service Key: {'*' * 20}{SUPABASE_SERVICE_KEY[-8:]}")
-    print(f"📚 API Docs: http://localhost:8000/api/docs")
-    print("=" * 60)
+    items = await read_score_items(request, "patient intakes")
+    try:
+        rules = await get_ibogaine_rules()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to load contraindication rules: {str(e)}"
+        )
 
+    if wants_ndjson(accept):
+        async def lines():
+            for offset in range(0, len(items), MAX_PAGE_SIZE):
+                yield dumps_lines(screen(rules, items[offset:offset + MAX_PAGE_SIZE], primary_substance))
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Run on application shutdown"""
-    print("\n🛑 PPN Research Portal Backend API Shutting Down")
+        return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+    results = screen(rules, items, primary_substance)
+    return FastJSONResponse({"summary": summarize(results), "rules": rules.status(), "results": results})
+
+
+@app.post("/api/ae-notifications/events", tags=["Safety"], status_code=status.HTTP_202_ACCEPTED)
+async def push_adverse_events(request: Request) -> Dict[str, Any]:
+    """
+    AE_NOTIFY_GRADE3PLUS_V1 change feed
+    Accepts new log_safety_events rows - a database webhook payload
+    ({type, record}), a row, or a JSON array of either - and queues the
+    Grade 3+ ones for notification ahead of the next poll. Returns 503 with
+    Retry-After when the notification queue is full.
+    """
+    if not ae_notifier.running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AE notification processor is not running"
+        )
+    try:
+        body = await request.json()
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid JSON body: {str(e)}"
+        )
+
+    rows = []
+    for item in body if isinstance(body, list) else [body]:
+        if isinstance(item, dict) and "record" in item:
+            if item.get("type") == "DELETE":
+                continue
+            item = item["record"]
+        rows.append(item)
+
+    try:
+        queued = ae_notifier.push(rows)
+    except ae_notify.QueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"},
+        )
+    return {"received": len(rows), "queued": queued}
+
+
+@app.get("/api/ae-notifications/status", tags=["Safety"])
+async def get_ae_notification_status() -> Dict[str, Any]:
+    """
+    AE_NOTIFY_GRADE3PLUS_V1 processor status
+    Cursor, queue depth, per-outcome event counts, write latency and last error
+    """
+    return ae_notifier.status()
+
+
+@app.get("/api/release-readiness", tags=["Safety"])
+async def get_release_readiness(
+    session_id: List[str] | None = Query(None, description="Limit to these sessions (repeatable)"),
+) -> Dict[str, Any]:
+    """
+    RELEASE_READY_PSILOCYBIN_V1
+    Current READY / NOT_READY / NOT_APPLICABLE state and failing criteria
+    for every active session, answered from memory
+    """
+    return {"sessions": readiness_tracker.snapshot(session_id), "tracker": readiness_tracker.status()}
+
+
+@app.get("/api/release-readiness/stream", tags=["Safety"])
+async def stream_release_readiness(
+    session_id: List[str] | None = Query(None, description="Limit to these sessions (repeatable)"),
+) -> StreamingResponse:
+    """
+    RELEASE_READY_PSILOCYBIN_V1 push updates (Server-Sent Events)
+    Sends a `snapshot` of every active session, then a `readiness` event
+    whenever a session's state or failing criteria change and `removed`
+    when it is released or leaves the active window.
+    """
+    async def events():
+        async for event, payload in readiness_tracker.subscribe(session_id):
+            yield format_event(payload, event=event)
+
+    return StreamingResponse(with_keepalive(events()), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
+@app.post("/api/release-readiness/events", tags=["Safety"])
+async def push_release_readiness_events(request: Request) -> Dict[str, Any]:
+    """
+    RELEASE_READY_PSILOCYBIN_V1 change feed
+    Accepts database webhook payloads ({type, table, record, old_record}) for
+    log_dose_events, log_release_checks and log_safety_events, or a JSON
+    array of them, and re-evaluates only the sessions they touch.
+    """
+    try:
+        body = await request.json()
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid JSON body: {str(e)}"
+        )
+
+    payloads = body if isinstance(body, list) else [body]
+    applied = 0
+    for payload in payloads:
+        if not isinstance(payload, dict):
+            continue
+        change = payload.get("type", "INSERT")
+        record = payload.get("old_record") if change == "DELETE" else payload.get("record")
+        applied += readiness_tracker.apply(payload.get("table"), record, change)
+    return {"received": len(payloads), "applied": applied}
+
+
+@app.get("/api/jobs", tags=["Jobs"])
+async def list_jobs() -> Dict[str, Any]:
+    """
+    Analytics job queue
+    Process-pool status and recent jobs, newest first (results omitted)
+    """
+    return {
+        "executor": analytics_jobs.status(),
+        "jobs": [job.as_dict(include_result=False) for job in analytics_jobs.jobs()],
+    }
+
+
+@app.get("/api/jobs/{job_id}", tags=["Jobs"])
+async def get_job(job_id: str) -> Dict[str, Any]:
+    """
+    Analytics job status
+    queued, running, succeeded (with result), failed, timed_out or cancelled
+    """
+    job = analytics_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found"
+        )
+    return job.as_dict()
+
+
+@app.get("/api/flow-event-types", tags=["Reference Data"])
+async def get_flow_event_types(
+    if_none_match: str | None = Header(None),
+    db: PooledPostgrestClient = Depends(get_supabase)
+) -> List[Dict[str, Any]]:
+    """
+    Get all flow event types
+    Returns reference data for patient flow event classifications (cached, ETag-aware)
+    """
+    try:
+        return await cached_reference_response("ref_flow_event_types", db, if_none_match)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch flow event types: {str(e)}"
+        )
+
+
+@app.post("/api/cache/invalidate", tags=["Reference Data"])
+async def invalidate_reference_cache(table: str | None = None) -> Dict[str, Any]:
+    """
+    Invalidate cached reference data
+    Drops one table (e.g. ?table=sites) or, with no table, the whole cache
+    """
+    removed = reference_cache.invalidate(table)
+    return {"invalidated": removed, "table": table}
 
 
 # ============================================================================
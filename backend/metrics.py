@@ -0,0 +1,236 @@
+"""
+PPN Research Portal - Metrics
+Per-route latency histograms, in-flight gauges and PostgREST call timing,
+exposed in the Prometheus text exposition format
+"""
+
+import bisect
+import time
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; tuned for API calls from ~1ms cache hits to multi-second exports
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with labels"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Labels, float] = defaultdict(float)
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self.values[labels] += amount
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self.values.items())
+        ]
+
+
+class Gauge(Counter):
+    """Up/down gauge with labels"""
+    kind = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1.0) -> None:
+        self.values[labels] -= amount
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.counts: Dict[Labels, List[int]] = {}
+        self.sums: Dict[Labels, float] = defaultdict(float)
+
+    def observe(self, labels: Labels, value: float) -> None:
+        counts = self.counts.get(labels)
+        if counts is None:
+            counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[labels] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, counts in sorted(self.counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(self.sums[labels])}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them as Prometheus text"""
+
+    def __init__(self) -> None:
+        self.metrics: list = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# ============================================================================
+# BACKEND METRICS
+# ============================================================================
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.register(Histogram(
+    "ppn_http_request_duration_seconds",
+    "HTTP request latency by route template, method and status",
+    ("route", "method", "status"),
+))
+http_requests_in_flight = registry.register(Gauge(
+    "ppn_http_requests_in_flight",
+    "HTTP requests currently being served",
+    ("method",),
+))
+db_call_duration = registry.register(Histogram(
+    "ppn_db_call_duration_seconds",
+    "Supabase/PostgREST call latency by table and operation",
+    ("table", "operation", "status"),
+))
+
+coalesced_reads = registry.register(Counter(
+    "ppn_coalesced_reads_total",
+    "Reads by coalescing role: leader made the upstream call, follower shared it",
+    ("name", "role"),
+))
+
+idempotent_requests = registry.register(Counter(
+    "ppn_idempotent_requests_total",
+    "Writes carrying an Idempotency-Key, by outcome (created, replayed, coalesced, conflict)",
+    ("outcome",),
+))
+
+write_behind_batch_rows = registry.register(Histogram(
+    "ppn_write_behind_batch_rows",
+    "Rows per multi-row insert flushed by the flow event write-behind buffer",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+))
+
+ae_notify_events = registry.register(Counter(
+    "ppn_ae_notify_events_total",
+    "Adverse events seen by the AE_NOTIFY_GRADE3PLUS_V1 processor, by outcome",
+    ("outcome",),
+))
+ae_notify_latency = registry.register(Histogram(
+    "ppn_ae_notify_latency_seconds",
+    "Time from a Grade 3+ adverse event being queued to its notification being written",
+))
+
+
+def observe_db_call(table: str, operation: str, status: str, seconds: float) -> None:
+    """Record one PostgREST round trip (wired into the data-access layer)"""
+    db_call_duration.observe((table, operation, status), seconds)
+
+
+def observe_coalesced(name: str, role: str) -> None:
+    """Record whether a read led or joined a single-flight call"""
+    coalesced_reads.inc((name, role))
+
+
+def observe_idempotency(outcome: str) -> None:
+    """Record how an Idempotency-Key write was answered"""
+    idempotent_requests.inc((outcome,))
+
+
+def observe_write_behind(rows: int, seconds: float) -> None:
+    """Record the size of one write-behind flush (its latency is in ppn_db_call_duration_seconds)"""
+    write_behind_batch_rows.observe((), rows)
+
+
+def observe_ae_notify(outcome: str, count: int, latencies: List[float]) -> None:
+    """Record AE notification processor outcomes and write latencies"""
+    ae_notify_events.inc((outcome,), count)
+    for seconds in latencies:
+        ae_notify_latency.observe((), seconds)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each request from receipt to the last body chunk,
+    labelled by the matched route template so path params don't explode cardinality.
+    """
+
+    def __init__(self, app: ASGIApp, exclude_paths: Sequence[str] = ("/metrics",)) -> None:
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = "500"
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = str(message["status"])
+            await send(message)
+
+        http_requests_in_flight.inc((method,))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec((method,))
+            # The router stores the matched APIRoute in scope once it has run
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            http_request_duration.observe((route_path, method, status_code), time.perf_counter() - started)
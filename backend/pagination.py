@@ -0,0 +1,89 @@
+"""
+PPN Research Portal - Keyset Pagination
+Cursor-based paging and NDJSON streaming over PostgREST queries
+"""
+
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
+
+from postgrest._async.request_builder import AsyncSelectRequestBuilder
+
+from serialization import dumps_lines
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+Row = Dict[str, Any]
+QueryFactory = Callable[[], AsyncSelectRequestBuilder]
+
+
+async def fetch_keyset_page(
+    query_factory: QueryFactory,
+    key: str,
+    after: int | None,
+    limit: int,
+) -> Tuple[List[Row], int | None]:
+    """
+    Fetch one page of rows ordered by `key`, strictly after the `after` cursor.
+
+    Reads `limit + 1` rows so the next cursor is only returned when another
+    page actually exists. Returns (rows, next_cursor).
+    """
+    query = query_factory()
+    if after is not None:
+        query = query.gt(key, after)
+    response = await query.order(key).limit(limit + 1).execute()
+
+    rows = response.data
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1][key]
+    return rows, None
+
+
+async def iter_keyset_pages(
+    query_factory: QueryFactory,
+    key: str,
+    after: int | None,
+    limit: int,
+) -> AsyncIterator[List[Row]]:
+    """Yield successive keyset pages until the result set is exhausted"""
+    cursor = after
+    while True:
+        rows, cursor = await fetch_keyset_page(query_factory, key, cursor, limit)
+        if rows:
+            yield rows
+        if cursor is None:
+            return
+
+
+async def iter_range_pages(
+    query_factory: QueryFactory,
+    order: Tuple[str, ...],
+    limit: int,
+) -> AsyncIterator[List[Row]]:
+    """
+    Yield offset pages (Range) for relations without a single unique key,
+    such as materialized views; `order` must make the row order stable.
+    """
+    offset = 0
+    while True:
+        # One order param listing every column (repeated order params aren't combined)
+        query = query_factory().order(",".join(order))
+        response = await query.range(offset, offset + limit - 1).execute()
+        if response.data:
+            yield response.data
+        if len(response.data) < limit:
+            return
+        offset += limit
+
+
+async def ndjson_lines(pages: AsyncIterator[List[Row]]) -> AsyncIterator[bytes]:
+    """Encode pages of rows as newline-delimited JSON, one row per line"""
+    async for rows in pages:
+        yield dumps_lines(rows)
+
+
+def wants_ndjson(accept: str | None) -> bool:
+    """True when the client negotiated an NDJSON stream via the Accept header"""
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept
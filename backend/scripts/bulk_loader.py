@@ -0,0 +1,307 @@
+"""
+bulk_loader.py
+==============
+Adaptive, pipelined bulk upserts into a PostgREST table, shared by the
+benchmark ETL scripts.
+
+- Batch size adapts to observed latency (aiming for `target_latency` per
+  request) and is capped by encoded payload size (`max_bytes`)
+- Several batches in flight at once over one pooled httpx.AsyncClient;
+  `add()` waits when they are all busy, so producers are backpressured
+- Transient failures are retried with jittered exponential backoff,
+  honoring Retry-After. Failures the server may already have committed
+  (5xx, a connection lost mid-request) are only retried when resending is
+  idempotent - rows are keyed or the URL has on_conflict - so a plain
+  insert is never duplicated
+- A batch the database rejects for its rows (400/409/422) is bisected
+  until the bad rows are isolated; the rest still load. A 413 splits the
+  batch and lowers the byte cap
+- A refusal of the load as a whole (401/403 wrong key or RLS, 404 missing
+  table, any other 4xx) raises LoadAborted at once instead of bisecting
+- Nothing is dropped silently: every row ends up loaded or in `failed`
+  with its error, and failures can be written to a rejects file for replay
+
+Usage:
+
+    async with BulkLoader(url, headers, key="nct_id") as loader:
+        for row in rows:
+            await loader.add(row)
+    print(loader.result.loaded, len(loader.result.failed))
+
+or, for rows already in memory, `load_rows(url, headers, rows)`.
+"""
+
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+
+from ctgov_client import retry_after_seconds
+
+DEFAULT_START_ROWS = 50
+DEFAULT_MAX_ROWS = 1000
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_IN_FLIGHT = 4
+DEFAULT_TARGET_LATENCY = 1.0    # seconds per request
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+RETRY_STATUSES = {408, 429}                 # not processed: always safe to resend
+AMBIGUOUS_STATUSES = {500, 502, 503, 504}   # may have been committed: resent only if idempotent
+# Raised before the request reached the server
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+ROW_ERROR_STATUSES = {400, 409, 422}        # some row is bad: bisect to find it
+PAYLOAD_TOO_LARGE = 413
+
+
+class TransientError(Exception):
+    """A failure worth retrying as-is; `ambiguous` when the batch may already be written."""
+
+    def __init__(self, message: str, retry_after: float | None = None, ambiguous: bool = False) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.ambiguous = ambiguous
+
+
+class RejectedError(Exception):
+    """The database refused rows in the batch; retrying it unchanged won't help."""
+
+    def __init__(self, message: str, status: int) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class LoadAborted(RuntimeError):
+    """The endpoint refused the load as a whole (auth, RLS, missing table); no batch can succeed."""
+
+
+@dataclass
+class LoadResult:
+    """Outcome of a load: rows written, and rows that could not be (with why)."""
+    loaded: int = 0
+    requests: int = 0
+    retries: int = 0
+    failed: list[tuple[dict, str]] = field(default_factory=list)
+
+    def write_rejects(self, path: Path) -> None:
+        """Write failed rows as NDJSON ({"row": ..., "error": ...}) for inspection or replay."""
+        with Path(path).open("w") as f:
+            for row, error in self.failed:
+                f.write(json.dumps({"row": row, "error": error}, default=str) + "\n")
+
+
+class BulkLoader:
+    """
+    Streams rows into `url` (a PostgREST table endpoint, with any on_conflict
+    parameter) in adaptively sized, concurrent batches.
+
+    With `key`, rows sharing a key value are collapsed in the buffer (last
+    one wins), and a batch waits for any in-flight batch holding one of its
+    keys, so a later version of a row is never overtaken by an earlier one.
+
+    `idempotent` says whether resending a batch is harmless; it defaults to
+    true when `key` is set or the URL carries on_conflict. Otherwise a
+    failure that may have been committed is not retried and its rows are
+    reported as failed with an unknown outcome.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        headers: dict,
+        key: str | None = None,
+        idempotent: bool | None = None,
+        start_rows: int = DEFAULT_START_ROWS,
+        max_rows: int = DEFAULT_MAX_ROWS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        in_flight: int = DEFAULT_IN_FLIGHT,
+        target_latency: float = DEFAULT_TARGET_LATENCY,
+        max_retries: int = MAX_RETRIES,
+        timeout: float = 60.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+        on_batch=None,
+    ) -> None:
+        self.url = url
+        self.key = key
+        self.idempotent = idempotent if idempotent is not None else key is not None or "on_conflict=" in url
+        self.batch_rows = float(max(1, start_rows))
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.on_batch = on_batch   # on_batch(rows_loaded, result) after each successful request
+        self.http = httpx.AsyncClient(
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=in_flight, max_keepalive_connections=in_flight),
+            transport=transport,
+        )
+        self.result = LoadResult()
+        self._slots = asyncio.Semaphore(in_flight)
+        self._buffer: dict = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._inflight_keys: dict = {}
+        self._row_bytes = 0.0      # moving average of encoded bytes per row
+        self.aborted: LoadAborted | None = None
+
+    async def __aenter__(self) -> "BulkLoader":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def add(self, row: dict) -> None:
+        """Buffer one row, dispatching a batch once the buffer reaches the current size."""
+        if self.aborted is not None:
+            raise self.aborted
+        self._buffer[row[self.key] if self.key else object()] = row
+        if len(self._buffer) >= self._target_rows():
+            await self._dispatch()
+
+    async def flush(self) -> None:
+        """Dispatch whatever is buffered and wait for every batch to finish."""
+        if self._buffer:
+            await self._dispatch()
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+        if self.aborted is not None:
+            raise self.aborted
+
+    async def close(self) -> LoadResult:
+        try:
+            await self.flush()
+        finally:
+            await self.http.aclose()
+        return self.result
+
+    def _target_rows(self) -> int:
+        rows = int(self.batch_rows)
+        if self._row_bytes:
+            rows = min(rows, int(self.max_bytes / self._row_bytes))
+        return max(1, min(rows, self.max_rows))
+
+    async def _dispatch(self) -> None:
+        rows = list(self._buffer.values())
+        self._buffer.clear()
+        await self._slots.acquire()   # backpressure: wait for a free request slot
+        earlier = set()
+        if self.key:
+            earlier = {self._inflight_keys[row[self.key]] for row in rows if row[self.key] in self._inflight_keys}
+        task = asyncio.create_task(self._run(rows, earlier))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if self.key:
+            for row in rows:
+                self._inflight_keys[row[self.key]] = task
+
+    async def _run(self, rows: list[dict], earlier: set[asyncio.Task]) -> None:
+        try:
+            if earlier:
+                await asyncio.gather(*earlier, return_exceptions=True)
+            await self._load(rows)
+        finally:
+            self._slots.release()
+            if self.key:
+                current = asyncio.current_task()
+                for row in rows:
+                    if self._inflight_keys.get(row[self.key]) is current:
+                        del self._inflight_keys[row[self.key]]
+
+    async def _load(self, rows: list[dict]) -> None:
+        """Send `rows`, bisecting on rejection until the offending rows are isolated."""
+        if self.aborted is not None:
+            self.result.failed.extend((row, f"not sent, load aborted: {self.aborted}") for row in rows)
+            return
+        body = json.dumps(rows, default=str).encode()
+        if len(body) > self.max_bytes and len(rows) > 1:
+            await self._split(rows)
+            return
+        try:
+            await self._send(rows, body)
+        except RejectedError as e:
+            if len(rows) == 1:
+                self.result.failed.append((rows[0], str(e)))
+                return
+            if e.status == PAYLOAD_TOO_LARGE:
+                self.max_bytes = max(1, min(self.max_bytes, len(body) // 2))
+            await self._split(rows)
+        except LoadAborted as e:
+            self.aborted = self.aborted or e
+            self.result.failed.extend((row, str(e)) for row in rows)
+        except TransientError as e:
+            if e.ambiguous and not self.idempotent:
+                reason = f"not retried, outcome unknown (may have been written): {e}"
+            else:
+                reason = f"gave up after {self.max_retries} retries: {e}"
+            self.result.failed.extend((row, reason) for row in rows)
+
+    async def _split(self, rows: list[dict]) -> None:
+        middle = len(rows) // 2
+        await self._load(rows[:middle])
+        await self._load(rows[middle:])
+
+    async def _send(self, rows: list[dict], body: bytes) -> None:
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                self.result.requests += 1
+                r = await self.http.post(self.url, content=body, headers={"Content-Type": "application/json"})
+                if r.status_code in RETRY_STATUSES or r.status_code in AMBIGUOUS_STATUSES:
+                    raise TransientError(
+                        f"{r.status_code} — {r.text[:300]}",
+                        retry_after_seconds(r.headers.get("Retry-After")),
+                        ambiguous=r.status_code in AMBIGUOUS_STATUSES,
+                    )
+                if r.status_code in ROW_ERROR_STATUSES or r.status_code == PAYLOAD_TOO_LARGE:
+                    raise RejectedError(f"{r.status_code} — {r.text[:300]}", r.status_code)
+                if r.status_code >= 400:
+                    raise LoadAborted(f"{r.status_code} — {r.text[:300]}")
+            except httpx.TransportError as e:
+                error = TransientError(f"{type(e).__name__}: {e}", ambiguous=not isinstance(e, UNSENT_ERRORS))
+            except TransientError as e:
+                error = e
+            else:
+                self._adapt(len(rows), len(body), time.monotonic() - started)
+                self.result.loaded += len(rows)
+                if self.on_batch is not None:
+                    self.on_batch(len(rows), self.result)
+                return
+
+            # Transient: shrink future batches, back off, retry this one unchanged
+            self.batch_rows = max(1.0, self.batch_rows / 2)
+            if attempt >= self.max_retries or (error.ambiguous and not self.idempotent):
+                raise error
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+            if error.retry_after is not None:
+                delay = max(delay, error.retry_after)
+            attempt += 1
+            self.result.retries += 1
+            await asyncio.sleep(delay)
+
+    def _adapt(self, rows: int, size: int, latency: float) -> None:
+        """Grow batches while requests are fast, shrink toward `target_latency` when slow."""
+        per_row = size / rows
+        self._row_bytes = per_row if not self._row_bytes else 0.8 * self._row_bytes + 0.2 * per_row
+        if rows < int(self.batch_rows):
+            return   # a short (final or split) batch says little about capacity
+        if latency < self.target_latency / 2:
+            self.batch_rows = min(self.max_rows, self.batch_rows * 1.5)
+        elif latency > self.target_latency:
+            self.batch_rows = max(1.0, self.batch_rows * self.target_latency / latency)
+
+
+def load_rows(url: str, headers: dict, rows: list[dict], **options) -> LoadResult:
+    """Load an in-memory list of rows; see BulkLoader for `options`."""
+
+    async def run() -> LoadResult:
+        async with BulkLoader(url, headers, **options) as loader:
+            for row in rows:
+                await loader.add(row)
+        return loader.result
+
+    return asyncio.run(run())
@@ -0,0 +1,270 @@
+"""
+ctgov_client.py
+===============
+Async fetch engine for the ClinicalTrials.gov API v2, shared by the
+benchmark ETL scripts.
+
+- One pooled httpx.AsyncClient (keep-alive connections are reused)
+- Bounded parallelism: at most `concurrency` requests in flight
+- Token-bucket rate limiting instead of fixed sleeps
+- 429 / 5xx / network errors retried with exponential backoff and jitter;
+  a Retry-After header pauses every worker, not just the one that got it
+- Optional on-disk response cache (ResponseCache) for instant re-runs and
+  offline record/replay
+
+ClinicalTrials.gov asks clients to stay around 50 requests per minute, so
+the default rate is 0.8 requests/second.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import httpx
+
+DEFAULT_RATE = 0.8          # requests per second
+DEFAULT_BURST = 4
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0          # seconds; doubled per attempt
+BACKOFF_MAX = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+CACHE_MODES = ("off", "use", "record", "replay")
+DEFAULT_CACHE_TTL = 24 * 3600.0
+DEFAULT_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Rate limiting
+# ─────────────────────────────────────────────────────────────────────────────
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, bursting up to `burst`."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Hold every acquirer for `seconds` (e.g. after a 429 with Retry-After)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.updated = self.paused_until  # nothing accrues while paused
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def retry_after_seconds(value: str | None) -> float | None:
+    """Parse a Retry-After header given as delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Response cache
+# ─────────────────────────────────────────────────────────────────────────────
+
+class CacheMiss(LookupError):
+    """A replay-only cache has no response for a request."""
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of JSON responses, keyed by the request
+    URL and its (sorted) parameters.
+
+    Modes:
+      use     serve entries younger than `ttl`, fetch and store the rest
+      record  always fetch, store every response
+      replay  serve only from disk (any age); a miss raises CacheMiss and
+              nothing touches the network
+
+    Entries are evicted least-recently-used first once the directory holds
+    more than `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        mode: str = "use",
+        ttl: float = DEFAULT_CACHE_TTL,
+        max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+    ) -> None:
+        if mode not in CACHE_MODES or mode == "off":
+            raise ValueError(f"Invalid cache mode {mode!r}")
+        self.directory = Path(directory)
+        self.mode = mode
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._sizes: dict[Path, int] | None = None
+
+    @staticmethod
+    def key(url: str, params: dict) -> str:
+        canonical = json.dumps([url, sorted((str(k), str(v)) for k, v in params.items())])
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, url: str, params: dict) -> dict | None:
+        """Cached body for the request, or None when it must be fetched."""
+        if self.mode == "record":
+            return None
+        path = self._path(self.key(url, params))
+        try:
+            with path.open() as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        if entry is not None and (self.mode == "replay" or time.time() - entry["stored_at"] < self.ttl):
+            self.hits += 1
+            os.utime(path)  # mark recently used for eviction
+            return entry["body"]
+        self.misses += 1
+        if self.mode == "replay":
+            raise CacheMiss(f"No cached response for {str(httpx.URL(url, params=params))[:200]}")
+        return None
+
+    def put(self, url: str, params: dict, body: dict) -> None:
+        path = self._path(self.key(url, params))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("w") as f:
+            json.dump({"url": url, "params": params, "stored_at": time.time(), "body": body}, f)
+        tmp.replace(path)
+        sizes = self._index()
+        sizes[path] = path.stat().st_size
+        self._evict(sizes)
+
+    def _index(self) -> dict[Path, int]:
+        if self._sizes is None:
+            self._sizes = {path: path.stat().st_size for path in self.directory.glob("*/*.json")}
+        return self._sizes
+
+    def _evict(self, sizes: dict[Path, int]) -> None:
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+        for path in sorted(sizes, key=lambda p: p.stat().st_mtime if p.exists() else 0):
+            if total <= self.max_bytes:
+                break
+            total -= sizes.pop(path)
+            path.unlink(missing_ok=True)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Client
+# ─────────────────────────────────────────────────────────────────────────────
+
+class RegistryClient:
+    """
+    Rate-limited, retrying JSON GETs over one connection pool.
+
+    Use as an async context manager:
+
+        async with RegistryClient(rate=0.8, concurrency=4) as client:
+            data = await client.get_json(CT_API, params)
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        max_retries: int = MAX_RETRIES,
+        timeout: float = 30.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+        cache: ResponseCache | None = None,
+    ) -> None:
+        self.cache = cache
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = asyncio.Semaphore(concurrency)
+        self.max_retries = max_retries
+        self.http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            headers={"Accept": "application/json"},
+            transport=transport,
+        )
+        self.requests = 0
+        self.retries = 0
+
+    async def __aenter__(self) -> "RegistryClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.http.aclose()
+
+    async def get_json(self, url: str, params: dict) -> dict:
+        """
+        GET `url` and decode the JSON body, retrying transient failures.
+        Cache hits skip the rate limiter and the network entirely.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(url, params)
+            if cached is not None:
+                return cached
+        body = await self._fetch_json(url, params)
+        if self.cache is not None:
+            self.cache.put(url, params, body)
+        return body
+
+    async def _fetch_json(self, url: str, params: dict) -> dict:
+        attempt = 0
+        while True:
+            async with self.slots:
+                await self.bucket.acquire()
+                self.requests += 1
+                try:
+                    r = await self.http.get(url, params=params)
+                except httpx.TransportError:
+                    if attempt >= self.max_retries:
+                        raise
+                    r = None
+
+            if r is not None and r.status_code not in RETRY_STATUSES:
+                r.raise_for_status()
+                return r.json()
+            if r is not None and attempt >= self.max_retries:
+                r.raise_for_status()
+
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+            retry_after = retry_after_seconds(r.headers.get("Retry-After")) if r is not None else None
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+                self.bucket.pause(retry_after)
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
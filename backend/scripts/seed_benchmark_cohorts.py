@@ -13,7 +13,7 @@ License:   Aggregate statistics from CC BY 4.0 / Open Access papers.
 
 Usage:
   # Prerequisites
-  pip install requests
+  pip install httpx
 
   # Ensure env vars are set:
   export SUPABASE_URL=https://rxwsthatjhnixqsthegf.supabase.co
@@ -30,17 +30,22 @@ Notes:
   - Skips rows with missing n_participants (required field)
   - Handles empty numeric fields as NULL
   - Safe to re-run: uses ON CONFLICT DO NOTHING
+  - Upserts go through bulk_loader.BulkLoader; rows that still fail after
+    retries are written to --rejects and the run exits non-zero
+  - benchmark_cohorts has no natural unique key, so a 5xx or dropped
+    connection is not retried (the insert may have committed). Those rejects
+    say "outcome unknown": check the table before replaying them
 """
 
 import os
 import sys
 import csv
-import time
 import argparse
-import requests
 from pathlib import Path
 from datetime import datetime
 
+from bulk_loader import LoadAborted, LoadResult, load_rows
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Environment
 # ─────────────────────────────────────────────────────────────────────────────
@@ -74,8 +79,8 @@ HEADERS = {
 }
 
 UPSERT_URL   = f"{SUPABASE_URL}/rest/v1/benchmark_cohorts"
-BATCH_SIZE   = 50
 CSV_PATH     = Path(__file__).parent.parent / "data" / "benchmark_cohorts_seed.csv"
+REJECTS_FILE = Path(__file__).with_name("benchmark_cohorts.rejects.ndjson")
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Numeric coercion
@@ -176,32 +181,25 @@ def read_csv(path: Path) -> list[dict]:
 # Upsert
 # ─────────────────────────────────────────────────────────────────────────────
 
-def upsert_rows(rows: list[dict], dry_run: bool) -> int:
-    """Batch upsert rows into benchmark_cohorts. Returns count inserted."""
-    inserted = 0
-    for i in range(0, len(rows), BATCH_SIZE):
-        batch = rows[i:i + BATCH_SIZE]
-
-        if dry_run:
-            for row in batch:
-                print(
-                    f"  [DRY] {row['cohort_name'][:50]:50} | "
-                    f"{row['modality']:12} | {row['condition']:10} | "
-                    f"n={row['n_participants']} | {row['instrument']}"
-                )
-            inserted += len(batch)
-            continue
+def upsert_rows(rows: list[dict], dry_run: bool) -> LoadResult:
+    """Bulk upsert rows into benchmark_cohorts. Returns what was loaded and what failed."""
+    if dry_run:
+        for row in rows:
+            print(
+                f"  [DRY] {row['cohort_name'][:50]:50} | "
+                f"{row['modality']:12} | {row['condition']:10} | "
+                f"n={row['n_participants']} | {row['instrument']}"
+            )
+        return LoadResult(loaded=len(rows))
 
-        r = requests.post(UPSERT_URL, headers=HEADERS, json=batch, timeout=30)
-        if r.status_code not in (200, 201, 204):
-            print(f"  [ERROR] Batch {i // BATCH_SIZE + 1}: {r.status_code} — {r.text[:300]}")
-        else:
-            inserted += len(batch)
-            print(f"  Batch {i // BATCH_SIZE + 1}: {len(batch)} rows → Total: {inserted}")
+    batch_num = 0
 
-        time.sleep(0.2)
+    def progress(count: int, result: LoadResult) -> None:
+        nonlocal batch_num
+        batch_num += 1
+        print(f"  Batch {batch_num}: {count} rows → Total: {result.loaded}")
 
-    return inserted
+    return load_rows(UPSERT_URL, HEADERS, rows, on_batch=progress)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -217,6 +215,12 @@ def main():
         action="store_true",
         help="Preview without inserting. Prints each row that would be seeded.",
     )
+    parser.add_argument(
+        "--rejects",
+        type=Path,
+        default=REJECTS_FILE,
+        help=f"Where rows that fail to upsert are written (default {REJECTS_FILE.name} next to this script).",
+    )
     args = parser.parse_args()
 
     # Check CSV exists
@@ -234,15 +238,28 @@ def main():
         print("DRY RUN — No data will be inserted")
         print("=" * 80)
 
-    inserted = upsert_rows(rows, dry_run=args.dry_run)
+    try:
+        result = upsert_rows(rows, dry_run=args.dry_run)
+    except LoadAborted as e:
+        print(f"\n[STATUS: FAIL] Upsert aborted: {e}")
+        print("  Check SUPABASE_URL, the service_role key and that benchmark_cohorts exists.")
+        sys.exit(1)
 
     print(f"\n{'=' * 60}")
     if args.dry_run:
-        print(f"[DRY RUN] Would insert {inserted} benchmark cohorts.")
+        print(f"[DRY RUN] Would insert {result.loaded} benchmark cohorts.")
+    elif result.failed:
+        result.write_rejects(args.rejects)
+        print(f"[STATUS: FAIL] Seeded {result.loaded} benchmark cohorts; "
+              f"{len(result.failed)} rows could not be upserted (written to {args.rejects}).")
+        for row, error in result.failed[:5]:
+            print(f"  {row['cohort_name'][:50]}: {error}")
     else:
-        print(f"[STATUS: PASS] Seeded {inserted} benchmark cohorts into benchmark_cohorts.")
+        print(f"[STATUS: PASS] Seeded {result.loaded} benchmark cohorts into benchmark_cohorts.")
     print(f"Skipped {skipped} malformed rows (see warnings above).")
     print(f"Completed at {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC")
+    if result.failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+"""
+PPN Research Portal - Fast JSON Serialization
+orjson-backed encoding for DB rows, with a stdlib fallback
+"""
+
+import json
+from typing import Any, Iterable
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode `obj` as compact UTF-8 JSON; unknown types fall back to str()"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=str, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def dumps_lines(rows: Iterable[Any]) -> bytes:
+    """Encode rows as newline-delimited JSON"""
+    return b"".join(dumps(row) + b"\n" for row in rows)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson.
+
+    Endpoints returning rows straight from PostgREST should return this
+    directly: FastAPI then skips response_model validation and
+    jsonable_encoder, which otherwise walk every row a second time.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
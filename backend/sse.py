@@ -0,0 +1,58 @@
+"""
+PPN Research Portal - Server-Sent Events
+text/event-stream framing and keepalives for push endpoints
+"""
+
+import asyncio
+import os
+from typing import Any, AsyncIterator
+
+from serialization import dumps
+
+SSE_MEDIA_TYPE = "text/event-stream"
+SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))
+# Reconnect delay suggested to EventSource clients
+SSE_RETRY_MS = int(os.getenv("SSE_RETRY_MS", "3000"))
+# Disable proxy buffering so events are delivered as they are written
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def format_event(data: Any, event: str | None = None, event_id: Any = None, retry_ms: int | None = None) -> bytes:
+    """Encode one event; `data` is JSON-encoded onto a single data: line"""
+    lines = []
+    if event is not None:
+        lines.append(b"event: " + event.encode())
+    if event_id is not None:
+        lines.append(b"id: " + str(event_id).encode())
+    if retry_ms is not None:
+        lines.append(b"retry: " + str(retry_ms).encode())
+    lines.append(b"data: " + dumps(data))
+    return b"\n".join(lines) + b"\n\n"
+
+
+async def with_keepalive(
+    events: AsyncIterator[bytes],
+    interval: float = SSE_KEEPALIVE_INTERVAL,
+) -> AsyncIterator[bytes]:
+    """
+    Pass `events` through, emitting a comment line whenever none arrives for
+    `interval` seconds so idle connections survive proxies and load balancers.
+    """
+    iterator = events.__aiter__()
+    pending = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield KEEPALIVE
+                continue
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+            pending = asyncio.ensure_future(iterator.__anext__())
+    finally:
+        pending.cancel()
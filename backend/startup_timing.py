@@ -0,0 +1,126 @@
+"""
+PPN Research Portal - Startup Timing
+Cold-start report: import time per module, lifespan phases and time to first request
+"""
+
+import importlib.abc
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Imported first by main.py, so this approximates process start for the app
+_T0 = time.perf_counter()
+
+
+class _TimingLoader(importlib.abc.Loader):
+    """Wraps a module loader to time exec_module for outermost imports"""
+
+    def __init__(self, loader, name: str, timer: "_ImportTimer") -> None:
+        self._loader = loader
+        self._name = name
+        self._timer = timer
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        self._timer.depth += 1
+        started = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.depth -= 1
+            if self._timer.depth == 0:
+                self._timer.times.append((self._name, time.perf_counter() - started))
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._loader, item)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    Meta-path hook recording inclusive import time for each module imported at
+    the outermost level (transitive imports are folded into their parent).
+    """
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.times: List[Tuple[str, float]] = []
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimingLoader(spec.loader, fullname, self)
+                return spec
+        return None
+
+
+class StartupReport:
+    """Collects cold-start timings for the backend process"""
+
+    def __init__(self) -> None:
+        self.import_times: List[Tuple[str, float]] = []
+        self.phases: Dict[str, float] = {}
+        self.first_request_at: float | None = None
+
+    @contextmanager
+    def timing_imports(self) -> Iterator[None]:
+        """Record per-module import time for imports made inside the block"""
+        timer = _ImportTimer()
+        sys.meta_path.insert(0, timer)
+        try:
+            yield
+        finally:
+            sys.meta_path.remove(timer)
+            self.import_times.extend(timer.times)
+
+    def mark(self, phase: str) -> None:
+        """Record seconds since process start for a named startup phase"""
+        self.phases[phase] = time.perf_counter() - _T0
+
+    def mark_first_request(self) -> None:
+        if self.first_request_at is None:
+            self.first_request_at = time.perf_counter() - _T0
+
+    def as_dict(self) -> Dict[str, Any]:
+        slowest = sorted(self.import_times, key=lambda item: item[1], reverse=True)
+        return {
+            "imports_ms": {name: round(seconds * 1000, 2) for name, seconds in slowest},
+            "import_total_ms": round(sum(seconds for _, seconds in self.import_times) * 1000, 2),
+            "phases_ms": {phase: round(seconds * 1000, 2) for phase, seconds in self.phases.items()},
+            "first_request_ms": (
+                round(self.first_request_at * 1000, 2) if self.first_request_at is not None else None
+            ),
+        }
+
+    def summary_lines(self, top: int = 5) -> List[str]:
+        report = self.as_dict()
+        lines = [f"⏱️  Imports: {report['import_total_ms']} ms"]
+        for name, ms in list(report["imports_ms"].items())[:top]:
+            lines.append(f"     {name:<24} {ms} ms")
+        for phase, ms in report["phases_ms"].items():
+            lines.append(f"⏱️  {phase}: {ms} ms")
+        return lines
+
+
+startup_report = StartupReport()
+
+
+class FirstRequestTimer:
+    """ASGI middleware recording time from process start to the first HTTP request"""
+
+    def __init__(self, app: ASGIApp, report: StartupReport = startup_report) -> None:
+        self.app = app
+        self.report = report
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and self.report.first_request_at is None:
+            self.report.mark_first_request()
+        await self.app(scope, receive, send)
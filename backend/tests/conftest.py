@@ -0,0 +1,10 @@
+"""
+Pytest setup: make backend modules importable as top-level modules, the way
+main.py and the benchmarks import them.
+"""
+
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
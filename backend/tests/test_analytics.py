@@ -0,0 +1,44 @@
+"""
+Tests for analytics.py - flow-event snapshot refreshes
+"""
+
+import asyncio
+
+from analytics import FlowEventSnapshot
+
+
+def flow_event(flow_event_id):
+    return {
+        "flow_event_id": flow_event_id,
+        "site_id": 1,
+        "subject_id": flow_event_id,
+        "event_type_id": 1,
+        "event_date": "2026-01-01",
+    }
+
+
+def test_pushed_rows_do_not_hide_lower_ids_from_the_pull():
+    table = [flow_event(i) for i in (1, 2, 3)]
+
+    async def fetch_page(after, limit):
+        rows = sorted(table, key=lambda row: row["flow_event_id"])
+        return [row for row in rows if after is None or row["flow_event_id"] > after][:limit]
+
+    async def fetch_stages():
+        return [1]
+
+    async def scenario():
+        snapshot = FlowEventSnapshot(fetch_page, fetch_stages, page_size=2)
+        await snapshot.refresh(force=True)
+        # Inserted through the API and pushed, then a lower id lands from another writer
+        table.append(flow_event(5))
+        snapshot.append_rows([flow_event(5)])
+        assert (len(snapshot), snapshot.high_water) == (4, 3)
+        table.append(flow_event(4))
+        await snapshot.refresh(force=True)
+        return snapshot
+
+    snapshot = asyncio.run(scenario())
+
+    assert sorted(snapshot.column("flow_event_id").tolist()) == [1, 2, 3, 4, 5]
+    assert snapshot.high_water == 5
@@ -0,0 +1,61 @@
+"""
+Tests for broadcast.py - shared cursor polls fanned out to subscribers
+"""
+
+import asyncio
+
+from broadcast import Broadcaster
+
+
+class Table:
+    """Committed rows for one channel, read the way fetch_site_flow_events does"""
+
+    def __init__(self, *ids):
+        self.ids = set(ids)
+
+    async def fetch_after(self, key, cursor, limit):
+        return [{"id": row_id} for row_id in sorted(self.ids) if row_id > cursor][:limit]
+
+    async def fetch_head(self, key):
+        return max(self.ids, default=None)
+
+
+async def take(stream, count):
+    return [(await asyncio.wait_for(stream.__anext__(), 2))["id"] for _ in range(count)]
+
+
+def test_late_commit_is_delivered_once_in_poll_order():
+    async def scenario():
+        table = Table(1, 2)
+        broadcaster = Broadcaster(table.fetch_after, table.fetch_head, id_field="id", poll_interval=0.01, overlap=10)
+        stream = broadcaster.subscribe("site", None)
+        first = asyncio.ensure_future(take(stream, 2))
+        await asyncio.sleep(0.05)
+        table.ids |= {3, 5}
+        broadcaster.wake("site")
+        delivered = await first
+        # 4 was assigned before 5 but commits after it
+        table.ids.add(4)
+        delivered += await take(stream, 1)
+        table.ids.add(6)
+        delivered += await take(stream, 1)
+        await stream.aclose()
+        await broadcaster.stop()
+        return delivered
+
+    assert asyncio.run(scenario()) == [3, 5, 4, 6]
+
+
+def test_resume_replays_the_overlap_without_repeating_live_rows():
+    async def scenario():
+        table = Table(*range(1, 11))
+        broadcaster = Broadcaster(table.fetch_after, table.fetch_head, id_field="id", poll_interval=0.01, overlap=3)
+        stream = broadcaster.subscribe("site", 8)
+        replayed = await take(stream, 5)
+        table.ids.add(11)
+        live = await take(stream, 1)
+        await stream.aclose()
+        await broadcaster.stop()
+        return replayed, live
+
+    assert asyncio.run(scenario()) == ([6, 7, 8, 9, 10], [11])
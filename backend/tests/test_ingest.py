@@ -0,0 +1,88 @@
+"""
+Tests for ingest.py - chunked bulk ingest
+"""
+
+import asyncio
+from typing import List
+
+from pydantic import BaseModel
+
+from ingest import WriteBehindBuffer, ingest_rows, iter_json_array
+
+
+class Rejected(Exception):
+    """Stand-in for a PostgREST APIError: the whole insert was refused"""
+
+
+class Event(BaseModel):
+    name: str
+
+
+def run_ingest(items, inserts: List[List[str]], **kwargs):
+    next_id = iter(range(1, 1000))
+
+    async def insert_chunk(rows):
+        inserts.append([row["name"] for row in rows])
+        if any(row["name"] == "bad" for row in rows):
+            raise Rejected("violates check constraint")
+        return [{**row, "id": next(next_id)} for row in rows]
+
+    return asyncio.run(ingest_rows(iter_json_array(items), Event, insert_chunk, id_field="id", **kwargs))
+
+
+def test_rejected_chunk_fails_only_the_bad_row():
+    items = [{"name": f"ok-{i}"} for i in range(8)]
+    items[5] = {"name": "bad"}
+    inserts: List[List[str]] = []
+
+    result = run_ingest(items, inserts, chunk_size=4, split_on=(Rejected,))
+
+    assert (result.received, result.created, result.failed) == (8, 7, 1)
+    statuses = {row.index: row.status for row in result.results}
+    assert statuses == {i: "failed" if i == 5 else "created" for i in range(8)}
+    assert result.results[5].error == "violates check constraint"
+    assert all(row.id is not None for row in result.results if row.status == "created")
+    # The clean chunk is one insert; the rejected one is bisected down to the bad row
+    assert inserts[0] == ["ok-0", "ok-1", "ok-2", "ok-3"]
+    assert ["bad"] in inserts
+
+
+def test_other_errors_fail_the_whole_chunk():
+    items = [{"name": "ok-0"}, {"name": "bad"}, {"name": "ok-2"}]
+    inserts: List[List[str]] = []
+
+    result = run_ingest(items, inserts, chunk_size=3)
+
+    assert (result.created, result.failed) == (0, 3)
+    assert len(inserts) == 1
+
+
+def test_invalid_rows_are_not_inserted():
+    inserts: List[List[str]] = []
+
+    result = run_ingest([{"name": "ok-0"}, {"nope": 1}], inserts, split_on=(Rejected,))
+
+    assert [row.status for row in result.results] == ["created", "invalid"]
+    assert inserts == [["ok-0"]]
+
+
+def test_write_behind_rejects_only_the_bad_row():
+    async def insert(rows):
+        if any(row["name"] == "bad" for row in rows):
+            raise Rejected("violates check constraint")
+        return [{**row, "id": index} for index, row in enumerate(rows)]
+
+    async def scenario():
+        buffer = WriteBehindBuffer(insert, max_rows=4, max_delay=0.01, split_on=(Rejected,))
+        buffer.start()
+        names = ["ok-0", "ok-1", "bad", "ok-3"]
+        outcomes = await asyncio.gather(
+            *(buffer.submit({"name": name}) for name in names), return_exceptions=True
+        )
+        await buffer.stop()
+        return outcomes, buffer.counts
+
+    outcomes, counts = asyncio.run(scenario())
+
+    assert [isinstance(outcome, Rejected) for outcome in outcomes] == [False, False, True, False]
+    assert counts["rows"] == 3 and counts["failed"] == 1
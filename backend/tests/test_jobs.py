@@ -0,0 +1,39 @@
+"""
+Tests for jobs.py - analytics process pool admission and timeouts
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from jobs import AnalyticsExecutor, JobQueueFull
+
+
+def nap(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_overrunning_job_stops_counting_against_admission():
+    async def scenario():
+        executor = AnalyticsExecutor(workers=1, max_queue=1, timeout=0.5, start_method="spawn")
+        executor.start()
+        try:
+            slow = executor.submit("slow", nap, seconds=3)
+            with pytest.raises(TimeoutError):
+                await executor.wait(slow)
+            assert executor.status()["pending"] == 0
+            assert executor.status()["overrunning"] == 1
+
+            # Admitted while the worker is still busy, then settles the overrun
+            quick = executor.submit("quick", nap, timeout=10, seconds=0)
+            with pytest.raises(JobQueueFull):
+                executor.submit("extra", nap, seconds=0)
+            assert await executor.wait(quick) == 0
+            assert executor.status()["overrunning"] == 0
+            assert executor.pending == 0
+        finally:
+            executor.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,41 @@
+"""
+Tests for engines/phq9_outcome.py - OUTCOME_RESPONSE_PHQ9_V1
+"""
+
+from engines.phq9_outcome import score_pairs, summarize
+
+
+def pairs(count, baseline, followup):
+    return [{"phq9_baseline_total": baseline, "phq9_followup_total": followup}] * count
+
+
+def test_partial_responders_count_as_non_responders():
+    results = score_pairs(pairs(5, 20, 8) + pairs(5, 20, 13))
+
+    assert [row["phq9_response_class"] for row in results] == ["RESPONSE"] * 5 + ["PARTIAL_RESPONSE"] * 5
+    assert all(row["benchmark_eligible"] for row in results)
+    assert [row["benchmark_class"] for row in results] == ["RESPONSE"] * 5 + ["NON_RESPONSE"] * 5
+
+    window = summarize(results)["windows"]["post_90d"]
+    assert window["benchmark_eligible"] == 10
+    assert window["response_rate"] == 0.5
+    assert window["remission_rate"] == 0.0
+
+
+def test_rates_over_mixed_pairs():
+    items = (
+        pairs(2, 20, 3)     # REMISSION (also a >=50% reduction)
+        + pairs(3, 20, 8)   # RESPONSE
+        + pairs(2, 20, 13)  # PARTIAL_RESPONSE
+        + pairs(3, 20, 18)  # NON_RESPONSE
+        + pairs(1, 0, 5)    # BASELINE_REMISSION, flagged and excluded
+        + pairs(1, 20, 30)  # out of range, not computable
+    )
+
+    window = summarize(score_pairs(items))["windows"]["post_90d"]
+
+    assert window["pairs"] == 12
+    assert (window["PARTIAL_RESPONSE"], window["BASELINE_REMISSION"], window["not_computable"]) == (2, 1, 1)
+    assert window["benchmark_eligible"] == 10
+    assert window["response_rate"] == 0.5
+    assert window["remission_rate"] == 0.2
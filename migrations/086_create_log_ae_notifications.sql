@@ -0,0 +1,65 @@
+-- ============================================================
+-- Migration 086: Create log_ae_notifications
+-- ============================================================
+-- Purpose:
+--   AE_NOTIFY_GRADE3PLUS_V1 (backend/engines/ae_notify.py) writes one
+--   notification per Grade 3+ adverse event it reads from
+--   log_safety_events. This table is where those notifications land.
+--
+--   Design notes:
+--     - UNIQUE (ae_id, ae_grade) is the upsert target: replays, replicas
+--       and overlap re-reads are no-ops, while an event edited to a new
+--       Grade 3+ grade notifies again (spec §12)
+--     - ae_timestamp copies log_safety_events.created_at; the processor
+--       resumes polling from the newest (ae_timestamp, ae_id) notified
+--     - Written by the backend with the service_role key only, so RLS is
+--       enabled with no client policies
+--
+-- Source: docs/algorithm-specs/AE_NOTIFY_GRADE3PLUS_V1.md
+-- USER approval: REQUIRED before cloud execution
+--
+-- Architecture Constitution compliance:
+--   ✅ Additive-only — new table and indexes only, no existing mutations
+--   ✅ No free-text columns
+--   ✅ ae_grade CHECK constraint (CTCAE Grade 3–5)
+--   ✅ RLS enabled
+--   ✅ IF NOT EXISTS guard on table and index creation
+--   ✅ FK to log_safety_events with ON DELETE CASCADE
+-- ============================================================
+
+-- ── 1. Notifications table ───────────────────────────────────────────────────
+CREATE TABLE IF NOT EXISTS public.log_ae_notifications (
+    notification_id BIGSERIAL PRIMARY KEY,
+    ae_id           TEXT NOT NULL REFERENCES public.log_safety_events(ae_id) ON DELETE CASCADE,
+    session_id      UUID,
+    ae_grade        SMALLINT NOT NULL CHECK (ae_grade BETWEEN 3 AND 5),
+    ae_timestamp    TIMESTAMPTZ,
+    notified_at     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    CONSTRAINT uq_log_ae_notifications_event_grade UNIQUE (ae_id, ae_grade)
+);
+
+COMMENT ON TABLE public.log_ae_notifications IS
+    'One row per Grade 3+ adverse event (and grade) notified by AE_NOTIFY_GRADE3PLUS_V1.';
+
+ALTER TABLE public.log_ae_notifications ENABLE ROW LEVEL SECURITY;
+
+-- ── 2. Indexes ────────────────────────────────────────────────────────────────
+-- Resume cursor: newest notification by (ae_timestamp, ae_id)
+CREATE INDEX IF NOT EXISTS idx_log_ae_notifications_cursor
+    ON public.log_ae_notifications (ae_timestamp DESC, ae_id DESC);
+
+-- Polling: Grade 3+ events in (created_at, ae_id) order
+CREATE INDEX IF NOT EXISTS idx_log_safety_events_created_ae
+    ON public.log_safety_events (created_at, ae_id)
+    WHERE ctcae_grade >= 3;
+
+-- ── Verification Queries ──────────────────────────────────────────────────────
+-- 1. Confirm the table and its unique constraint exist
+SELECT conname, pg_get_constraintdef(oid) AS definition
+FROM pg_constraint
+WHERE conrelid = 'public.log_ae_notifications'::regclass;
+-- Expected: primary key, ae_id FK, ae_grade CHECK, uq_log_ae_notifications_event_grade
+
+-- 2. Confirm RLS is enabled
+SELECT relrowsecurity FROM pg_class WHERE oid = 'public.log_ae_notifications'::regclass;
+-- Expected: true